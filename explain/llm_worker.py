@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+explain/llm_worker.py
+
+Concurrent, rate-limited LLM calls for the explanation step (explain/llm_wrapper.py).
+
+  - asyncio worker pool with at most --llm_concurrency requests in flight
+  - token buckets for requests/minute and (estimated) tokens/minute
+  - retries with exponential backoff + jitter on timeouts, 429 and 5xx (Retry-After is honoured)
+  - request batching: up to --llm_batch_size prompts go out in one chat request and come back as one
+    JSON object keyed by item id; items missing from a batch answer are re-sent on their own
+  - persistent response cache (JSONL, keyed by sha256 of model + system prompt + prompt), so an
+    unchanged claim + evidence combination is never sent again
+
+Backends: "mock" (offline heuristic, no network) and "openai" (any OpenAI-compatible
+/chat/completions endpoint, e.g. --base_url http://127.0.0.1:8011/v1 for explain/stub_llm_server.py).
+HTTP uses the standard library in worker threads, so there is no extra dependency.
+
+Usage (via llm_wrapper):
+  python explain/stub_llm_server.py --port 8011 &
+  python explain/llm_wrapper.py --task summarize --backend openai --base_url http://127.0.0.1:8011/v1
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = "outputs/llm_cache.jsonl"
+DEFAULT_MODEL = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are an ESG claim analyst. Answer with JSON only."
+BATCH_INSTRUCTIONS = (
+    "Answer every item below independently. Return one JSON object mapping each item id to that "
+    "item's answer object, and nothing else."
+)
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English; only used for tokens/minute budgeting
+    return max(1, len(text) // 4)
+
+
+def prompt_hash(prompt, model, system=SYSTEM_PROMPT):
+    return hashlib.sha256(json.dumps([model, system, prompt], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Append-only JSONL of {"key", "response"}; the last line for a key wins."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted run
+                    self.entries[rec["key"]] = rec["response"]
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, response):
+        self.entries[key] = response
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "response": response}, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class TokenBucket:
+    """`rate` tokens per minute, bursts up to `capacity` (default: one second's worth). rate <= 0 disables the limit."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate / 60.0
+        self.capacity = capacity or max(self.rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, n=1):
+        if self.rate <= 0:
+            return
+        n = min(n, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+
+class LLMError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class MockClient:
+    """Offline backend: the heuristic from llm_wrapper, answered per item (batches included)."""
+
+    model = "mock"
+
+    def __init__(self, respond):
+        self.respond = respond
+
+    def complete(self, prompt):
+        return json.dumps(self.respond(prompt))
+
+    def complete_batch(self, items):
+        return json.dumps({item_id: self.respond(prompt) for item_id, prompt in items})
+
+
+class OpenAIClient:
+    """Minimal OpenAI-compatible /chat/completions client (blocking; run in worker threads)."""
+
+    def __init__(self, base_url="https://api.openai.com/v1", model=DEFAULT_MODEL, api_key=None, timeout=60.0):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        self.timeout = timeout
+
+    def _post(self, content):
+        body = json.dumps({
+            "model": self.model,
+            "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": content}],
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+        }).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                data = json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get("Retry-After") if e.headers else None
+            raise LLMError(f"HTTP {e.code} from {self.url}", e.code,
+                           float(retry_after) if retry_after else None) from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise LLMError(f"request to {self.url} failed: {e}") from e
+        return data["choices"][0]["message"]["content"]
+
+    def complete(self, prompt):
+        return self._post(prompt)
+
+    def complete_batch(self, items):
+        blocks = [f"### item {item_id}\n{prompt}" for item_id, prompt in items]
+        return self._post(BATCH_INSTRUCTIONS + "\n\n" + "\n\n".join(blocks))
+
+
+def parse_json_answer(text):
+    """JSON object from a model answer, tolerating ```json fences."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("{"):]
+    return json.loads(text)
+
+
+class LLMWorker:
+    """
+    Runs prompts through a client with bounded concurrency, rate limits, retries, batching and the
+    response cache. run(prompts) returns {item_id: response dict (or None on failure)}.
+    """
+
+    def __init__(self, client, cache=None, concurrency=4, batch_size=1, rpm=0, tpm=0,
+                 max_retries=5, backoff=1.0, max_backoff=60.0):
+        self.client = client
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.rpm, self.tpm = rpm, tpm
+        self.max_retries, self.backoff, self.max_backoff = max_retries, backoff, max_backoff
+        self.stats = {"cached": 0, "sent": 0, "requests": 0, "retries": 0, "failed": 0}
+
+    async def _call(self, fn, *args, tokens):
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+            self.stats["requests"] += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+            except LLMError as e:
+                if attempt == self.max_retries or (e.status is not None and e.status not in RETRY_STATUS):
+                    raise
+                delay = e.retry_after if e.retry_after is not None else \
+                    min(self.max_backoff, self.backoff * 2 ** attempt) * (0.5 + random.random() / 2)
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+
+    async def _single(self, item_id, prompt, key, results):
+        try:
+            answer = parse_json_answer(await self._call(self.client.complete, prompt, tokens=estimate_tokens(prompt)))
+        except (LLMError, ValueError) as e:
+            print(f"LLM request for {item_id} failed: {e}")
+            self.stats["failed"] += 1
+            results[item_id] = None
+            return
+        self._store(item_id, key, answer, results)
+
+    async def _batch(self, batch, results):
+        if len(batch) == 1:
+            await self._single(*batch[0], results)
+            return
+        items = [(item_id, prompt) for item_id, prompt, _ in batch]
+        try:
+            text = await self._call(self.client.complete_batch, items,
+                                    tokens=sum(estimate_tokens(p) for _, p in items))
+            answers = parse_json_answer(text)
+        except (LLMError, ValueError):
+            answers = {}
+        missing = []
+        for item_id, prompt, key in batch:
+            answer = answers.get(str(item_id)) if isinstance(answers, dict) else None
+            if isinstance(answer, dict):
+                self._store(item_id, key, answer, results)
+            else:
+                missing.append((item_id, prompt, key))
+        for item in missing:
+            await self._single(*item, results)
+
+    def _store(self, item_id, key, answer, results):
+        if self.cache is not None:
+            self.cache.put(key, answer)
+        self.stats["sent"] += 1
+        results[item_id] = answer
+
+    async def _run(self, prompts):
+        self.requests = TokenBucket(self.rpm)
+        self.tokens = TokenBucket(self.tpm)
+        results, todo = {}, []
+        for item_id, prompt in prompts:
+            key = prompt_hash(prompt, self.client.model)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                self.stats["cached"] += 1
+                results[item_id] = cached
+            else:
+                todo.append((item_id, prompt, key))
+        queue = asyncio.Queue()
+        for start in range(0, len(todo), self.batch_size):
+            queue.put_nowait(todo[start:start + self.batch_size])
+
+        async def worker():
+            while not queue.empty():
+                await self._batch(queue.get_nowait(), results)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self.pool:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, queue.qsize()))))
+        return results
+
+    def run(self, prompts):
+        """prompts: iterable of (item_id, prompt). Cached answers are returned without a request."""
+        return asyncio.run(self._run(list(prompts)))
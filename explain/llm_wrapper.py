@@ -8,29 +8,35 @@ Writes: explain/explanations/*.json
 Usage:
   python explain/llm_wrapper.py --task summarize
   python explain/llm_wrapper.py --task inspect --claim_id claim_tatapower_739e418c
-
-If OpenAI key available, uncomment API section; else it uses mock summaries.
+  python explain/llm_wrapper.py --task summarize --backend openai --model gpt-4o-mini --concurrency 8 --rpm 500
+  python explain/llm_wrapper.py --task summarize --backend openai --base_url http://127.0.0.1:8011/v1  (stub server)
+
+The default "mock" backend uses offline heuristic summaries. --backend openai sends prompts to an
+OpenAI-compatible endpoint (OPENAI_API_KEY) through explain/llm_worker.py: concurrent, rate-limited,
+retried, optionally batched, with a persistent response cache keyed by prompt hash. Each explanation
+records its prompt_hash and model, and is not rewritten while both are unchanged. Timings, request
+counts and the response cache hit rate go to outputs/metrics/llm_wrapper.json (nlp/metrics.py).
 """
 
-import argparse, json, os
+import argparse, json, os, sys
 from pathlib import Path
 from datetime import datetime
 
-# Optional: uncomment if you want to use real OpenAI calls
-# from openai import OpenAI
-# client = OpenAI()
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import open_claim_store
+from nlp.metrics import Metrics, add_metrics_args, metrics_from_args, write_metrics
+from explain.llm_worker import (DEFAULT_CACHE_PATH, DEFAULT_MODEL, LLMWorker, MockClient, OpenAIClient,
+                                ResponseCache, prompt_hash)
+from explain.prompt_builder import DEFAULT_MAX_EVIDENCE, DEFAULT_TOKEN_BUDGET, PromptBuilder
 
 CLAIMS_DIR = Path("claims")
 VERIF_DIR = Path("verification")
 OUT_DIR = Path("explain/explanations")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+DEFAULT_PROMPT_BUILDER = PromptBuilder()
 
 def load_claims():
-    claims = []
-    for f in sorted(CLAIMS_DIR.glob("*.json")):
-        with open(f, "r", encoding="utf-8") as fp:
-            claims.append(json.load(fp))
-    return claims
+    return list(open_claim_store(CLAIMS_DIR).iter_claims())
 
 def load_verifications():
     verifs = {}
@@ -39,21 +45,9 @@ def load_verifications():
             verifs[Path(f).stem.split("_evidence")[0]] = json.load(fp)
     return verifs
 
-def build_prompt_for_claim(claim, verifs):
-    evidences = verifs.get(claim["claim_id"], [])
-    ev_texts = [ev["text"] for ev in evidences[:5]] if isinstance(evidences, list) else []
-    text = f"""
-Claim: {claim['claim_text']}
-Metric: {claim.get('metric')}
-Value: {claim.get('numeric_value')} {claim.get('unit')}
-Evidence snippets:
-- {'\n- '.join(ev_texts) if ev_texts else 'None'}
-
-Task: Summarize the claim’s credibility, explain which evidence supports or contradicts it,
-assign a confidence (0-1), and a risk_flag = low/medium/high.
-Output JSON with keys: summary, confidence, risk_flag.
-"""
-    return text.strip()
+def build_prompt_for_claim(claim, verifs, builder=None):
+    """Prompt from the claim's verification record: selected, deduplicated evidence within the token budget."""
+    return (builder or DEFAULT_PROMPT_BUILDER).build(claim, verifs.get(claim["claim_id"]))
 
 def mock_llm_response(prompt: str):
     # Simple heuristic fallback
@@ -62,31 +56,86 @@ def mock_llm_response(prompt: str):
     summary = "This claim appears credible with supporting evidence." if confidence > 0.8 else "Some evidence gaps detected; moderate reliability."
     return {"summary": summary, "confidence": confidence, "risk_flag": risk_flag}
 
-def summarize_all():
-    claims = load_claims()
-    verifs = load_verifications()
+def make_worker(backend="mock", base_url="https://api.openai.com/v1", model=DEFAULT_MODEL, cache_path=DEFAULT_CACHE_PATH,
+                concurrency=4, batch_size=1, rpm=0, tpm=0):
+    if backend == "mock":
+        return LLMWorker(MockClient(mock_llm_response))
+    return LLMWorker(OpenAIClient(base_url, model), ResponseCache(cache_path), concurrency=concurrency,
+                     batch_size=batch_size, rpm=rpm, tpm=tpm)
+
+def explain_claims(claims, verifs, out_dir=OUT_DIR, worker=None, builder=None):
+    """
+    Writes explanations for claims whose prompt (or model) changed since their last explanation;
+    returns the paths written.
+    """
+    worker = worker or make_worker()
+    model = worker.client.model
+    out_dir = Path(out_dir)
+    prompts = {}
     for claim in claims:
         cid = claim["claim_id"]
-        prompt = build_prompt_for_claim(claim, verifs)
-        # For offline hackathon demo, skip actual LLM call:
-        result = mock_llm_response(prompt)
-        out_path = OUT_DIR / f"{cid}.json"
+        prompt = build_prompt_for_claim(claim, verifs, builder)
+        out_path = out_dir / f"{cid}.json"
+        if out_path.exists():
+            with open(out_path, "r", encoding="utf-8") as fp:
+                previous = json.load(fp)
+            if previous.get("prompt_hash") == prompt_hash(prompt, model) and previous.get("model") == model:
+                continue
+        prompts[cid] = prompt
+    written = []
+    for cid, result in worker.run(prompts.items()).items():
+        if result is None:
+            continue
+        out_path = out_dir / f"{cid}.json"
+        result = dict(result)
         result.update({
             "claim_id": cid,
+            "model": model,
+            "prompt_hash": prompt_hash(prompts[cid], model),
             "timestamp": datetime.utcnow().isoformat()
         })
         with open(out_path, "w", encoding="utf-8") as fp:
             json.dump(result, fp, indent=2)
+        written.append(out_path)
+    return written
+
+def explain_claim(claim, verifs, out_dir=OUT_DIR, worker=None):
+    """Writes the explanation for one claim and returns its path (None if it was up to date)."""
+    written = explain_claims([claim], verifs, out_dir, worker)
+    return written[0] if written else None
+
+def record_llm_stats(metrics, stats, n_claims, n_written):
+    """LLM worker counters and cache hit rates for nlp/metrics.py."""
+    looked_up = stats["cached"] + stats["sent"] + stats["failed"]
+    metrics.count("explanations_written", n_written)
+    metrics.count("explanations_up_to_date", n_claims - looked_up)
+    for key in ("cached", "sent", "requests", "retries", "failed"):
+        metrics.count(f"llm_{key}", stats[key])
+    metrics.hit_rate("llm_cache_hit_rate", stats["cached"], looked_up)
+    metrics.hit_rate("explanation_reuse_rate", n_claims - looked_up, n_claims)
+
+def summarize_all(worker=None, builder=None, metrics=None):
+    metrics = metrics or Metrics("llm_wrapper")
+    with metrics.stage("load") as st:
+        claims = load_claims()
+        verifs = load_verifications()
+        st.items = len(claims)
+    worker = worker or make_worker()
+    with metrics.stage("explain", items=len(claims)):
+        written = explain_claims(claims, verifs, worker=worker, builder=builder)
+    for out_path in written:
         print(f"✅ Wrote explanation: {out_path.name}")
+    record_llm_stats(metrics, worker.stats, len(claims), len(written))
+    print(f"LLM: {worker.stats}")
     print("\nAll claims summarized.")
 
-def inspect_one(claim_id: str):
+def inspect_one(claim_id: str, builder=None):
     claims = {c["claim_id"]: c for c in load_claims()}
     if claim_id not in claims:
         print(f"❌ Claim {claim_id} not found.")
         return
     verifs = load_verifications()
-    prompt = build_prompt_for_claim(claims[claim_id], verifs)
+    prompt = build_prompt_for_claim(claims[claim_id], verifs, builder)
     print("\n--- PROMPT PREVIEW ---\n")
     print(prompt[:1000])
     print("\n--- MOCK LLM OUTPUT ---\n")
@@ -96,13 +145,28 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--task", required=True, choices=["summarize", "inspect"], help="Task to run.")
     parser.add_argument("--claim_id", help="Claim ID for inspection.")
+    parser.add_argument("--backend", choices=["mock", "openai"], default="mock")
+    parser.add_argument("--base_url", default="https://api.openai.com/v1", help="OpenAI-compatible API base URL")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="persistent prompt-hash response cache")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--batch_size", type=int, default=1, help="prompts per request")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="estimated prompt tokens per minute (0 = unlimited)")
+    parser.add_argument("--token_budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="estimated tokens per prompt")
+    parser.add_argument("--max_evidence", type=int, default=DEFAULT_MAX_EVIDENCE, help="evidence snippets per prompt")
+    add_metrics_args(parser)
     args = parser.parse_args()
+    builder = PromptBuilder(args.token_budget, args.max_evidence)
 
     if args.task == "summarize":
-        summarize_all()
+        metrics = metrics_from_args("llm_wrapper", args)
+        summarize_all(make_worker(args.backend, args.base_url, args.model, args.cache, args.concurrency,
+                                  args.batch_size, args.rpm, args.tpm), builder, metrics)
+        write_metrics(metrics, args)
     elif args.task == "inspect":
         if not args.claim_id:
             print("❌ Please provide --claim_id for inspect mode.")
         else:
-            inspect_one(args.claim_id)
+            inspect_one(args.claim_id, builder)
 
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+explain/prompt_builder.py
+
+Builds the explanation prompt for a claim from its verification record (verification/*_evidence.json):
+
+  - evidence is picked by label and score: contradicting and supporting items alternate (strongest
+    first) so both sides are represented, insufficient items only fill what is left; items scoring
+    below --min_score are dropped
+  - near-identical snippets (word 3-shingle Jaccard >= --dedupe_threshold, e.g. the same wire story
+    on several sites) are included once
+  - evidence is added while the whole prompt fits --token_budget (estimated tokens, ~4 chars each)
+
+Per snippet the cleaned, truncated text, its token estimate and its shingle set are computed once and
+kept in a cache keyed by snippet id (text hash for evidence without one), so building prompts for many claims that cite the same
+snippets only formats the short per-claim evidence headers.
+
+Usage (via llm_wrapper):
+  python explain/llm_wrapper.py --task inspect --claim_id claim_tatapower_739e418c --token_budget 400
+"""
+
+import hashlib
+import re
+
+from explain.llm_worker import estimate_tokens
+
+DEFAULT_TOKEN_BUDGET = 600
+DEFAULT_MAX_EVIDENCE = 6
+DEFAULT_SNIPPET_CHARS = 400
+DEFAULT_DEDUPE_THRESHOLD = 0.8
+DEFAULT_MIN_SCORE = 0.05
+
+PROMPT_TEMPLATE = """Claim: {claim_text}
+Metric: {metric}
+Value: {value} {unit}
+Evidence snippets:
+{evidence}
+
+Task: Summarize the claim’s credibility, explain which evidence supports or contradicts it,
+assign a confidence (0-1), and a risk_flag = low/medium/high.
+Output JSON with keys: summary, confidence, risk_flag."""
+
+WS_RE = re.compile(r"\s+")
+WORD_RE = re.compile(r"\w+")
+
+
+class SnippetFragment:
+    __slots__ = ("text", "tokens", "shingles")
+
+    def __init__(self, text, tokens, shingles):
+        self.text = text
+        self.tokens = tokens
+        self.shingles = shingles
+
+
+def shingle_set(text, n=3):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return frozenset([hash(tuple(words))])
+    return frozenset(hash(tuple(words[i:i + n])) for i in range(len(words) - n + 1))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+def order_evidence(evidence, min_score=DEFAULT_MIN_SCORE):
+    """Contradicting and supporting items alternating by score, then insufficient ones by score."""
+    by_label = {"contradict": [], "support": [], "insufficient": []}
+    for ev in evidence:
+        if (ev.get("score") or 0.0) < min_score:
+            continue
+        by_label.get(ev.get("label"), by_label["insufficient"]).append(ev)
+    for items in by_label.values():
+        items.sort(key=lambda ev: -(ev.get("score") or 0.0))
+    ordered = []
+    con, sup = by_label["contradict"], by_label["support"]
+    for i in range(max(len(con), len(sup))):
+        ordered.extend(side[i] for side in (con, sup) if i < len(side))
+    return ordered + by_label["insufficient"]
+
+
+class PromptBuilder:
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, max_evidence=DEFAULT_MAX_EVIDENCE,
+                 snippet_chars=DEFAULT_SNIPPET_CHARS, dedupe_threshold=DEFAULT_DEDUPE_THRESHOLD,
+                 min_score=DEFAULT_MIN_SCORE):
+        self.token_budget = token_budget
+        self.max_evidence = max_evidence
+        self.snippet_chars = snippet_chars
+        self.dedupe_threshold = dedupe_threshold
+        self.min_score = min_score
+        self.fragments = {}  # (snippet_id, text length), or text hash without an id -> SnippetFragment
+
+    def fragment(self, ev):
+        raw = ev.get("snippet_text") or ev.get("text") or ""
+        sid = ev.get("snippet_id")
+        key = (sid, len(raw)) if sid is not None else hashlib.sha1(raw.encode("utf-8")).digest()
+        frag = self.fragments.get(key)
+        if frag is None:
+            text = WS_RE.sub(" ", raw).strip()
+            if len(text) > self.snippet_chars:
+                text = text[:self.snippet_chars].rsplit(" ", 1)[0] + " …"
+            frag = self.fragments[key] = SnippetFragment(text, estimate_tokens(text), shingle_set(text))
+        return frag
+
+    def near_duplicate(self, a, b):
+        # Jaccard can't reach the threshold when the sets differ too much in size; skips most pairs cheaply
+        la, lb = len(a.shingles), len(b.shingles)
+        if min(la, lb) < self.dedupe_threshold * max(la, lb) or a.shingles.isdisjoint(b.shingles):
+            return False
+        return jaccard(a.shingles, b.shingles) >= self.dedupe_threshold
+
+    def select(self, evidence, budget):
+        """Evidence lines that fit `budget` tokens, in order_evidence order minus near-duplicates."""
+        lines, kept = [], []
+        for ev in order_evidence(evidence, self.min_score):
+            if len(lines) >= self.max_evidence:
+                break
+            frag = self.fragment(ev)
+            if any(self.near_duplicate(frag, k) for k in kept):
+                continue
+            header = f"[{ev.get('label', 'insufficient')} {ev.get('score') or 0.0:.2f} | {ev.get('source_type') or 'unknown'}]"
+            line = f"- {header} {frag.text}"
+            cost = frag.tokens + estimate_tokens(header) + 1
+            if cost > budget:
+                continue
+            budget -= cost
+            lines.append(line)
+            kept.append(frag)
+        return lines
+
+    def build(self, claim, verification):
+        """Prompt for one claim; `verification` is its verification record (or None)."""
+        evidence = []
+        if isinstance(verification, dict):
+            evidence = verification.get("top_evidence", [])
+        elif isinstance(verification, list):
+            evidence = verification  # bare evidence list
+        fields = {"claim_text": claim.get("claim_text", ""), "metric": claim.get("metric"),
+                  "value": claim.get("numeric_value"), "unit": claim.get("unit")}
+        base_tokens = estimate_tokens(PROMPT_TEMPLATE.format(evidence="", **fields))
+        lines = self.select(evidence, self.token_budget - base_tokens)
+        return PROMPT_TEMPLATE.format(evidence="\n".join(lines) if lines else "- None", **fields)
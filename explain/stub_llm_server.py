@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+explain/stub_llm_server.py
+
+Local stand-in for an OpenAI-compatible /v1/chat/completions endpoint, for exercising
+explain/llm_worker.py without network access or an API key. Answers with the same heuristic as the
+mock backend (one answer per item for batched requests) and can inject latency, 500s, 429s with
+Retry-After (above --max_rps) and dropped batch items. GET /stats returns request counters.
+
+Usage:
+  python explain/stub_llm_server.py --port 8011 --latency 0.2 --fail_rate 0.1 --max_rps 20
+  python explain/llm_wrapper.py --task summarize --backend openai --base_url http://127.0.0.1:8011/v1
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `explain.*` when run as a script
+from explain.llm_worker import BATCH_INSTRUCTIONS
+
+ITEM_RE = re.compile(r"^### item (.+)$", re.M)
+
+
+def heuristic_answer(prompt):
+    confidence = 0.85 if "reduce" in prompt.lower() else 0.65
+    return {"summary": f"Stub assessment ({len(prompt)} chars of context).", "confidence": confidence,
+            "risk_flag": "low" if confidence > 0.8 else "medium"}
+
+
+def answer(content, drop_rate=0.0):
+    if not content.startswith(BATCH_INSTRUCTIONS):
+        return heuristic_answer(content)
+    parts = ITEM_RE.split(content)
+    out = {}
+    for item_id, prompt in zip(parts[1::2], parts[2::2]):
+        if random.random() >= drop_rate:
+            out[item_id.strip()] = heuristic_answer(prompt.strip())
+    return out
+
+
+class StubState:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.window = []
+        self.stats = {"requests": 0, "items": 0, "failed": 0, "rate_limited": 0}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, payload, headers=()):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with state.lock:
+                    self._send(200, dict(state.stats))
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": "not found"})
+                return
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+            args = state.args
+            with state.lock:
+                state.stats["requests"] += 1
+                now = time.monotonic()
+                state.window = [t for t in state.window if now - t < 1.0] + [now]
+                limited = args.max_rps and len(state.window) > args.max_rps
+                if limited:
+                    state.stats["rate_limited"] += 1
+            if limited:
+                self._send(429, {"error": "rate limited"}, [("Retry-After", "1")])
+                return
+            if args.latency:
+                time.sleep(args.latency)
+            if random.random() < args.fail_rate:
+                with state.lock:
+                    state.stats["failed"] += 1
+                self._send(500, {"error": "injected failure"})
+                return
+            content = req["messages"][-1]["content"]
+            result = answer(content, args.drop_rate)
+            with state.lock:
+                state.stats["items"] += len(result) if content.startswith(BATCH_INSTRUCTIONS) else 1
+            self._send(200, {"id": f"stub-{state.stats['requests']}", "model": req.get("model"),
+                             "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(result)},
+                                          "finish_reason": "stop"}]})
+
+    return Handler
+
+
+def serve(args):
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubState(args)))
+    print(f"Stub LLM server on http://{args.host}:{server.server_address[1]}/v1")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every answer")
+    parser.add_argument("--fail_rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--max_rps", type=int, default=0, help="answer 429 above this many requests per second (0 = off)")
+    parser.add_argument("--drop_rate", type=float, default=0.0, help="fraction of batch items left out of answers")
+    args = parser.parse_args()
+    serve(args).serve_forever()
@@ -2,24 +2,44 @@
 """
 nlp/build_graph.py
 
-Builds a lightweight graph per company linking Company -> Claim -> Snippet (evidence).
-Writes graph/{company_id}_graph.json which is a node/edge export friendly to Plotly or D3.
+Builds the Company -> Claim -> Snippet (evidence) graph for all companies as one global graph and
+writes graph/{company_id}_graph.json per company, a node/edge export friendly to Plotly or D3.
+
+The global graph is partitioned by company (a claim node's only predecessor is its company node) and
+snippet nodes are shared: a snippet cited by claims of several companies is a single node. It is kept
+in outputs/graph_store.json together with a fingerprint of what each claim rendered to, so a run
+only applies the claims whose claim/verification/evidence changed (and removes claims that are gone)
+and re-exports just the companies those deltas touched. --rebuild starts from an empty graph.
+Besides the node_link JSON, compact / binary / paged exports are available (nlp/graph_export.py).
 
 Usage:
   python nlp/build_graph.py --claims_dir claims/ --verification_dir verification/ --snippets data/cleaned/snippets.jsonl --out_dir graph/
+  python nlp/build_graph.py --rebuild
+  python nlp/build_graph.py --formats json,compact --page_size 50 --top_n 5
+
+Stage timings and graph sizes go to outputs/metrics/build_graph.json (nlp/metrics.py).
 """
 
 import argparse
+import hashlib
 import json
+import os
+import sys
 from pathlib import Path
 import networkx as nx
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import open_claim_store
+from nlp.metrics import add_metrics_args, metrics_from_args, write_metrics
+from nlp.graph_export import EXPORT_FORMATS, remove_exports, write_compact_json, write_npz, write_pages
+
+STORE_FORMAT = "esg-graph-store"
+STORE_VERSION = 1
+
 def load_claims(claims_dir):
     claims = {}
-    for p in Path(claims_dir).glob("*.json"):
-        with open(p, "r", encoding="utf-8") as f:
-            c = json.load(f)
-            claims[c['claim_id']] = c
+    for c in open_claim_store(claims_dir).iter_claims():
+        claims[c['claim_id']] = c
     return claims
 
 def load_verifications(verification_dir):
@@ -40,30 +60,169 @@ def load_snippets(snippets_path):
             snippets[s['snippet_id']] = s
     return snippets
 
-def build_graph_for_company(company_id, claims, verifications, snippets):
-    G = nx.DiGraph()
-    # add company node
-    G.add_node(f"Company:{company_id}", label=company_id, type="company")
-
-    # iterate claims for this company
-    for claim_id, claim in claims.items():
-        if claim.get("company_id") != company_id:
-            continue
-        G.add_node(f"Claim:{claim_id}", label=claim.get("claim_text")[:120], type="claim", metric=claim.get("metric"))
-        G.add_edge(f"Company:{company_id}", f"Claim:{claim_id}", relation="claims_from")
-
-        v = verifications.get(claim_id)
-        if not v:
-            continue
-        for ev in v.get("top_evidence", []):
-            sid = ev.get("snippet_id")
-            snippet = snippets.get(sid, {"text": ev.get("snippet_text", "")})
-            node_id = f"Snippet:{sid}"
-            if node_id not in G:
-                G.add_node(node_id, label=snippet.get("text","")[:120], type="snippet", source_id=ev.get("source_id"))
-            G.add_edge(f"Claim:{claim_id}", node_id, relation=ev.get("label"), score=ev.get("score"))
-
-    return G
+def render_claim(claim, verification, snippets):
+    """
+    Node/edge attributes one claim contributes: (claim attrs, [(snippet node id, snippet attrs, edge attrs)]).
+    """
+    claim_attrs = {"label": claim.get("claim_text")[:120], "type": "claim", "metric": claim.get("metric")}
+    evidence = []
+    for ev in (verification or {}).get("top_evidence", []):
+        sid = ev.get("snippet_id")
+        snippet = snippets.get(sid, {"text": ev.get("snippet_text", "")})
+        evidence.append((
+            f"Snippet:{sid}",
+            {"label": snippet.get("text","")[:120], "type": "snippet", "source_id": ev.get("source_id")},
+            {"relation": ev.get("label"), "score": ev.get("score")},
+        ))
+    return claim_attrs, evidence
+
+def fingerprint(company_id, rendered):
+    return hashlib.sha1(json.dumps([company_id, rendered], sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class GraphStore:
+    """Global claim/evidence graph, updated claim by claim."""
+
+    def __init__(self, G=None, fingerprints=None):
+        self.G = G if G is not None else nx.DiGraph()
+        self.fingerprints = fingerprints or {}  # claim_id -> fingerprint of the rendered claim
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != STORE_FORMAT or data.get("version") != STORE_VERSION:
+            raise ValueError(f"{path} is not a graph store of version {STORE_VERSION}")
+        return cls(nx.node_link_graph(data["graph"]), data["fingerprints"])
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"format": STORE_FORMAT, "version": STORE_VERSION,
+                       "graph": nx.node_link_data(self.G), "fingerprints": self.fingerprints}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def company_of(self, claim_id):
+        node = f"Claim:{claim_id}"
+        if node not in self.G:
+            return None
+        return next(iter(self.G.predecessors(node)))[len("Company:"):]
+
+    def _drop_evidence(self, claim_node):
+        snippets = list(self.G.successors(claim_node))
+        self.G.remove_edges_from([(claim_node, s) for s in snippets])
+        # shared snippet nodes stay while any other claim still cites them
+        self.G.remove_nodes_from([s for s in snippets if self.G.in_degree(s) == 0])
+
+    def remove_claim(self, claim_id):
+        """Removes a claim (and evidence nobody else cites). Returns the company touched, or None."""
+        company_id = self.company_of(claim_id)
+        self.fingerprints.pop(claim_id, None)
+        if company_id is None:
+            return None
+        node = f"Claim:{claim_id}"
+        self._drop_evidence(node)
+        self.G.remove_node(node)
+        company_node = f"Company:{company_id}"
+        if self.G.out_degree(company_node) == 0:
+            self.G.remove_node(company_node)
+        return company_id
+
+    def upsert_claim(self, claim, verification, snippets):
+        """
+        Adds or updates one claim. Returns the set of companies touched (empty if nothing changed;
+        two if the claim moved company).
+        """
+        claim_id, company_id = claim["claim_id"], claim.get("company_id")
+        rendered = render_claim(claim, verification, snippets)
+        fp = fingerprint(company_id, rendered)
+        if self.fingerprints.get(claim_id) == fp:
+            return set()
+        touched = {company_id}
+        node = f"Claim:{claim_id}"
+        previous = self.company_of(claim_id)
+        if previous is not None and previous != company_id:
+            touched.add(self.remove_claim(claim_id))
+        company_node = f"Company:{company_id}"
+        if company_node not in self.G:
+            self.G.add_node(company_node, label=company_id, type="company")
+        claim_attrs, evidence = rendered
+        if node in self.G:
+            self._drop_evidence(node)
+            self.G.nodes[node].update(claim_attrs)
+        else:
+            self.G.add_node(node, **claim_attrs)
+            self.G.add_edge(company_node, node, relation="claims_from")
+        for snippet_node, snippet_attrs, edge_attrs in evidence:
+            self.G.add_node(snippet_node, **snippet_attrs)
+            self.G.add_edge(node, snippet_node, **edge_attrs)
+        self.fingerprints[claim_id] = fp
+        return touched
+
+    def sync(self, claims, verifications, snippets):
+        """
+        Brings the graph in line with the full current claim set in one pass. Returns touched companies.
+        """
+        touched = set()
+        for claim_id, claim in claims.items():
+            touched |= self.upsert_claim(claim, verifications.get(claim_id), snippets)
+        for claim_id in [c for c in self.fingerprints if c not in claims]:
+            touched.add(self.remove_claim(claim_id))
+        touched.discard(None)
+        return touched
+
+    def company_graph(self, company_id, claim_nodes=None, top_n=0):
+        """
+        The company's partition: company node, its claims (or just `claim_nodes`), and the snippets they
+        cite. With top_n, only each claim's top_n highest-scoring evidence edges are included.
+        """
+        H = nx.DiGraph()
+        company_node = f"Company:{company_id}"
+        H.add_node(company_node, **self.G.nodes[company_node])
+        for claim_node in (self.G.successors(company_node) if claim_nodes is None else claim_nodes):
+            H.add_node(claim_node, **self.G.nodes[claim_node])
+            H.add_edge(company_node, claim_node, **self.G.edges[company_node, claim_node])
+            evidence = list(self.G.out_edges(claim_node, data=True))
+            if top_n:
+                evidence = sorted(evidence, key=lambda e: -(e[2].get("score") or 0.0))[:top_n]
+            for _, snippet_node, attrs in evidence:
+                if snippet_node not in H:
+                    H.add_node(snippet_node, **self.G.nodes[snippet_node])
+                H.add_edge(claim_node, snippet_node, **attrs)
+        return H
+
+    def export(self, out_dir, companies, formats=("json",), page_size=0, top_n=0):
+        """
+        Writes the requested exports (see nlp/graph_export.py) for the given companies; removes the
+        files of companies that are gone. The node_link JSON is always the full graph.
+        """
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for comp in sorted(companies, key=str):
+            company_node = f"Company:{comp}"
+            if company_node not in self.G:
+                remove_exports(out_dir, comp)
+                continue
+            if "json" in formats:
+                export_graph_json(self.company_graph(comp), out_dir / f"{comp}_graph.json")
+            if "compact" in formats or "npz" in formats:
+                H = self.company_graph(comp, top_n=top_n)
+                if "compact" in formats:
+                    write_compact_json(H, out_dir / f"{comp}_graph.compact.json")
+                if "npz" in formats:
+                    write_npz(H, out_dir / f"{comp}_graph.npz")
+            if page_size:
+                claim_nodes = list(self.G.successors(company_node))
+                pages = []
+                for start in range(0, len(claim_nodes), page_size):
+                    chunk = claim_nodes[start:start + page_size]
+                    pages.append((chunk, self.company_graph(comp, claim_nodes=chunk, top_n=top_n)))
+                write_pages(pages, comp, out_dir, page_size, top_n)
+            print("Wrote graph for", comp, "->", out_dir)
+
+def open_graph_store(path, rebuild=False):
+    return GraphStore.load(path) if not rebuild and Path(path).exists() else GraphStore()
 
 def export_graph_json(G, out_path):
     data = nx.node_link_data(G)
@@ -71,19 +230,33 @@ def export_graph_json(G, out_path):
         json.dump(data, f, indent=2, ensure_ascii=False)
 
 def main(args):
-    claims = load_claims(args.claims_dir)
-    verifications = load_verifications(args.verification_dir)
-    snippets = load_snippets(args.snippets)
-    out_dir = Path(args.out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    # compute set of companies
-    companies = set(c.get("company_id") for c in claims.values())
-    for comp in companies:
-        G = build_graph_for_company(comp, claims, verifications, snippets)
-        out_file = out_dir / f"{comp}_graph.json"
-        export_graph_json(G, out_file)
-        print("Wrote graph for", comp, "->", out_file)
+    metrics = metrics_from_args("build_graph", args)
+    with metrics.stage("load") as st:
+        claims = load_claims(args.claims_dir)
+        verifications = load_verifications(args.verification_dir)
+        snippets = load_snippets(args.snippets)
+        st.items = len(claims)
+
+    fresh = args.rebuild or not Path(args.store).exists()
+    with metrics.stage("sync", items=len(claims)):
+        store = open_graph_store(args.store, rebuild=fresh)
+        touched = store.sync(claims, verifications, snippets)
+    if fresh:
+        # no previous store to diff against: also refresh/remove whatever graph files are there
+        touched |= {p.name[:-len("_graph.json")] for p in Path(args.out_dir).glob("*_graph.json")}
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"unknown --formats {sorted(unknown)}; choose from {EXPORT_FORMATS}")
+    with metrics.stage("export", items=len(touched)):
+        store.export(args.out_dir, touched, formats=formats, page_size=args.page_size, top_n=args.top_n)
+        store.save(args.store)
+    metrics.count("company_graphs_exported", len(touched))
+    metrics.gauge("graph_nodes", store.G.number_of_nodes())
+    metrics.gauge("graph_edges", store.G.number_of_edges())
+    print(f"Graph store: {store.G.number_of_nodes()} nodes, {store.G.number_of_edges()} edges; "
+          f"{len(touched)} company graphs updated -> {args.store}")
+    write_metrics(metrics, args)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -91,5 +264,11 @@ if __name__ == "__main__":
     parser.add_argument("--verification_dir", default="verification/", help="verification dir")
     parser.add_argument("--snippets", default="data/cleaned/snippets.jsonl", help="snippets jsonl")
     parser.add_argument("--out_dir", default="graph/", help="output graph dir")
+    parser.add_argument("--store", default="outputs/graph_store.json", help="persistent global graph")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the global graph from scratch")
+    parser.add_argument("--formats", default="json", help=f"comma-separated exports: {','.join(EXPORT_FORMATS)} (see nlp/graph_export.py)")
+    parser.add_argument("--page_size", type=int, default=0, help="also write pages/{company}/ with this many claims per page")
+    parser.add_argument("--top_n", type=int, default=0, help="evidence edges per claim in compact/npz/paged exports (0 = all)")
+    add_metrics_args(parser)
     args = parser.parse_args()
     main(args)
@@ -3,15 +3,26 @@
 nlp/claim_extractor.py
 
 Reads: data/cleaned/snippets.jsonl
-Writes: claims/{company_id}_claim{n}.json  (one file per claim)
+Writes: claims/ as a sharded JSONL claim store (nlp/claim_store.py), or with --format files the
+        legacy claims/{company_id}_claim{n}.json  (one file per claim)
 
 Usage:
   python nlp/claim_extractor.py --snippets data/cleaned/snippets.jsonl --mappings mappings/metrics_map.json --ontology mappings/ontology_map.json --out_dir claims/
+  python nlp/claim_extractor.py --snippets data/cleaned/snippets.jsonl --batch_size 1000 --n_process 4
+  python nlp/claim_extractor.py --snippets data/cleaned/snippets.jsonl --format files
 
 Notes:
-- Requires spaCy en_core_web_sm installed.
+- Requires spaCy en_core_web_sm installed. The model is loaded lazily on first use, so importing
+  this module is cheap.
+- Snippets that cannot yield a claim (no digit; no pattern or ontology keyword) are skipped before
+  spaCy by a cheap regex prefilter; the hit rate is printed at the end.
+- Snippets are run through `nlp.pipe` in batches (optionally multi-process). Only the NER output is
+  read (`doc.ents`), so all other pipeline components are disabled.
 - This is rule-first extractor (regex + light spaCy signals). It's intentionally conservative.
 - Improvements: Prioritizes percent/unit-aware numeric extraction, and supports ontology aliases inside mappings file.
+- Metric mapping uses the shared precompiled index in nlp/ontology.py (one pass per snippet).
+- Stage timings and counters (snippets seen/prefiltered, claims emitted) go to
+  outputs/metrics/claim_extractor.json; see nlp/metrics.py for --prometheus_out and --profile.
 """
 
 import argparse
@@ -19,11 +30,21 @@ import json
 import os
 import re
 import hashlib
+import sys
 from collections import defaultdict
 from pathlib import Path
 
 import spacy
-nlp_spacy = spacy.load("en_core_web_sm")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import ClaimStore
+from nlp.metrics import add_metrics_args, metrics_from_args, write_metrics
+from nlp.ontology import OntologyIndex, build_ontology_index
+
+SPACY_MODEL = "en_core_web_sm"
+# pipeline components that set doc.ents; everything else is disabled
+ENTITY_COMPONENTS = ("ner", "entity_ruler")
+_nlp_spacy = None
 
 # Default regex patterns for ESG-like claims (percentages, "net zero", renewables, emissions)
 PATTERN_STRS = [
@@ -35,6 +56,12 @@ PATTERN_STRS = [
 ]
 PATTERNS = [re.compile(p, re.I) for p in PATTERN_STRS]
 
+# Prefilter: every pattern above and the keyword fallback need a digit, so a snippet without one can
+# never yield a claim. Otherwise it is a candidate if any pattern matches (one combined search) or an
+# ontology keyword is present.
+DIGIT_RE = re.compile(r"\d")
+PREFILTER_RE = re.compile("|".join(f"(?:{p})" for p in PATTERN_STRS), re.I)
+
 # Priority numeric/unit regexes: percent first, then mass units, then any number
 NUM_UNIT_RE_PRIORITY = [
     re.compile(r"(\d+(?:\.\d+)?)\s*(%|percent|percentage|pp)\b", re.I),
@@ -43,6 +70,35 @@ NUM_UNIT_RE_PRIORITY = [
 ]
 
 
+def get_nlp():
+    """
+    Load the spaCy model on first use. Everything except the entity components (and the tok2vec
+    layer NER listens to, if any) is disabled, since the extractor only reads `doc.ents`.
+    """
+    global _nlp_spacy
+    if _nlp_spacy is None:
+        nlp = spacy.load(SPACY_MODEL)
+        keep = set(ENTITY_COMPONENTS)
+        if "tok2vec" in nlp.pipe_names:
+            listeners = getattr(nlp.get_pipe("tok2vec"), "listening_components", [])
+            if any(name in listeners for name in ENTITY_COMPONENTS):
+                keep.add("tok2vec")
+        for name in nlp.pipe_names:
+            if name not in keep:
+                nlp.disable_pipe(name)
+        _nlp_spacy = nlp
+    return _nlp_spacy
+
+
+def iter_snippet_docs(snippets, batch_size=256, n_process=1):
+    """
+    Yields (snippet, doc) pairs in input order, running spaCy over the snippet texts with `nlp.pipe`.
+    """
+    pairs = ((s.get("text", ""), s) for s in snippets)
+    for doc, snippet in get_nlp().pipe(pairs, as_tuples=True, batch_size=batch_size, n_process=n_process):
+        yield snippet, doc
+
+
 def load_jsonl(path):
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
@@ -72,15 +128,6 @@ def load_json(p: str):
         return json.load(f)
 
 
-def map_metric_from_text(text: str, ontology_map: dict):
-    txt = text.lower()
-    for metric, keys in ontology_map.items():
-        for k in keys:
-            if k in txt:
-                return metric
-    return None
-
-
 def extract_numeric_and_unit(text: str):
     """
     Try percent/unit-aware regexes in priority order, then fallback to any number.
@@ -98,6 +145,17 @@ def extract_numeric_and_unit(text: str):
     return None, None
 
 
+def is_claim_candidate(text: str, ontology_index: OntologyIndex) -> bool:
+    """
+    Cheap test run before spaCy: False means `extract_claims_from_snippet` would return no claims.
+    """
+    if not DIGIT_RE.search(text):
+        return False
+    if PREFILTER_RE.search(text):
+        return True
+    return ontology_index.has_keyword(text)
+
+
 def heuristic_confidence(doc, regex_matched: bool):
     conf = 0.25
     # if spaCy recognized PERCENT or CARDINAL boost
@@ -109,20 +167,33 @@ def heuristic_confidence(doc, regex_matched: bool):
     return min(conf, 0.99)
 
 
-def extract_claims_from_snippet(snippet, metrics_map_obj, ontology_map_obj):
+def resolve_ontology_map(metrics_map_obj, ontology_map_obj):
+    # ontology_map_obj may be provided separately; otherwise fall back to metric_aliases inside metrics_map_obj
+    if ontology_map_obj:
+        return ontology_map_obj
+    return metrics_map_obj.get("metric_aliases", {}) if isinstance(metrics_map_obj, dict) else {}
+
+
+def extract_claims_from_snippet(snippet, metrics_map_obj, ontology_map_obj, doc=None, ontology_index=None):
     """
     Returns list of claim dicts extracted from snippet.
     - metrics_map_obj: full mappings JSON (contains 'units' and maybe 'metric_aliases')
     - ontology_map_obj: explicit ontology mapping dict (optional)
+    - doc: pre-computed spaCy doc for the snippet text (from `iter_snippet_docs`); parsed here if None
+    - ontology_index: prebuilt OntologyIndex for the resolved ontology map; built here if None
     """
     text = snippet.get("text", "")
-    doc = nlp_spacy(text)
+    if doc is None:
+        doc = get_nlp()(text)
     claims = []
 
-    # Determine units map and ontology map
+    # Determine units map and ontology index
     units_map = metrics_map_obj.get("units", {}) if isinstance(metrics_map_obj, dict) else {}
-    # ontology_map_obj may be provided separately; otherwise fall back to metric_aliases inside metrics_map_obj
-    ontology_map = ontology_map_obj if ontology_map_obj else metrics_map_obj.get("metric_aliases", {})
+    if ontology_index is None:
+        ontology_index = build_ontology_index(resolve_ontology_map(metrics_map_obj, ontology_map_obj))
+    # single pass over the text; reused by the regex path and the keyword fallback
+    ontology_hit = ontology_index.find(text)
+    mapped_metric = ontology_hit[0] if ontology_hit else None
 
     # Apply regex patterns
     matched_any = False
@@ -154,7 +225,7 @@ def extract_claims_from_snippet(snippet, metrics_map_obj, ontology_map_obj):
                         continue
 
         # map metric via ontology keywords
-        metric = map_metric_from_text(text, ontology_map)
+        metric = mapped_metric
 
         # if claim contains "net zero" handle as year-based claim
         netzero = re.search(r"net[-\s]?zero\s*(?:by|in)?\s*(\d{4})", text, re.I)
@@ -187,10 +258,7 @@ def extract_claims_from_snippet(snippet, metrics_map_obj, ontology_map_obj):
 
     # fallback: short heuristic if no regex matched but contains keywords and numbers
     if not matched_any:
-        text_l = text.lower()
-        # determine ontology map fallback if not already set
-        ontology_map = ontology_map if ontology_map else metrics_map_obj.get("metric_aliases", {})
-        has_keyword = any(k in text_l for klist in ontology_map.values() for k in klist) if ontology_map else False
+        has_keyword = ontology_hit is not None
         parsed_val, parsed_unit = extract_numeric_and_unit(text)
         if has_keyword and parsed_val is not None:
             claim = {
@@ -198,7 +266,7 @@ def extract_claims_from_snippet(snippet, metrics_map_obj, ontology_map_obj):
                 "claim_text": text.strip(),
                 "numeric_value": parsed_val,
                 "unit": normalize_unit(parsed_unit, units_map) if parsed_unit else None,
-                "metric": map_metric_from_text(text, ontology_map) or "unknown",
+                "metric": mapped_metric or "unknown",
                 "baseline": None,
                 "reporting_period": snippet.get("date"),
                 "extracted_from": snippet.get("snippet_id"),
@@ -223,23 +291,58 @@ def main(args):
 
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
+    metrics = metrics_from_args("claim_extractor", args)
 
     # keep counts per company
     company_counts = defaultdict(int)
 
-    for snippet in load_jsonl(str(snippets_path)):
-        # sanity: require company_id and snippet_id
-        if not snippet.get("company_id") or not snippet.get("snippet_id"):
-            continue
-        claims = extract_claims_from_snippet(snippet, metrics_map, ontology_map)
-        for claim in claims:
-            company = claim["company_id"]
-            company_counts[company] += 1
-            filename = out_dir / f"{company}_claim{company_counts[company]:03d}.json"
-            with open(filename, "w", encoding="utf-8") as fw:
-                json.dump(claim, fw, indent=2, ensure_ascii=False)
+    # built once; used by both the prefilter and the extractor
+    ontology_index = build_ontology_index(resolve_ontology_map(metrics_map, ontology_map))
+    prefilter_stats = {"seen": 0, "passed": 0}
 
+    def candidate_snippets():
+        for s in load_jsonl(str(snippets_path)):
+            # sanity: require company_id and snippet_id
+            if not s.get("company_id") or not s.get("snippet_id"):
+                continue
+            prefilter_stats["seen"] += 1
+            if args.no_prefilter or is_claim_candidate(s.get("text", ""), ontology_index):
+                prefilter_stats["passed"] += 1
+                yield s
+
+    store = None
+    if args.format == "jsonl":
+        store = ClaimStore.create(out_dir, compression=args.compression, overwrite=True)
+    pending = []
+
+    with metrics.stage("extract") as st:
+        for snippet, doc in iter_snippet_docs(candidate_snippets(), batch_size=args.batch_size, n_process=args.n_process):
+            claims = extract_claims_from_snippet(snippet, metrics_map, ontology_map, doc=doc, ontology_index=ontology_index)
+            for claim in claims:
+                company = claim["company_id"]
+                company_counts[company] += 1
+                if store is not None:
+                    pending.append(claim)
+                    continue
+                filename = out_dir / f"{company}_claim{company_counts[company]:03d}.json"
+                with open(filename, "w", encoding="utf-8") as fw:
+                    json.dump(claim, fw, indent=2, ensure_ascii=False)
+            if len(pending) >= args.batch_size:
+                store.append(pending)
+                pending = []
+
+        if store is not None and pending:
+            store.append(pending)
+        st.items = prefilter_stats["seen"]
+
+    seen, passed = prefilter_stats["seen"], prefilter_stats["passed"]
+    metrics.count("snippets_seen", seen)
+    metrics.count("snippets_prefilter_passed", passed)
+    metrics.count("claims_emitted", sum(company_counts.values()))
+    metrics.hit_rate("prefilter_hit_rate", passed, seen)
+    print(f"Prefilter: {passed}/{seen} snippets sent to spaCy ({(passed / seen if seen else 0.0):.1%} hit rate)")
     print("Extraction finished. Claims per company:", dict(company_counts))
+    write_metrics(metrics, args)
 
 
 if __name__ == "__main__":
@@ -248,5 +351,11 @@ if __name__ == "__main__":
     parser.add_argument("--mappings", default="mappings/metrics_map.json", help="unit/metric mapping JSON")
     parser.add_argument("--ontology", default="mappings/ontology_map.json", help="ontology keyword mapping JSON (optional)")
     parser.add_argument("--out_dir", default="claims", help="output claims directory")
+    parser.add_argument("--batch_size", type=int, default=256, help="snippets per spaCy nlp.pipe batch")
+    parser.add_argument("--n_process", type=int, default=1, help="spaCy worker processes (-1 = all CPUs)")
+    parser.add_argument("--format", choices=["jsonl", "files"], default="jsonl", help="claim store or one JSON file per claim")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None, help="claim store shard compression")
+    parser.add_argument("--no_prefilter", action="store_true", help="run spaCy on every snippet (debug/comparison)")
+    add_metrics_args(parser)
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+nlp/claim_store.py
+
+Sharded, append-only JSONL claim store with an offset index.
+
+Layout of a store directory:
+  manifest.json              format/version, compression, shard list and per-shard record counts
+  claims-00000.jsonl[.gz|.zst]
+  claims-00001.jsonl[.gz|.zst]
+  index.jsonl                one line per stored record: claim_id, company_id, shard, offset, length, line
+
+Each `append()` call writes one block per shard it touches. Uncompressed shards hold plain JSON lines
+and every record is indexed with its own byte offset. Compressed shards hold one gzip member / zstd
+frame per block (concatenated members are still a valid stream), and the index points at the block
+plus the line inside it, so a lookup decompresses one block only. Records are never rewritten: a
+later record with the same claim_id supersedes the earlier one. `compact` rewrites the store with the
+latest versions only (optionally dropping claims).
+
+`open_claim_store(path)` returns a store if `path/manifest.json` exists and otherwise a read-only view
+over the legacy one-file-per-claim directory (claims/{company_id}_claimNNN.json), with the same
+reader API, so every consumer works with either layout.
+
+Usage:
+  python nlp/claim_store.py convert --src claims/ --dst claims_store/ --compression gzip
+  python nlp/claim_store.py stats --path claims_store/
+  python nlp/claim_store.py compact --path claims_store/
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import shutil
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for --compression zstd
+    zstandard = None
+
+STORE_FORMAT = "esg-claim-store"
+STORE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+INDEX_NAME = "index.jsonl"
+DEFAULT_SHARD_SIZE = 100_000
+COMPRESSION_SUFFIX = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+
+def _require_codec(compression):
+    if compression not in COMPRESSION_SUFFIX:
+        raise ValueError(f"Unknown compression {compression!r}; expected one of None, 'gzip', 'zstd'.")
+    if compression == "zstd" and zstandard is None:
+        raise ImportError("zstd compression requires the `zstandard` package (pip install zstandard).")
+
+
+def _compress(data: bytes, compression):
+    if compression == "gzip":
+        return gzip.compress(data)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(data: bytes, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def _open_shard_stream(path: Path, compression):
+    """Binary line stream over a whole shard (all blocks)."""
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        raw = open(path, "rb")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True))
+    return open(path, "rb")
+
+
+def _write_json_atomic(path: Path, obj):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+class ClaimStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        manifest_path = self.root / MANIFEST_NAME
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"{manifest_path} not found; create the store with ClaimStore.create().")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != STORE_FORMAT:
+            raise ValueError(f"{manifest_path} is not a claim store manifest.")
+        self.compression = self.manifest.get("compression")
+        _require_codec(self.compression)
+        self._index = None  # claim_id -> latest index entry, loaded lazily
+        self._versions = None  # claim_id -> number of stored records
+
+    @classmethod
+    def create(cls, root, compression=None, shard_size=DEFAULT_SHARD_SIZE, overwrite=False):
+        """
+        Create an empty store in `root`. With overwrite, an existing store there is removed first
+        (only store files are touched; legacy per-claim JSON files are left alone).
+        """
+        _require_codec(compression)
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        manifest_path = root / MANIFEST_NAME
+        if manifest_path.exists():
+            if not overwrite:
+                raise FileExistsError(f"{manifest_path} already exists.")
+            old = cls(root)
+            for shard in old.manifest.get("shards", []):
+                (root / shard["name"]).unlink(missing_ok=True)
+            (root / INDEX_NAME).unlink(missing_ok=True)
+        (root / INDEX_NAME).touch()
+        _write_json_atomic(manifest_path, {
+            "format": STORE_FORMAT,
+            "version": STORE_VERSION,
+            "compression": compression,
+            "shard_size": int(shard_size),
+            "shards": [],
+            "count": 0,
+        })
+        return cls(root)
+
+    # ---------- writing ----------
+
+    def _new_shard(self):
+        name = f"claims-{len(self.manifest['shards']):05d}{COMPRESSION_SUFFIX[self.compression]}"
+        shard = {"name": name, "count": 0}
+        self.manifest["shards"].append(shard)
+        return shard
+
+    def append(self, claims):
+        """
+        Append claim dicts (each must carry claim_id). Returns the number of records written.
+        """
+        claims = list(claims)
+        shard_size = self.manifest["shard_size"]
+        written = 0
+        with open(self.root / INDEX_NAME, "a", encoding="utf-8") as index_f:
+            while written < len(claims):
+                shards = self.manifest["shards"]
+                shard = shards[-1] if shards and shards[-1]["count"] < shard_size else self._new_shard()
+                shard_no = len(self.manifest["shards"]) - 1
+                chunk = claims[written:written + shard_size - shard["count"]]
+                lines = [json.dumps(c, ensure_ascii=False).encode("utf-8") + b"\n" for c in chunk]
+                shard_path = self.root / shard["name"]
+                with open(shard_path, "ab") as f:
+                    offset = f.tell()
+                    if self.compression is None:
+                        f.write(b"".join(lines))
+                        spans = []
+                        for line in lines:
+                            spans.append((offset, len(line), 0))
+                            offset += len(line)
+                    else:
+                        block = _compress(b"".join(lines), self.compression)
+                        f.write(block)
+                        spans = [(offset, len(block), i) for i in range(len(lines))]
+                entries = []
+                for c, (off, length, line_no) in zip(chunk, spans):
+                    entry = {
+                        "claim_id": c.get("claim_id"),
+                        "company_id": c.get("company_id"),
+                        "shard": shard_no,
+                        "offset": off,
+                        "length": length,
+                        "line": line_no,
+                    }
+                    entries.append(entry)
+                    index_f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                if self._index is not None:
+                    for e in entries:
+                        self._index[e["claim_id"]] = e
+                        self._versions[e["claim_id"]] = self._versions.get(e["claim_id"], 0) + 1
+                shard["count"] += len(chunk)
+                self.manifest["count"] += len(chunk)
+                written += len(chunk)
+        _write_json_atomic(self.root / MANIFEST_NAME, self.manifest)
+        return written
+
+    def compact(self, drop=(), batch_size=10_000):
+        """
+        Rewrite the store keeping only the latest version of each claim and leaving out the claim_ids
+        in `drop`. The new shards are written next to the store and swapped in (manifest last).
+        Returns the number of claims kept.
+        """
+        drop = set(drop)
+        tmp = self.root.with_name(self.root.name + ".compact")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        new = ClaimStore.create(tmp, compression=self.compression, shard_size=self.manifest["shard_size"])
+        batch, kept = [], 0
+        for claim in self.iter_claims():
+            if claim.get("claim_id") in drop:
+                continue
+            batch.append(claim)
+            if len(batch) >= batch_size:
+                kept += new.append(batch)
+                batch = []
+        if batch:
+            kept += new.append(batch)
+        for shard in self.manifest["shards"]:
+            (self.root / shard["name"]).unlink(missing_ok=True)
+        for p in sorted(tmp.iterdir(), key=lambda p: p.name == MANIFEST_NAME):
+            os.replace(p, self.root / p.name)
+        tmp.rmdir()
+        self.__init__(self.root)
+        return kept
+
+    # ---------- reading ----------
+
+    def _load_index(self):
+        if self._index is None:
+            index, versions = {}, {}
+            with open(self.root / INDEX_NAME, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        e = json.loads(line)
+                        index[e["claim_id"]] = e
+                        versions[e["claim_id"]] = versions.get(e["claim_id"], 0) + 1
+            self._index, self._versions = index, versions
+        return self._index
+
+    def _read_entries(self, entries):
+        """Yields claims for index entries, decompressing each block at most once in a row."""
+        cached_key, cached_lines = None, None
+        handles = {}
+        try:
+            for e in entries:
+                key = (e["shard"], e["offset"])
+                if key != cached_key:
+                    f = handles.get(e["shard"])
+                    if f is None:
+                        f = handles[e["shard"]] = open(self.root / self.manifest["shards"][e["shard"]]["name"], "rb")
+                    f.seek(e["offset"])
+                    cached_lines = _decompress(f.read(e["length"]), self.compression).splitlines()
+                    cached_key = key
+                yield json.loads(cached_lines[e["line"]])
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def get(self, claim_id):
+        e = self._load_index().get(claim_id)
+        if e is None:
+            return None
+        return next(self._read_entries([e]))
+
+    def claim_ids(self):
+        return list(self._load_index().keys())
+
+    def iter_claims(self, company_id=None):
+        """
+        Streams the latest version of every claim in append order. With company_id, only that
+        company's records are read (via the offset index).
+        """
+        if company_id is not None:
+            entries = [e for e in self._load_index().values() if e.get("company_id") == company_id]
+            entries.sort(key=lambda e: (e["shard"], e["offset"], e["line"]))
+            yield from self._read_entries(entries)
+            return
+        versions = None
+        if len(self._load_index()) < self.manifest["count"]:
+            # superseded records exist: yield each claim at its last stored position only
+            versions, seen = self._versions, {}
+        for shard in self.manifest["shards"]:
+            with _open_shard_stream(self.root / shard["name"], self.compression) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    claim = json.loads(line)
+                    if versions is not None:
+                        cid = claim.get("claim_id")
+                        seen[cid] = seen.get(cid, 0) + 1
+                        if seen[cid] != versions.get(cid):
+                            continue
+                    yield claim
+
+    def __iter__(self):
+        return self.iter_claims()
+
+    def __len__(self):
+        return len(self._load_index())
+
+
+class ClaimDir:
+    """Read-only view over the legacy claims/{company_id}_claimNNN.json layout."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._by_id = None
+
+    def _files(self):
+        return sorted(p for p in self.root.glob("*.json") if p.name != MANIFEST_NAME)
+
+    def iter_claims(self, company_id=None):
+        for p in self._files():
+            if company_id is not None and not p.name.startswith(f"{company_id}_claim"):
+                continue
+            with open(p, "r", encoding="utf-8") as f:
+                claim = json.load(f)
+            if company_id is None or claim.get("company_id") == company_id:
+                yield claim
+
+    def get(self, claim_id):
+        if self._by_id is None:
+            self._by_id = {c.get("claim_id"): c for c in self.iter_claims()}
+        return self._by_id.get(claim_id)
+
+    def claim_ids(self):
+        return [c.get("claim_id") for c in self.iter_claims()]
+
+    def __iter__(self):
+        return self.iter_claims()
+
+    def __len__(self):
+        return len(self._files())
+
+
+def is_claim_store(path) -> bool:
+    return (Path(path) / MANIFEST_NAME).exists()
+
+
+def open_claim_store(path):
+    """ClaimStore if `path` holds one, else the legacy per-file directory view."""
+    return ClaimStore(path) if is_claim_store(path) else ClaimDir(path)
+
+
+def convert_dir_to_store(src, dst, compression=None, shard_size=DEFAULT_SHARD_SIZE, batch_size=10_000, overwrite=False):
+    """Copy every claim from a legacy per-file claims directory into a new store. Returns the count."""
+    store = ClaimStore.create(dst, compression=compression, shard_size=shard_size, overwrite=overwrite)
+    batch, total = [], 0
+    for claim in ClaimDir(src).iter_claims():
+        batch.append(claim)
+        if len(batch) >= batch_size:
+            total += store.append(batch)
+            batch = []
+    if batch:
+        total += store.append(batch)
+    return total
+
+
+def main(args):
+    if args.cmd == "convert":
+        n = convert_dir_to_store(args.src, args.dst, compression=args.compression, shard_size=args.shard_size, overwrite=args.overwrite)
+        print(f"Converted {n} claims from {args.src} -> {args.dst}")
+    elif args.cmd == "stats":
+        store = open_claim_store(args.path)
+        print(f"{args.path}: {len(store)} claims ({type(store).__name__})")
+        if isinstance(store, ClaimStore):
+            print("compression:", store.compression, "| shards:", len(store.manifest["shards"]), "| records:", store.manifest["count"])
+    elif args.cmd == "compact":
+        store = ClaimStore(args.path)
+        records = store.manifest["count"]
+        n = store.compact()
+        print(f"Compacted {args.path}: {records} records -> {n} claims")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_conv = sub.add_parser("convert", help="convert a per-claim JSON directory into a claim store")
+    p_conv.add_argument("--src", default="claims/")
+    p_conv.add_argument("--dst", required=True)
+    p_conv.add_argument("--compression", choices=["gzip", "zstd"], default=None)
+    p_conv.add_argument("--shard_size", type=int, default=DEFAULT_SHARD_SIZE)
+    p_conv.add_argument("--overwrite", action="store_true")
+    p_stats = sub.add_parser("stats", help="print record counts for a store or claims directory")
+    p_stats.add_argument("--path", default="claims/")
+    p_compact = sub.add_parser("compact", help="rewrite a store without superseded records")
+    p_compact.add_argument("--path", default="claims/")
+    args = parser.parse_args()
+    main(args)
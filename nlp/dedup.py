@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+nlp/dedup.py
+
+Near-duplicate snippet clustering with MinHash LSH, so the matcher scores one representative per
+cluster (the same sentence in a report PDF and a press release, a wire story on several sites) and
+lists the other members as corroborating sources.
+
+  - every snippet is reduced to its word 3-shingles (lower-cased, crc32-hashed) and a MinHash
+    signature of --num_perm universal hash functions
+  - signatures are cut into --bands bands; snippets sharing any band bucket are candidate pairs,
+    found by sorting each band's keys (no pairwise comparison, O(n log n) per band)
+  - candidates are kept when their signatures agree on >= --threshold of the positions (the
+    estimated Jaccard similarity); clusters are the connected components of the kept pairs
+  - a cluster's representative is its first snippet in corpus order, and its cluster id is the
+    representative's snippet_id (singletons are their own cluster)
+
+With 64 permutations in 16 bands, pairs at Jaccard 0.8 collide in some band with probability > 0.999
+and pairs below 0.4 rarely do. Snippets without any word are never clustered.
+
+The evidence index (nlp/evidence_index.py) keeps the signatures of indexed snippets, so only newly
+appended snippets are hashed; the banding pass over all signatures is vectorized.
+
+Usage:
+  python nlp/dedup.py --snippets data/cleaned/snippets.jsonl --out outputs/snippet_clusters.jsonl
+  python nlp/dedup.py --index_dir evidence_index/ --threshold 0.9
+"""
+
+import argparse
+import json
+import re
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SHINGLE_SIZE = 3
+DEFAULT_SEED = 1
+
+MERSENNE_PRIME = (1 << 31) - 1
+EMPTY = np.uint32(0xFFFFFFFF)  # signature of a snippet without shingles; real values are < MERSENNE_PRIME
+WORD_RE = re.compile(r"\w+")
+HASH_BATCH = 2_000_000  # shingles hashed per numpy pass (x perms chunk of 16 -> ~256 MB of uint64)
+VERIFY_BATCH = 1_000_000  # candidate pairs compared per numpy pass
+
+
+def shingle_hashes(text, n=DEFAULT_SHINGLE_SIZE):
+    """crc32 of each word n-gram of `text` (the whole text when it has fewer than n words)."""
+    words = WORD_RE.findall((text or "").lower())
+    if not words:
+        return []
+    if len(words) < n:
+        return [zlib.crc32(" ".join(words).encode("utf-8"))]
+    return list({zlib.crc32(" ".join(words[i:i + n]).encode("utf-8")) for i in range(len(words) - n + 1)})
+
+
+class MinHasher:
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE, seed=DEFAULT_SEED):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    @property
+    def params(self):
+        return {"num_perm": self.num_perm, "shingle_size": self.shingle_size, "seed": self.seed}
+
+    def signatures(self, texts):
+        """(len(texts), num_perm) uint32 MinHash signatures; rows without shingles are all EMPTY."""
+        texts = list(texts)
+        sigs = np.full((len(texts), self.num_perm), EMPTY, dtype=np.uint32)
+        start = 0
+        while start < len(texts):
+            # gather rows until the batch holds HASH_BATCH shingles
+            rows, flat, total = [], [], 0
+            while start < len(texts) and (total < HASH_BATCH or not rows):
+                h = shingle_hashes(texts[start], self.shingle_size)
+                if h:
+                    rows.append(start)
+                    flat.append(h)
+                    total += len(h)
+                start += 1
+            if rows:
+                self._fill(sigs, np.array(rows), flat)
+        return sigs
+
+    def _fill(self, sigs, rows, flat):
+        lengths = np.fromiter((len(h) for h in flat), dtype=np.int64, count=len(flat))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        x = np.fromiter((v for h in flat for v in h), dtype=np.uint64, count=int(lengths.sum())) % MERSENNE_PRIME
+        for p in range(0, self.num_perm, 16):
+            a, b = self.a[p:p + 16, None], self.b[p:p + 16, None]
+            vals = (a * x[None, :] + b) % MERSENNE_PRIME  # a, x < 2**31: no uint64 overflow
+            sigs[rows, p:p + 16] = np.minimum.reduceat(vals, starts, axis=1).T.astype(np.uint32)
+
+
+def band_keys(sigs, bands=DEFAULT_BANDS):
+    """(n, bands) uint64 bucket key per band: a multiplicative hash of the band's signature values."""
+    n, num_perm = sigs.shape
+    if num_perm % bands:
+        raise ValueError(f"num_perm {num_perm} is not divisible by bands {bands}")
+    rows = num_perm // bands
+    mult = np.random.RandomState(0).randint(1, 1 << 62, size=rows, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+    with np.errstate(over="ignore"):  # wrap-around is the point
+        return (sigs.reshape(n, bands, rows).astype(np.uint64) * mult).sum(axis=2, dtype=np.uint64)
+
+
+def candidate_pairs(keys, valid):
+    """(i, j) row pairs sharing a bucket in some band; each row is paired with its bucket's first row."""
+    rows = np.nonzero(valid)[0]
+    pairs = []
+    for band in range(keys.shape[1]):
+        k = keys[rows, band]
+        order = np.argsort(k, kind="stable")
+        sorted_keys = k[order]
+        new_bucket = np.empty(len(order), dtype=bool)
+        new_bucket[:1] = True
+        new_bucket[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        first = order[np.nonzero(new_bucket)[0]][np.cumsum(new_bucket) - 1]
+        dup = first != order
+        if dup.any():
+            pairs.append(rows[first[dup]] * len(valid) + rows[order[dup]])
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.unique(np.concatenate(pairs))
+    return pairs // len(valid), pairs % len(valid)
+
+
+def cluster_signatures(sigs, bands=DEFAULT_BANDS, threshold=DEFAULT_THRESHOLD):
+    """
+    Representative row for every row of `sigs`: the lowest row index of its near-duplicate cluster
+    (the row itself for singletons).
+    """
+    n = sigs.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    valid = sigs[:, 0] != EMPTY
+    i, j = candidate_pairs(band_keys(sigs, bands), valid)
+    keep = np.zeros(len(i), dtype=bool)
+    for s in range(0, len(i), VERIFY_BATCH):
+        agree = (sigs[i[s:s + VERIFY_BATCH]] == sigs[j[s:s + VERIFY_BATCH]]).mean(axis=1)
+        keep[s:s + VERIFY_BATCH] = agree >= threshold
+    graph = sp.coo_matrix((np.ones(int(keep.sum()), dtype=np.int8), (i[keep], j[keep])), shape=(n, n))
+    n_clusters, labels = connected_components(graph, directed=False)
+    first = np.full(n_clusters, n, dtype=np.int64)
+    np.minimum.at(first, labels, np.arange(n))
+    return first[labels]
+
+
+def cluster_members(reps):
+    """Representative row -> array of all rows in its cluster, for clusters with more than one row."""
+    dup = np.nonzero(reps != np.arange(len(reps)))[0]
+    if len(dup) == 0:
+        return {}
+    rows = np.concatenate([np.unique(reps[dup]), dup])
+    order = np.argsort(reps[rows], kind="stable")
+    rows, keys = rows[order], reps[rows][order]
+    bounds = np.nonzero(np.diff(keys))[0] + 1
+    return {int(group[0]): np.sort(group) for group in np.split(rows, bounds)}
+
+
+def cluster_stats(reps):
+    dup = int((reps != np.arange(len(reps))).sum())
+    return {"snippets": len(reps), "clusters": len(reps) - dup, "duplicates": dup,
+            "multi_member_clusters": int(len(np.unique(reps[reps != np.arange(len(reps))])))}
+
+
+def load_jsonl(path):
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                out.append(json.loads(line))
+            except Exception:
+                continue
+    return out
+
+
+def main(args):
+    if args.index_dir:
+        from nlp.evidence_index import EvidenceIndex  # imports this module
+        index = EvidenceIndex(args.index_dir)
+        reps = index.near_duplicates(threshold=args.threshold, num_perm=args.num_perm, bands=args.bands)
+        snippets = index.snippets
+    else:
+        snippets = load_jsonl(args.snippets)
+        hasher = MinHasher(args.num_perm)
+        reps = cluster_signatures(hasher.signatures(s.get("text", "") for s in snippets), args.bands, args.threshold)
+    stats = cluster_stats(reps)
+    print(f"Near-duplicates: {stats['duplicates']} of {stats['snippets']} snippets fall into "
+          f"{stats['multi_member_clusters']} multi-snippet clusters ({stats['clusters']} clusters total)")
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            for row, rep in enumerate(reps.tolist()):
+                f.write(json.dumps({"snippet_id": snippets[row].get("snippet_id"),
+                                    "cluster_id": snippets[rep].get("snippet_id")}) + "\n")
+        print("Cluster assignments ->", args.out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snippets", default="data/cleaned/snippets.jsonl")
+    parser.add_argument("--index_dir", default=None, help="cluster an evidence index instead (reuses its stored signatures)")
+    parser.add_argument("--out", default=None, help="JSONL of {snippet_id, cluster_id}")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="minimum estimated Jaccard similarity")
+    parser.add_argument("--num_perm", type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS)
+    args = parser.parse_args()
+    main(args)
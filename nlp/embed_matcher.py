@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+nlp/embed_matcher.py
+
+Dense-embedding verification engine (Sentence-BERT). Same inputs, candidate policies and
+verification/{claim_id}_evidence.json schema as nlp/embed_matcher_tfidf.py.
+
+- Snippets and claims are encoded in batches on CPU.
+- Embeddings are cached on disk keyed by sha1(model + text), so unchanged snippets are never
+  re-encoded across runs.
+- Candidate blocks larger than --ann_min_size are searched with an approximate nearest neighbour index
+  (hnswlib HNSW, else faiss IVF, if installed); smaller blocks, and any setup without those packages,
+  use exact numpy search.
+
+Runs offline: --model takes a sentence-transformers model name already in the local cache or a local
+model directory, and `--model hashing` selects a tiny dependency-free hashing encoder for tests/demos.
+
+Usage:
+ python nlp/embed_matcher.py --claims_dir claims/ --snippets data/cleaned/snippets.jsonl --out_dir verification/
+ python nlp/embed_matcher.py --snippets data/cleaned/snippets.jsonl --model models/all-MiniLM-L6-v2 --ann hnsw
+ python nlp/embed_matcher.py --snippets data/cleaned/snippets.jsonl --model hashing --ann numpy
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.embed_matcher_tfidf import (
+    CANDIDATE_POLICIES, SnippetNumerics, build_candidate_groups, build_verification, load_claims_from_dir,
+    load_snippets, load_tolerances, top_k_per_row, write_verifications,
+)
+
+try:
+    import hnswlib
+except ImportError:  # optional ANN backend
+    hnswlib = None
+try:
+    import faiss
+except ImportError:  # optional ANN backend
+    faiss = None
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ANN_BACKENDS = ["auto", "hnsw", "ivf", "numpy"]
+TOKEN_RE = re.compile(r"\w+", re.U)
+
+
+class HashingEncoder:
+    """
+    Tiny offline stand-in for a sentence-transformers model: signed feature hashing of word uni/bigrams,
+    L2-normalized. Deterministic and dependency-free; meant for tests and demos, not for quality.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _vector(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        toks = TOKEN_RE.findall(text.lower())
+        for feat in toks + [a + " " + b for a, b in zip(toks, toks[1:])]:
+            h = int.from_bytes(hashlib.md5(feat.encode("utf-8")).digest()[:8], "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def encode(self, texts, batch_size=64, **kwargs):
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._vector(t) for t in texts])
+
+
+def load_encoder(model_name):
+    if model_name == "hashing":
+        return HashingEncoder()
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ImportError("sentence-transformers is required for --model other than 'hashing'.")
+    # never reach out to the hub: the model must be a local directory or already cached
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def encode_texts(encoder, texts, batch_size):
+    vecs = encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(vecs, dtype=np.float32)
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk embedding cache: emb-NNNNN.npy (float32 rows) + emb-NNNNN.keys (one
+    sha1(model + text) per row). Vectors are memory-mapped on load.
+    """
+
+    def __init__(self, root, model_name):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.root = Path(root) / slug
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self._segments = []
+        self._where = {}
+        for keys_path in sorted(self.root.glob("emb-*.keys")):
+            seg = len(self._segments)
+            self._segments.append(np.load(keys_path.with_suffix(".npy"), mmap_mode="r"))
+            with open(keys_path, "r", encoding="utf-8") as f:
+                for row, key in enumerate(f):
+                    self._where[key.rstrip("\n")] = (seg, row)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        return hashlib.sha1((self.model_name + "\0" + text).encode("utf-8")).hexdigest()
+
+    def get_or_encode(self, texts, encoder, batch_size=64):
+        """Embeddings for `texts` (rows in input order); only texts missing from the cache are encoded."""
+        keys = [self.key(t) for t in texts]
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in self._where and k not in missing:
+                missing[k] = t
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        if missing:
+            new_keys = list(missing)
+            vecs = encode_texts(encoder, [missing[k] for k in new_keys], batch_size)
+            name = f"emb-{len(self._segments):05d}"
+            np.save(self.root / f"{name}.npy", vecs)
+            with open(self.root / f"{name}.keys", "w", encoding="utf-8") as f:
+                f.write("".join(k + "\n" for k in new_keys))
+            seg = len(self._segments)
+            self._segments.append(np.load(self.root / f"{name}.npy", mmap_mode="r"))
+            for row, k in enumerate(new_keys):
+                self._where[k] = (seg, row)
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        where = np.array([self._where[k] for k in keys], dtype=np.int64)
+        out = np.empty((len(keys), self._segments[0].shape[1]), dtype=np.float32)
+        for seg in np.unique(where[:, 0]):
+            mask = where[:, 0] == seg
+            out[mask] = self._segments[seg][where[mask, 1]]
+        return out
+
+
+class NumpySearcher:
+    """Exact inner-product search (vectors are L2-normalized, so this is cosine similarity)."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def query(self, queries, k, max_block_mb=256):
+        n = self.vectors.shape[0]
+        chunk = max(1, int(max_block_mb * 1024 * 1024 // (4 * max(n, 1))))
+        idx_parts, val_parts = [], []
+        for start in range(0, queries.shape[0], chunk):
+            idx, vals = top_k_per_row(queries[start:start + chunk] @ self.vectors.T, k)
+            idx_parts.append(idx)
+            val_parts.append(vals)
+        return np.vstack(idx_parts), np.vstack(val_parts)
+
+
+class HnswSearcher:
+    def __init__(self, vectors, m=16, ef_construction=200):
+        self.index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        self.index.init_index(max_elements=vectors.shape[0], M=m, ef_construction=ef_construction)
+        self.index.add_items(vectors, np.arange(vectors.shape[0]))
+        self.n = vectors.shape[0]
+
+    def query(self, queries, k, max_block_mb=256):
+        k = min(k, self.n)
+        self.index.set_ef(max(50, 2 * k))
+        labels, dists = self.index.knn_query(queries, k=k)
+        return labels.astype(np.int64), (1.0 - dists).astype(np.float32)
+
+
+class IvfSearcher:
+    def __init__(self, vectors, nprobe=8):
+        dim = vectors.shape[1]
+        nlist = max(1, int(np.sqrt(vectors.shape[0])))
+        quantizer = faiss.IndexFlatIP(dim)
+        self.index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        self.index.train(vectors)
+        self.index.add(vectors)
+        self.index.nprobe = min(nprobe, nlist)
+        self.n = vectors.shape[0]
+
+    def query(self, queries, k, max_block_mb=256):
+        scores, labels = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), min(k, self.n))
+        # IVF may return fewer than k hits; missing ones come back as label -1 and are skipped by the caller
+        return labels.astype(np.int64), scores
+
+
+def make_searcher(vectors, backend, ann_min_size):
+    """ANN index for large candidate blocks when a backend is available, exact numpy search otherwise."""
+    if backend == "numpy" or vectors.shape[0] < ann_min_size:
+        return NumpySearcher(vectors)
+    if backend in ("auto", "hnsw") and hnswlib is not None:
+        return HnswSearcher(vectors)
+    if backend in ("auto", "ivf") and faiss is not None:
+        return IvfSearcher(vectors)
+    if backend != "auto":
+        print(f"ANN backend {backend!r} not installed; falling back to exact numpy search.")
+    return NumpySearcher(vectors)
+
+
+def main(args):
+    claims = load_claims_from_dir(args.claims_dir)
+    if not claims:
+        print("No claims found in", args.claims_dir); return
+    snippets = load_snippets(args.snippets)
+    if not snippets:
+        print("No snippets"); return
+
+    encoder = load_encoder(args.model)
+    cache = EmbeddingCache(args.cache_dir, args.model)
+    snip_vecs = cache.get_or_encode([s.get("text", "") for s in snippets], encoder, args.batch_size)
+    claim_vecs = cache.get_or_encode([c.get("claim_text", "") for c in claims], encoder, args.batch_size)
+    print(f"Embedding cache: {cache.hits} hits, {cache.misses} encoded ({cache.root})")
+
+    third_party_types = {t.strip() for t in args.third_party_types.split(",") if t.strip()}
+    candidate_groups = build_candidate_groups(
+        [s.get("company_id") for s in snippets],
+        [s.get("type", s.get("source_type")) for s in snippets],
+        args.candidate_policy, third_party_types,
+    )
+    searchers = {}  # id(candidate array) -> searcher, so "all" builds one index for every company
+
+    out_dir = Path(args.out_dir); out_dir.mkdir(parents=True, exist_ok=True)
+    tolerances = load_tolerances(args.mappings, args.percent_abs_tolerance, args.abs_frac_tolerance)
+    numerics = SnippetNumerics(snippets)
+
+    rows_by_company = {}
+    for row, claim in enumerate(claims):
+        rows_by_company.setdefault(claim.get("company_id") or "unknown", []).append(row)
+
+    for cid, rows in tqdm(rows_by_company.items(), desc="Companies"):
+        tops = [[] for _ in rows]
+        filled = 0
+        for cand in candidate_groups(cid):
+            remaining = args.top_k - filled
+            if remaining <= 0 or len(cand) == 0:
+                continue
+            key = id(cand)
+            if key not in searchers:
+                searchers[key] = (cand, make_searcher(snip_vecs[cand], args.ann, args.ann_min_size))
+            idx, vals = searchers[key][1].query(claim_vecs[rows], remaining, args.max_block_mb)
+            for r in range(idx.shape[0]):
+                keep = idx[r] >= 0
+                tops[r].extend(zip(cand[idx[r][keep]].tolist(), vals[r][keep].astype(float).tolist()))
+            filled += min(remaining, len(cand))
+        outs = [build_verification(claims[row], top, snippets, numerics, tolerances, args.verdict_threshold)
+                for row, top in zip(rows, tops)]
+        write_verifications(out_dir, outs)
+    print("Embedding verification complete. Files written to", out_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--claims_dir", default="claims/")
+    parser.add_argument("--snippets", required=True)
+    parser.add_argument("--out_dir", default="verification/")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="local/cached sentence-transformers model, or 'hashing'")
+    parser.add_argument("--cache_dir", default=".cache/embeddings", help="on-disk embedding cache root")
+    parser.add_argument("--batch_size", type=int, default=64, help="encoding batch size")
+    parser.add_argument("--ann", choices=ANN_BACKENDS, default="auto", help="nearest neighbour backend")
+    parser.add_argument("--ann_min_size", type=int, default=5000, help="candidate blocks smaller than this use exact search")
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--candidate_policy", choices=CANDIDATE_POLICIES, default="company_third_party")
+    parser.add_argument("--third_party_types", default="news,ngo")
+    parser.add_argument("--max_block_mb", type=float, default=256, help="memory ceiling for one exact-search score block")
+    parser.add_argument("--mappings", default="mappings/metrics_map.json", help="tolerance_rules source")
+    parser.add_argument("--percent_abs_tolerance", type=float, default=None, help="overrides tolerance_rules")
+    parser.add_argument("--abs_frac_tolerance", type=float, default=None, help="overrides tolerance_rules")
+    parser.add_argument("--verdict_threshold", type=float, default=0.55)
+    args = parser.parse_args()
+    main(args)
@@ -4,11 +4,32 @@ TF-IDF fallback embed matcher for demo (no sentence-transformers required).
 
 Usage:
  python nlp/embed_matcher_tfidf.py --claims_dir claims/ --snippets data/cleaned/snippets.jsonl --out_dir verification/ --top_k 10
+ python nlp/embed_matcher_tfidf.py --snippets data/cleaned/snippets.jsonl --index_dir evidence_index/
+
+With --index_dir the persistent evidence index is loaded instead of refitting TF-IDF; snippets from
+--snippets that are not indexed yet are appended to it first.
+ python nlp/embed_matcher_tfidf.py --snippets data/cleaned/snippets.jsonl --candidate_policy prefer_company --third_party_types news,ngo
 
 Produces verification/{claim_id}_evidence.json files with same schema as embed_matcher.py
+
+All claims are vectorized in one transform and scored per company as chunked sparse products; each
+dense similarity block is kept under --max_block_mb and top_k is extracted per row vectorially.
+
+Candidate policies (--candidate_policy), i.e. which snippets a claim is scored against:
+ company              snippets of the claim's company only
+ company_third_party  (default) the company's snippets plus third-party snippets (--third_party_types)
+                      that are not attributed to any company
+ prefer_company       as company_third_party, then the rest of the corpus fills any remaining top_k slots
+ all                  the whole corpus (previous behaviour)
+
+Near-duplicate snippets (MinHash LSH, nlp/dedup.py, --dedupe_threshold) are scored once per cluster:
+the cluster's first candidate stands in for all of them, and its evidence item carries the cluster_id
+and the other members as `corroborating` sources.
+
+Stage timings and the verdict distribution go to outputs/metrics/embed_matcher_tfidf.json (nlp/metrics.py).
 """
 
-import argparse, json, math, re
+import argparse, json, math, re, sys
 from pathlib import Path
 from typing import List
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -16,6 +37,15 @@ from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import open_claim_store
+from nlp.dedup import DEFAULT_THRESHOLD as DEFAULT_DEDUPE_THRESHOLD, MinHasher, cluster_members, cluster_signatures
+from nlp.evidence_index import DEFAULT_REWEIGHT_FRACTION, EvidenceIndex, is_evidence_index
+from nlp.metrics import add_metrics_args, metrics_from_args, write_metrics
+
+CANDIDATE_POLICIES = ["company", "company_third_party", "prefer_company", "all"]
+UNATTRIBUTED_COMPANY_IDS = {None, "", "unknown"}
+
 NUM_UNIT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(%|percent|percentage|tco2e|tonnes?|tons?|kg)\b", re.I)
 
 def load_snippets(path):
@@ -31,11 +61,8 @@ def load_snippets(path):
     return out
 
 def load_claims_from_dir(claims_dir):
-    claims=[]
-    for p in Path(claims_dir).glob("*.json"):
-        with open(p,"r",encoding="utf-8") as f:
-            claims.append(json.load(f))
-    return claims
+    # claim store or legacy one-file-per-claim directory
+    return list(open_claim_store(claims_dir).iter_claims())
 
 def parse_numeric_from_text(text):
     m = NUM_UNIT_RE.search(text)
@@ -46,6 +73,7 @@ def parse_numeric_from_text(text):
         return None, None
 
 def label_snippet_for_claim(claim, snippet, sim_score, tolerances):
+    # scalar reference rules; the matchers use the vectorized label_candidates()
     claim_val = claim.get("numeric_value")
     claim_unit = claim.get("unit")
     sn_text = snippet.get("text","")
@@ -80,6 +108,297 @@ def label_snippet_for_claim(claim, snippet, sim_score, tolerances):
         return "insufficient", float(sim_score)
     return "insufficient", float(sim_score)
 
+LABELS = np.array(["support", "contradict", "insufficient"])
+SUPPORT, CONTRADICT, INSUFFICIENT = 0, 1, 2
+INCREASE_WORDS = ["increase", "increased", "rising"]
+DEFAULT_TOLERANCES = {"percent_abs_tolerance": 2.0, "abs_frac_tolerance": 0.05}
+
+def load_tolerances(mappings_path, percent_abs_tolerance=None, abs_frac_tolerance=None):
+    """
+    Tolerances from `tolerance_rules` in metrics_map.json (percent_absolute_tolerance,
+    tonnes_relative_tolerance), overridden by explicit CLI values, else the defaults.
+    """
+    tolerances = dict(DEFAULT_TOLERANCES)
+    if mappings_path and Path(mappings_path).exists():
+        with open(mappings_path, "r", encoding="utf-8") as f:
+            rules = json.load(f).get("tolerance_rules", {})
+        if "percent_absolute_tolerance" in rules:
+            tolerances["percent_abs_tolerance"] = float(rules["percent_absolute_tolerance"])
+        if "tonnes_relative_tolerance" in rules:
+            tolerances["abs_frac_tolerance"] = float(rules["tonnes_relative_tolerance"])
+    if percent_abs_tolerance is not None:
+        tolerances["percent_abs_tolerance"] = percent_abs_tolerance
+    if abs_frac_tolerance is not None:
+        tolerances["abs_frac_tolerance"] = abs_frac_tolerance
+    return tolerances
+
+class SnippetNumerics:
+    """
+    Per-snippet numeric value (NaN if none) and increase-wording flag, parsed at most once per snippet
+    (on first use, so lazily loaded snippet tables are not read in full).
+    """
+
+    def __init__(self, snippets):
+        n = len(snippets)
+        self.snippets = snippets
+        self.values = np.full(n, np.nan)
+        self.units = [None] * n
+        self.has_increase = np.zeros(n, dtype=bool)
+        self._done = np.zeros(n, dtype=bool)
+
+    def ensure(self, idx):
+        for i in idx[~self._done[idx]].tolist():
+            text = self.snippets[i].get("text","")
+            val, unit = parse_numeric_from_text(text)
+            if val is not None:
+                self.values[i] = val
+                self.units[i] = unit
+            txt = text.lower()
+            self.has_increase[i] = any(w in txt for w in INCREASE_WORDS)
+            self._done[i] = True
+
+def label_candidates(claim, idx, sims, numerics, tolerances):
+    """
+    Vectorized label_snippet_for_claim over a claim's candidate block: idx are snippet indices, sims
+    their similarity scores. Returns label codes (index into LABELS), same rules as the scalar version.
+    """
+    idx = np.asarray(idx, dtype=np.int64)
+    sims = np.asarray(sims, dtype=np.float64)
+    numerics.ensure(idx)
+    labels = np.full(len(idx), INSUFFICIENT, dtype=np.int8)
+
+    sn_vals = numerics.values[idx]
+    numeric = ~np.isnan(sn_vals)
+    claim_val = claim.get("numeric_value")
+    if claim_val is None:
+        numeric[:] = False
+    else:
+        claim_val = float(claim_val)
+        diff = np.abs(claim_val - sn_vals[numeric])
+        rel = diff / max(abs(claim_val), 1.0)
+        s = sims[numeric]
+        claim_unit = claim.get("unit")
+        if claim_unit and "percent" in str(claim_unit).lower():
+            # absolute diff in percentage points
+            support = diff <= tolerances.get("percent_abs_tolerance", 2.0)
+            contradict = ~support & (rel > 0.1) & (s > 0.5)
+        else:
+            tol = tolerances.get("abs_frac_tolerance", 0.05)
+            support = rel <= tol
+            contradict = ~support & (rel > tol * 3) & (s > 0.55)
+        labels[numeric] = np.where(support, SUPPORT, np.where(contradict, CONTRADICT, INSUFFICIENT))
+
+    # fallback semantic-only
+    semantic = ~numeric
+    if "reduce" in claim.get("claim_text","").lower():
+        contradict = semantic & numerics.has_increase[idx]
+    else:
+        contradict = np.zeros(len(idx), dtype=bool)
+    labels[contradict] = CONTRADICT
+    labels[semantic & ~contradict & (sims >= 0.75)] = SUPPORT
+    return labels
+
+def top_k_per_row(block, k):
+    """
+    For a dense (rows, n) score block, returns (indices, scores) of shape (rows, k) holding each
+    row's k highest scores, best first. O(rows * n) via np.partition; ties (including at the k-th
+    place) go to the lower column, so results are deterministic.
+    """
+    rows, n = block.shape
+    k = min(k, n)
+    if k <= 0 or rows == 0:
+        return np.empty((rows, 0), dtype=np.int64), np.empty((rows, 0), dtype=block.dtype)
+    if k < n:
+        kth = np.partition(block, n - k, axis=1)[:, n - k][:, None]
+        above = block > kth
+        ties = block == kth
+        need = k - above.sum(axis=1, keepdims=True)
+        selected = above | (ties & (np.cumsum(ties, axis=1) <= need))
+        idx = np.nonzero(selected)[1].reshape(rows, k)  # ascending column order within each row
+    else:
+        idx = np.broadcast_to(np.arange(n), (rows, n))
+    vals = np.take_along_axis(block, idx, axis=1)
+    order = np.argsort(-vals, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+def iter_top_k_blocks(claim_vecs, cand_matrix, k, max_block_mb):
+    """
+    Scores claim rows against candidate rows as a sparse matrix product, chunked over claims so the
+    dense (chunk, n_cand) similarity block stays under max_block_mb. Yields (row_start, indices, scores).
+    """
+    n_cand = cand_matrix.shape[0]
+    chunk = max(1, int(max_block_mb * 1024 * 1024 // (8 * max(n_cand, 1))))
+    for start in range(0, claim_vecs.shape[0], chunk):
+        block = cosine_similarity(claim_vecs[start:start + chunk], cand_matrix)
+        idx, vals = top_k_per_row(block, k)
+        yield start, idx, vals
+
+def collapse_duplicates(groups, reps):
+    """
+    Candidate groups with one row per near-duplicate cluster: the group's first member of each cluster
+    (the cluster representative whenever it is a candidate), skipping clusters an earlier group covers.
+    """
+    out, seen = [], np.empty(0, dtype=np.int64)
+    for cand in groups:
+        r = reps[cand]
+        _, first = np.unique(r, return_index=True)
+        first.sort()
+        first = first[~np.isin(r[first], seen)]
+        out.append(cand[first])
+        seen = np.union1d(seen, r[first])
+    return out
+
+def build_candidate_groups(snippet_companies, snippet_types, policy, third_party_types, reps=None):
+    """
+    Returns a function company_id -> list of snippet index arrays in priority order. Top-k is taken
+    from the first group, and later groups only fill slots the earlier ones could not.
+    snippet_companies / snippet_types: per-snippet company_id and source type, in corpus order.
+    reps: near-duplicate representative row per snippet (nlp/dedup.py); each cluster is then scored once.
+    """
+    all_idx = np.arange(len(snippet_companies))
+    if policy == "all":
+        groups_all = [all_idx] if reps is None else collapse_duplicates([all_idx], reps)
+        return lambda company_id: groups_all
+    by_company = {}
+    shared = []
+    for idx, (comp, stype) in enumerate(zip(snippet_companies, snippet_types)):
+        if comp in UNATTRIBUTED_COMPANY_IDS:
+            if stype in third_party_types:
+                shared.append(idx)
+            continue
+        by_company.setdefault(comp, []).append(idx)
+    shared = np.array(shared, dtype=np.int64)
+    cache = {}
+
+    def groups(company_id):
+        if company_id not in cache:
+            own = np.array(by_company.get(company_id, []), dtype=np.int64)
+            if policy == "company":
+                cache[company_id] = [own]
+            else:
+                primary = np.union1d(own, shared)
+                cache[company_id] = [primary]
+                if policy == "prefer_company":
+                    cache[company_id].append(np.setdiff1d(all_idx, primary, assume_unique=True))
+            if reps is not None:
+                cache[company_id] = collapse_duplicates(cache[company_id], reps)
+        return cache[company_id]
+
+    return groups
+
+def build_corroboration(snippet_companies, snippet_types, policy, third_party_types, reps):
+    """
+    Returns a function (company_id, row) -> (representative row of `row`'s near-duplicate cluster, the
+    cluster's other members that are candidates for `company_id` under `policy`; see build_candidate_groups).
+    """
+    members = cluster_members(reps)
+
+    def candidate(company_id, row):
+        comp = snippet_companies[row]
+        if policy in ("all", "prefer_company") or comp == company_id:
+            return True
+        return policy == "company_third_party" and comp in UNATTRIBUTED_COMPANY_IDS and snippet_types[row] in third_party_types
+
+    def corroborating(company_id, row):
+        rep = int(reps[row])
+        return rep, [int(m) for m in members.get(rep, ()) if m != row and candidate(company_id, m)]
+
+    return corroborating
+
+def companies_affected_by(snippets, policy, third_party_types):
+    """
+    Companies whose candidate set (see build_candidate_groups) contains any of `snippets`, or None if
+    every company is affected.
+    """
+    affected = set()
+    for s in snippets:
+        comp, stype = s.get("company_id"), s.get("type", s.get("source_type"))
+        if policy in ("all", "prefer_company"):
+            return None
+        if comp not in UNATTRIBUTED_COMPANY_IDS:
+            affected.add(comp)
+        elif policy == "company_third_party" and stype in third_party_types:
+            return None
+    return affected
+
+def build_verification(claim, top, snippets, numerics, tolerances, verdict_threshold, corroborating=None):
+    """
+    Verification record for one claim from its (snippet index, similarity) top list. With
+    `corroborating` (build_corroboration), evidence from a near-duplicate cluster lists the cluster's
+    other sources.
+    """
+    labels = label_candidates(claim, [i for i, _ in top], [sc for _, sc in top], numerics, tolerances) if top else []
+    evidence_list=[]
+    for (idx, sim_score), code in zip(top, labels):
+        s = snippets[idx]
+        label = str(LABELS[code])
+        ev = {
+            "snippet_id": s.get("snippet_id"),
+            "score": sim_score,
+            "label": label,
+            "source_id": s.get("source_id", s.get("snippet_id")),
+            "source_type": s.get("type", s.get("source_type", "unknown")),
+            "snippet_text": s.get("text","")[:1000]
+        }
+        rep, dups = corroborating(claim.get("company_id") or "unknown", idx) if corroborating else (idx, [])
+        if dups:
+            ev["cluster_id"] = snippets[rep].get("snippet_id")
+            ev["corroborating"] = [{"snippet_id": snippets[d].get("snippet_id"),
+                                    "source_id": snippets[d].get("source_id", snippets[d].get("snippet_id")),
+                                    "source_type": snippets[d].get("type", snippets[d].get("source_type", "unknown"))}
+                                   for d in dups]
+        evidence_list.append(ev)
+    support_score, contradict_score = aggregate_scores(evidence_list)
+    final_verdict = "insufficient"
+    if contradict_score > support_score and contradict_score > verdict_threshold:
+        final_verdict = "contradicted"
+    elif support_score >= contradict_score and support_score > verdict_threshold:
+        final_verdict = "supported"
+    else:
+        final_verdict = "insufficient"
+    return {
+        "claim_id": claim.get("claim_id"),
+        "company_id": claim.get("company_id") or "unknown",
+        "top_evidence": evidence_list,
+        "support_score": support_score,
+        "contradict_score": contradict_score,
+        "final_verdict": final_verdict
+    }
+
+def write_verifications(out_dir, outs):
+    for out in outs:
+        out_file = out_dir / f"{out['claim_id']}_evidence.json"
+        with open(out_file, "w", encoding="utf-8") as fw:
+            json.dump(out, fw, indent=2, ensure_ascii=False)
+
+def verify_claims(claims, snippets, tfidf_snips, transform, candidate_groups, top_k, candidate_policy,
+                  max_block_mb, numerics, tolerances, verdict_threshold, corroborating=None):
+    """
+    Scores `claims` against the snippet matrix and yields their verification records, one list per
+    company. Each claim's result depends only on the claim and its company's candidates, so any subset
+    of claims can be (re)verified on its own.
+    """
+    # embed all claims in one transform, then score them company by company
+    claim_vecs = transform([c.get("claim_text","") for c in claims])
+    rows_by_company = {}
+    for row, claim in enumerate(claims):
+        rows_by_company.setdefault(claim.get("company_id") or "unknown", []).append(row)
+
+    for cid, rows in tqdm(rows_by_company.items(), desc="Companies"):
+        tops = [[] for _ in rows]
+        filled = 0
+        for cand in candidate_groups(cid):
+            remaining = top_k - filled
+            if remaining <= 0 or len(cand) == 0:
+                continue
+            cand_matrix = tfidf_snips if len(cand) == tfidf_snips.shape[0] else tfidf_snips[cand]
+            for start, idx, vals in iter_top_k_blocks(claim_vecs[rows], cand_matrix, remaining, max_block_mb):
+                for r in range(idx.shape[0]):
+                    tops[start + r].extend(zip(cand[idx[r]].tolist(), vals[r].tolist()))
+            filled += min(remaining, len(cand))
+        yield [build_verification(claims[row], top, snippets, numerics, tolerances, verdict_threshold, corroborating)
+               for row, top in zip(rows, tops)]
+
 def aggregate_scores(evidence_items):
     sup=0.0; con=0.0
     for it in evidence_items:
@@ -90,79 +409,111 @@ def aggregate_scores(evidence_items):
     return sup, con
 
 def main(args):
-    claims = load_claims_from_dir(args.claims_dir)
+    metrics = metrics_from_args("embed_matcher_tfidf", args)
+    with metrics.stage("load_claims") as st:
+        claims = load_claims_from_dir(args.claims_dir)
+        st.items = len(claims)
     if not claims:
         print("No claims found in", args.claims_dir); return
-    snippets = load_snippets(args.snippets)
-    # Build corpus for TF-IDF (snippets texts)
-    all_texts = [s.get("text","") for s in snippets]
-    vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
-    if len(all_texts)==0:
-        print("No snippets"); return
-    tfidf_snips = vectorizer.fit_transform(all_texts)  # shape (n_snips, n_feats)
-
-    # For quick company grouping, create index list
-    snippet_ids = [s.get("snippet_id") for s in snippets]
-    snippet_by_company = {}
-    for idx, s in enumerate(snippets):
-        snippet_by_company.setdefault(s.get("company_id","unknown"), []).append((idx, s))
+    with metrics.stage("index") as st:
+        if args.index_dir:
+            # persistent evidence index: load (memory-mapped), index any new snippets, never refit
+            if is_evidence_index(args.index_dir):
+                index = EvidenceIndex(args.index_dir)
+                if args.snippets:
+                    added = index.append(load_snippets(args.snippets), reweight_fraction=args.reweight_fraction)
+                    metrics.count("snippets_indexed", added)
+                    print(f"Evidence index: {added} new snippets appended ({len(index)} total).")
+            elif args.snippets:
+                index = EvidenceIndex.build(load_snippets(args.snippets), args.index_dir)
+                metrics.count("snippets_indexed", len(index))
+                print(f"Evidence index built with {len(index)} snippets -> {args.index_dir}")
+            else:
+                print("No evidence index at", args.index_dir, "and no --snippets to build it from"); return
+            if len(index)==0:
+                print("No snippets"); return
+            snippets = index.snippets
+            tfidf_snips = index.matrix
+            transform = index.transform
+            snippet_companies, snippet_types = index.company_ids(), index.source_types()
+        else:
+            if not args.snippets:
+                print("Either --snippets or --index_dir is required"); return
+            snippets = load_snippets(args.snippets)
+            # Build corpus for TF-IDF (snippets texts)
+            all_texts = [s.get("text","") for s in snippets]
+            vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
+            if len(all_texts)==0:
+                print("No snippets"); return
+            tfidf_snips = vectorizer.fit_transform(all_texts)  # shape (n_snips, n_feats)
+            transform = vectorizer.transform
+            snippet_companies = [s.get("company_id") for s in snippets]
+            snippet_types = [s.get("type", s.get("source_type")) for s in snippets]
+        st.items = len(snippets)
+
+    # near-duplicate clusters: one representative is scored, the others are listed as corroborating
+    reps = corroborating = None
+    if args.dedupe_threshold > 0:
+        with metrics.stage("dedupe", items=len(snippets)):
+            if args.index_dir:
+                reps = index.near_duplicates(threshold=args.dedupe_threshold)
+            else:
+                reps = cluster_signatures(MinHasher().signatures(all_texts), threshold=args.dedupe_threshold)
+        count_near_duplicates(metrics, reps)
+
+    # candidate selection per company (see --candidate_policy)
+    third_party_types = {t.strip() for t in args.third_party_types.split(",") if t.strip()}
+    candidate_groups = build_candidate_groups(snippet_companies, snippet_types, args.candidate_policy, third_party_types, reps)
+    if reps is not None:
+        corroborating = build_corroboration(snippet_companies, snippet_types, args.candidate_policy, third_party_types, reps)
 
     out_dir = Path(args.out_dir); out_dir.mkdir(parents=True, exist_ok=True)
-    tolerances = {"percent_abs_tolerance": args.percent_abs_tolerance, "abs_frac_tolerance": args.abs_frac_tolerance}
-
-    for claim in tqdm(claims, desc="Claims"):
-        cid = claim.get("company_id") or "unknown"
-        # candidate snippets: same company + news/ngo (we'll use all snippets but prefer same-company ones first)
-        cand_indices = list(range(len(snippets)))
-        # embed claim via tfidf using same vectorizer
-        claim_vec = vectorizer.transform([claim.get("claim_text","")])
-        sims = cosine_similarity(claim_vec, tfidf_snips)[0]  # length n_snips
-        # sort top_k
-        top_idx = np.argsort(-sims)[:args.top_k]
-        evidence_list=[]
-        for idx in top_idx:
-            s = snippets[idx]
-            sim_score = float(sims[idx])
-            label, lbl_score = label_snippet_for_claim(claim, s, sim_score, tolerances)
-            ev = {
-                "snippet_id": s.get("snippet_id"),
-                "score": sim_score,
-                "label": label,
-                "source_id": s.get("source_id", s.get("snippet_id")),
-                "source_type": s.get("type", s.get("source_type", "unknown")),
-                "snippet_text": s.get("text","")[:1000]
-            }
-            evidence_list.append(ev)
-        support_score, contradict_score = aggregate_scores(evidence_list)
-        final_verdict = "insufficient"
-        if contradict_score > support_score and contradict_score > args.verdict_threshold:
-            final_verdict = "contradicted"
-        elif support_score >= contradict_score and support_score > args.verdict_threshold:
-            final_verdict = "supported"
-        else:
-            final_verdict = "insufficient"
-        out = {
-            "claim_id": claim.get("claim_id"),
-            "company_id": cid,
-            "top_evidence": evidence_list,
-            "support_score": support_score,
-            "contradict_score": contradict_score,
-            "final_verdict": final_verdict
-        }
-        out_file = out_dir / f"{claim.get('claim_id')}_evidence.json"
-        with open(out_file, "w", encoding="utf-8") as fw:
-            json.dump(out, fw, indent=2, ensure_ascii=False)
+    tolerances = load_tolerances(args.mappings, args.percent_abs_tolerance, args.abs_frac_tolerance)
+    numerics = SnippetNumerics(snippets)
+
+    with metrics.stage("verify", items=len(claims)):
+        for outs in verify_claims(claims, snippets, tfidf_snips, transform, candidate_groups, args.top_k,
+                                  args.candidate_policy, args.max_block_mb, numerics, tolerances, args.verdict_threshold,
+                                  corroborating):
+            write_verifications(out_dir, outs)
+            count_verdicts(metrics, outs)
     print("TF-IDF verification complete. Files written to", out_dir)
+    write_metrics(metrics, args)
+
+def count_near_duplicates(metrics, reps):
+    n_dup = int((reps != np.arange(len(reps))).sum())
+    metrics.count("near_duplicate_snippets", n_dup)
+    metrics.gauge("near_duplicate_fraction", round(n_dup / len(reps), 4) if len(reps) else None)
+    print(f"Near-duplicates: {n_dup} of {len(reps)} snippets are scored through a cluster representative")
+
+def count_verdicts(metrics, outs):
+    """Verdict distribution of a batch of verification records (nlp/metrics.py counters)."""
+    for out in outs:
+        metrics.count("claims_verified", verdict=out["final_verdict"])
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--claims_dir", default="claims/")
-    parser.add_argument("--snippets", required=True)
+    parser.add_argument("--snippets", help="snippets JSONL (required unless --index_dir already holds an index)")
+    parser.add_argument("--index_dir", default=None,
+                        help="persistent evidence index (nlp/evidence_index.py); built from --snippets if missing")
+    parser.add_argument("--reweight_fraction", type=float, default=DEFAULT_REWEIGHT_FRACTION,
+                        help="compact/re-weight the index once this fraction of rows was appended since the last re-weight")
     parser.add_argument("--out_dir", default="verification/")
     parser.add_argument("--top_k", type=int, default=10)
-    parser.add_argument("--percent_abs_tolerance", type=float, default=2.0)
-    parser.add_argument("--abs_frac_tolerance", type=float, default=0.05)
+    parser.add_argument("--candidate_policy", choices=CANDIDATE_POLICIES, default="company_third_party",
+                        help="which snippets each claim is scored against (see module docstring)")
+    parser.add_argument("--third_party_types", default="news,ngo",
+                        help="comma-separated source types treated as third-party evidence")
+    parser.add_argument("--max_block_mb", type=float, default=256,
+                        help="memory ceiling for one dense claim x candidate similarity block")
+    parser.add_argument("--mappings", default="mappings/metrics_map.json", help="tolerance_rules source")
+    parser.add_argument("--percent_abs_tolerance", type=float, default=None, help="overrides tolerance_rules")
+    parser.add_argument("--abs_frac_tolerance", type=float, default=None, help="overrides tolerance_rules")
     parser.add_argument("--verdict_threshold", type=float, default=0.55)
+    parser.add_argument("--dedupe_threshold", type=float, default=DEFAULT_DEDUPE_THRESHOLD,
+                        help="estimated Jaccard at which snippets are near-duplicates (nlp/dedup.py); 0 disables")
+    add_metrics_args(parser)
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+nlp/evidence_index.py
+
+Persistent, incrementally updatable TF-IDF index over evidence snippets, used by
+nlp/embed_matcher_tfidf.py instead of refitting a TfidfVectorizer on every run.
+
+Layout of an index directory:
+  manifest.json        params (stop_words, max_features), n_docs, segment list, rows appended since last re-weight
+  vocab.json           terms in column order
+  idf.npy, df.npy      current IDF weights and per-term document frequencies
+  snippets.jsonl       copy of every indexed snippet record (evidence text/metadata is read from here by offset)
+  ids.txt              snippet ids, one per line, in row order
+  companies.json, types.json   string tables for the per-row company/source-type codes
+  seg-NNNNN.{data,counts,indices,indptr,offsets,company,type}.npy
+                       one CSR block per segment: L2-normalized TF-IDF weights and raw term counts
+                       (same sparsity pattern), plus per-row snippet offsets and company/type codes
+  minhash.npy          MinHash signature per row (nlp/dedup.py), hashed on demand for rows added since
+  clusters.npy         near-duplicate representative row per row, from the last near_duplicates() call
+
+Arrays are loaded with np.load(mmap_mode="r"), so opening a compacted (single segment) index costs a
+few milliseconds regardless of corpus size.
+
+Appending snippets vectorizes only the new rows with the existing vocabulary and IDF, and updates the
+document frequencies. IDF therefore drifts until the index is compacted: `compact` merges the segments
+and re-weights every row from the stored counts; `compact --refit` rebuilds the vocabulary as well.
+Appends trigger an automatic compaction once the rows added since the last re-weight exceed
+--reweight_fraction of the index.
+
+Usage:
+  python nlp/evidence_index.py build --snippets data/cleaned/snippets.jsonl --index_dir evidence_index/
+  python nlp/evidence_index.py append --snippets data/cleaned/new_snippets.jsonl --index_dir evidence_index/
+  python nlp/evidence_index.py compact --index_dir evidence_index/ [--refit]
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.dedup import DEFAULT_BANDS, DEFAULT_NUM_PERM, DEFAULT_THRESHOLD, MinHasher, cluster_signatures
+
+INDEX_FORMAT = "esg-evidence-index"
+INDEX_VERSION = 1
+DEFAULT_MAX_FEATURES = 5000
+DEFAULT_REWEIGHT_FRACTION = 0.2
+SEGMENT_ARRAYS = ("data", "counts", "indices", "indptr", "offsets", "company", "type")
+
+
+def _write_json_atomic(path: Path, obj):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _idf_from_df(df, n_docs):
+    # same smoothing as sklearn's TfidfTransformer(smooth_idf=True)
+    return np.log((n_docs + 1) / (df.astype(np.float64) + 1)) + 1
+
+
+def _code(values, table, lookup):
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        v = "" if v is None else str(v)
+        if v not in lookup:
+            lookup[v] = len(table)
+            table.append(v)
+        codes[i] = lookup[v]
+    return codes
+
+
+class SnippetTable:
+    """List-like read access to indexed snippet records, loaded lazily by byte offset."""
+
+    def __init__(self, path: Path, offsets):
+        self.path = path
+        self.offsets = offsets
+        self._f = None
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        i = int(i)
+        rec = self._cache.get(i)
+        if rec is None:
+            if self._f is None:
+                self._f = open(self.path, "rb")
+            self._f.seek(int(self.offsets[i]))
+            rec = self._cache[i] = json.loads(self._f.readline())
+        return rec
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class EvidenceIndex:
+    def __init__(self, root, mmap=True):
+        self.root = Path(root)
+        manifest_path = self.root / "manifest.json"
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"{manifest_path} not found; build the index first.")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != INDEX_FORMAT:
+            raise ValueError(f"{manifest_path} is not an evidence index manifest.")
+        self._mmap = "r" if mmap else None
+        with open(self.root / "vocab.json", "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        with open(self.root / "companies.json", "r", encoding="utf-8") as f:
+            self.company_table = json.load(f)
+        with open(self.root / "types.json", "r", encoding="utf-8") as f:
+            self.type_table = json.load(f)
+        self.idf = np.load(self.root / "idf.npy")
+        self.df = np.load(self.root / "df.npy")
+        self._segments = [self._load_segment(seg["name"]) for seg in self.manifest["segments"]]
+        self._matrix = None
+        self._vectorizer = None
+        self._snippets = None
+        self._ids = None
+
+    # ---------- building ----------
+
+    @classmethod
+    def build(cls, snippets, root, max_features=DEFAULT_MAX_FEATURES, stop_words="english"):
+        """Fit a new index over `snippets` (list of snippet dicts) in `root`, replacing any existing one."""
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        for p in [*root.glob("seg-*.npy"), root / "minhash.npy", root / "clusters.npy"]:
+            p.unlink(missing_ok=True)
+        texts = [s.get("text", "") for s in snippets]
+        vectorizer = TfidfVectorizer(stop_words=stop_words, max_features=max_features)
+        vectorizer.fit(texts)
+        vocab = [None] * len(vectorizer.vocabulary_)
+        for term, col in vectorizer.vocabulary_.items():
+            vocab[col] = term
+        counts = CountVectorizer(stop_words=stop_words, vocabulary=vectorizer.vocabulary_).transform(texts)
+        with open(root / "vocab.json", "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        for name in ("companies.json", "types.json"):
+            with open(root / name, "w", encoding="utf-8") as f:
+                json.dump([], f)
+        np.save(root / "idf.npy", vectorizer.idf_)
+        np.save(root / "df.npy", np.zeros(len(vocab), dtype=np.int64))  # filled in by _write_segment
+        (root / "snippets.jsonl").write_bytes(b"")
+        (root / "ids.txt").write_text("", encoding="utf-8")
+        _write_json_atomic(root / "manifest.json", {
+            "format": INDEX_FORMAT,
+            "version": INDEX_VERSION,
+            "params": {"stop_words": stop_words, "max_features": max_features},
+            "n_docs": 0,
+            "n_features": len(vocab),
+            "rows_since_reweight": 0,
+            "next_segment": 0,
+            "segments": [],
+        })
+        index = cls(root)
+        index._write_segment(snippets, counts)
+        index.manifest["rows_since_reweight"] = 0
+        index._save_manifest()
+        return index
+
+    def _save_manifest(self):
+        _write_json_atomic(self.root / "manifest.json", self.manifest)
+
+    def _load_segment(self, name):
+        return {a: np.load(self.root / f"{name}.{a}.npy", mmap_mode=self._mmap) for a in SEGMENT_ARRAYS}
+
+    def _write_segment(self, snippets, counts):
+        """Append snippet records and their count rows as a new segment, weighted with the current IDF."""
+        counts = sp.csr_matrix(counts, dtype=np.float64)
+        counts.sort_indices()
+        weighted = counts.copy()
+        weighted.data *= self.idf[weighted.indices]
+        weighted = normalize(weighted, norm="l2", copy=False)
+
+        offsets = np.empty(len(snippets), dtype=np.int64)
+        with open(self.root / "snippets.jsonl", "ab") as f, open(self.root / "ids.txt", "a", encoding="utf-8") as f_ids:
+            for i, s in enumerate(snippets):
+                offsets[i] = f.tell()
+                f.write(json.dumps(s, ensure_ascii=False).encode("utf-8") + b"\n")
+                f_ids.write(str(s.get("snippet_id", "")).replace("\n", " ") + "\n")
+        company_lookup = {c: i for i, c in enumerate(self.company_table)}
+        type_lookup = {t: i for i, t in enumerate(self.type_table)}
+        arrays = {
+            "data": weighted.data,
+            "counts": counts.data,
+            "indices": counts.indices.astype(np.int32),
+            "indptr": counts.indptr.astype(np.int64),
+            "offsets": offsets,
+            "company": _code([s.get("company_id") for s in snippets], self.company_table, company_lookup),
+            "type": _code([s.get("type", s.get("source_type")) for s in snippets], self.type_table, type_lookup),
+        }
+        name = f"seg-{self.manifest['next_segment']:05d}"
+        self.manifest["next_segment"] += 1
+        for a, arr in arrays.items():
+            np.save(self.root / f"{name}.{a}.npy", arr)
+        for table_name, table in (("companies.json", self.company_table), ("types.json", self.type_table)):
+            _write_json_atomic(self.root / table_name, table)
+
+        self.df = self.df + np.bincount(counts.indices, minlength=len(self.vocab))
+        np.save(self.root / "df.npy", self.df)
+        self.manifest["segments"].append({"name": name, "n_rows": len(snippets)})
+        self.manifest["n_docs"] += len(snippets)
+        self.manifest["rows_since_reweight"] += len(snippets)
+        self._save_manifest()
+        self._segments.append(self._load_segment(name))
+        self._matrix = self._snippets = self._ids = None
+
+    def append(self, snippets, reweight_fraction=DEFAULT_REWEIGHT_FRACTION):
+        """
+        Index snippets whose snippet_id is not present yet. Returns the number added. Compacts (and
+        re-weights) automatically once enough rows were appended since the last re-weight.
+        """
+        known = self.snippet_ids()
+        new, seen = [], set()
+        for s in snippets:
+            sid = s.get("snippet_id")
+            if sid in known or sid in seen:
+                continue
+            seen.add(sid)
+            new.append(s)
+        if not new:
+            return 0
+        counts = self._count_vectorizer().transform([s.get("text", "") for s in new])
+        self._write_segment(new, counts)
+        if self.manifest["rows_since_reweight"] > reweight_fraction * self.manifest["n_docs"]:
+            self.compact()
+        return len(new)
+
+    def compact(self, refit=False):
+        """
+        Merge all segments into one and re-weight every row with IDF recomputed from the current document
+        frequencies. With refit, the vocabulary is rebuilt from all indexed snippet texts as well.
+        """
+        snippets = list(self.snippets)
+        if refit:
+            params = self.manifest["params"]
+            return EvidenceIndex.build(snippets, self.root, max_features=params["max_features"], stop_words=params["stop_words"])
+        counts = self._stacked("counts")
+        old_names = [seg["name"] for seg in self.manifest["segments"]]
+        self.idf = _idf_from_df(self.df, self.manifest["n_docs"])
+        np.save(self.root / "idf.npy", self.idf)
+        self.df = np.zeros_like(self.df)
+        self.manifest.update({"n_docs": 0, "rows_since_reweight": 0, "segments": []})
+        self._segments = []
+        if self._snippets is not None and self._snippets._f is not None:
+            self._snippets._f.close()
+        (self.root / "snippets.jsonl").replace(self.root / "snippets.jsonl.old")
+        (self.root / "ids.txt").write_text("", encoding="utf-8")
+        (self.root / "snippets.jsonl").write_bytes(b"")
+        self.company_table, self.type_table = [], []
+        # the merged segment gets a fresh name, so old files are only removed once it is written
+        self._write_segment(snippets, counts)
+        self.manifest["rows_since_reweight"] = 0
+        self._save_manifest()
+        for name in old_names:
+            for a in SEGMENT_ARRAYS:
+                (self.root / f"{name}.{a}.npy").unlink()
+        (self.root / "snippets.jsonl.old").unlink()
+        return self
+
+    # ---------- near-duplicates ----------
+
+    def near_duplicates(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS):
+        """
+        Near-duplicate representative row for every row (nlp/dedup.py). Signatures are stored and only
+        rows indexed since the last call are hashed; row order survives compaction, so they stay valid
+        until a rebuild. The result is also saved as clusters.npy (see saved_near_duplicates).
+        """
+        hasher = MinHasher(num_perm)
+        params = self.manifest.get("minhash")
+        path = self.root / "minhash.npy"
+        sigs = np.load(path) if params == hasher.params and path.exists() else np.empty((0, num_perm), np.uint32)
+        if len(sigs) < len(self):
+            new = hasher.signatures(self.snippets[i].get("text", "") for i in range(len(sigs), len(self)))
+            sigs = np.concatenate([sigs, new])
+            np.save(path, sigs)
+            self.manifest["minhash"] = hasher.params
+            self._save_manifest()
+        reps = cluster_signatures(sigs[:len(self)], bands, threshold)
+        np.save(self.root / "clusters.npy", reps)
+        return reps
+
+    def saved_near_duplicates(self):
+        """Representative rows saved by the last near_duplicates() call, or None."""
+        path = self.root / "clusters.npy"
+        return np.load(path) if path.exists() else None
+
+    # ---------- reading ----------
+
+    def _stacked(self, data_key):
+        mats = [
+            sp.csr_matrix((seg[data_key], seg["indices"], seg["indptr"]), shape=(len(seg["indptr"]) - 1, len(self.vocab)), copy=False)
+            for seg in self._segments
+        ]
+        if not mats:
+            return sp.csr_matrix((0, len(self.vocab)), dtype=np.float64)
+        return mats[0] if len(mats) == 1 else sp.vstack(mats, format="csr")
+
+    @property
+    def matrix(self):
+        """L2-normalized TF-IDF rows for all indexed snippets (memory-mapped when there is one segment)."""
+        if self._matrix is None:
+            self._matrix = self._stacked("data")
+        return self._matrix
+
+    @property
+    def snippets(self):
+        if self._snippets is None:
+            offsets = np.concatenate([seg["offsets"] for seg in self._segments]) if self._segments else np.empty(0, np.int64)
+            self._snippets = SnippetTable(self.root / "snippets.jsonl", offsets)
+        return self._snippets
+
+    def snippet_ids(self):
+        if self._ids is None:
+            with open(self.root / "ids.txt", "r", encoding="utf-8") as f:
+                self._ids = set(line.rstrip("\n") for line in f)
+        return self._ids
+
+    def company_ids(self):
+        codes = np.concatenate([seg["company"] for seg in self._segments]) if self._segments else np.empty(0, np.int32)
+        return [self.company_table[c] or None for c in codes]
+
+    def source_types(self):
+        codes = np.concatenate([seg["type"] for seg in self._segments]) if self._segments else np.empty(0, np.int32)
+        return [self.type_table[c] or None for c in codes]
+
+    def _count_vectorizer(self):
+        vocab = {term: col for col, term in enumerate(self.vocab)}
+        return CountVectorizer(stop_words=self.manifest["params"]["stop_words"], vocabulary=vocab)
+
+    def transform(self, texts):
+        """TF-IDF vectors for query texts with the index's vocabulary and current IDF."""
+        if self._vectorizer is None:
+            vocab = {term: col for col, term in enumerate(self.vocab)}
+            vectorizer = TfidfVectorizer(stop_words=self.manifest["params"]["stop_words"], vocabulary=vocab)
+            vectorizer.idf_ = self.idf
+            self._vectorizer = vectorizer
+        return self._vectorizer.transform(texts)
+
+    def __len__(self):
+        return self.manifest["n_docs"]
+
+
+def is_evidence_index(path) -> bool:
+    return (Path(path) / "manifest.json").exists()
+
+
+def load_jsonl(path):
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                out.append(json.loads(line))
+            except Exception:
+                continue
+    return out
+
+
+def main(args):
+    if args.cmd == "build":
+        index = EvidenceIndex.build(load_jsonl(args.snippets), args.index_dir, max_features=args.max_features)
+        print(f"Built evidence index with {len(index)} snippets, {len(index.vocab)} terms -> {args.index_dir}")
+    elif args.cmd == "append":
+        index = EvidenceIndex(args.index_dir)
+        n = index.append(load_jsonl(args.snippets), reweight_fraction=args.reweight_fraction)
+        print(f"Appended {n} new snippets; index now holds {len(index)} in {len(index.manifest['segments'])} segment(s).")
+    elif args.cmd == "compact":
+        index = EvidenceIndex(args.index_dir).compact(refit=args.refit)
+        print(f"Compacted evidence index: {len(index)} snippets, {len(index.vocab)} terms.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="fit a new index from a snippets JSONL")
+    p_build.add_argument("--snippets", default="data/cleaned/snippets.jsonl")
+    p_build.add_argument("--index_dir", default="evidence_index/")
+    p_build.add_argument("--max_features", type=int, default=DEFAULT_MAX_FEATURES)
+    p_append = sub.add_parser("append", help="add snippets that are not indexed yet")
+    p_append.add_argument("--snippets", required=True)
+    p_append.add_argument("--index_dir", default="evidence_index/")
+    p_append.add_argument("--reweight_fraction", type=float, default=DEFAULT_REWEIGHT_FRACTION)
+    p_compact = sub.add_parser("compact", help="merge segments and re-weight IDF")
+    p_compact.add_argument("--index_dir", default="evidence_index/")
+    p_compact.add_argument("--refit", action="store_true", help="also rebuild the vocabulary")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+nlp/graph_export.py
+
+Compact graph exports for the dashboard, next to the node_link JSON written by nlp/build_graph.py
+(which stays the default for compatibility).
+
+compact  ({company}_graph.compact.json)
+  Node ids and every string attribute value are interned into one string table and the graph is
+  stored column-wise: node columns hold integer string-table indexes (-1 = missing), edges are two
+  integer arrays of node positions plus their attribute columns. No indentation. Labels, ids, types
+  and relations are therefore stored once however often they repeat.
+    {"format": "esg-graph-compact", "version": 1, "directed": true, "strings": [...],
+     "nodes": {"n": 12, "columns": {"id": {"kind": "str", "values": [0, 5, ...]}, ...}},
+     "edges": {"n": 11, "source": [...], "target": [...], "columns": {"score": {"kind": "num", "values": [...]}, ...}}}
+  Column kinds: "str" (string table index), "num" (numbers, null = missing), "json" (string table
+  index of a JSON-encoded value, for anything else).
+
+npz  ({company}_graph.npz)
+  The same columns as numpy arrays ("nodes.<attr>", "edges.<attr>", edges_source/edges_target): int32
+  string indexes / node positions, float64 numbers (NaN = missing), and the string table as one UTF-8
+  blob plus offsets.
+
+pages  (pages/{company}/manifest.json + page-NNNNN.json)
+  The company's claims in pages of --page_size, each page a self-contained compact graph (company
+  node, the page's claims, their evidence), so a client can fetch the first page and load more on
+  demand. With --top_n only each claim's N highest-scoring evidence edges are kept (also applies
+  to compact/npz exports).
+
+Usage (via build_graph):
+  python nlp/build_graph.py --formats json,compact,npz --page_size 50 --top_n 5
+  from nlp.graph_export import read_compact_json, read_npz
+"""
+
+import json
+import math
+import shutil
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+
+COMPACT_FORMAT = "esg-graph-compact"
+COMPACT_VERSION = 1
+EXPORT_FORMATS = ["json", "compact", "npz"]
+
+
+class StringTable:
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self._index = {s: i for i, s in enumerate(self.strings)}
+
+    def intern(self, s):
+        i = self._index.get(s)
+        if i is None:
+            i = self._index[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+
+def _column_kind(values):
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "num"
+    return "json"
+
+
+def _encode_columns(records, strings):
+    keys = []
+    for r in records:
+        for k in r:
+            if k not in keys:
+                keys.append(k)
+    columns = {}
+    for k in keys:
+        values = [r.get(k) for r in records]
+        kind = _column_kind(values)
+        if kind == "str":
+            encoded = [-1 if v is None else strings.intern(v) for v in values]
+        elif kind == "num":
+            encoded = values
+        else:
+            encoded = [-1 if v is None else strings.intern(json.dumps(v, sort_keys=True, ensure_ascii=False)) for v in values]
+        columns[k] = {"kind": kind, "values": encoded}
+    return columns
+
+
+def _decode_columns(columns, strings, n):
+    records = [{} for _ in range(n)]
+    for k, col in columns.items():
+        for r, v in zip(records, col["values"]):
+            if col["kind"] == "num":
+                if v is not None:
+                    r[k] = v
+            elif v != -1:
+                r[k] = strings[v] if col["kind"] == "str" else json.loads(strings[v])
+    return records
+
+
+def encode_compact(G):
+    """Columnar, string-interned dict for a graph (see module docstring)."""
+    strings = StringTable()
+    nodes = list(G.nodes)
+    position = {n: i for i, n in enumerate(nodes)}
+    node_records = [{"id": n, **G.nodes[n]} for n in nodes]
+    edges = list(G.edges(data=True))
+    return {
+        "format": COMPACT_FORMAT,
+        "version": COMPACT_VERSION,
+        "directed": G.is_directed(),
+        "nodes": {"n": len(nodes), "columns": _encode_columns(node_records, strings)},
+        "edges": {
+            "n": len(edges),
+            "source": [position[u] for u, _, _ in edges],
+            "target": [position[v] for _, v, _ in edges],
+            "columns": _encode_columns([d for _, _, d in edges], strings),
+        },
+        "strings": strings.strings,
+    }
+
+
+def decode_compact(data):
+    """nx graph back from encode_compact output."""
+    if data.get("format") != COMPACT_FORMAT:
+        raise ValueError("not a compact graph export")
+    G = nx.DiGraph() if data.get("directed", True) else nx.Graph()
+    strings = data["strings"]
+    nodes = _decode_columns(data["nodes"]["columns"], strings, data["nodes"]["n"])
+    ids = [r.pop("id") for r in nodes]
+    for node_id, attrs in zip(ids, nodes):
+        G.add_node(node_id, **attrs)
+    e = data["edges"]
+    for u, v, attrs in zip(e["source"], e["target"], _decode_columns(e["columns"], strings, e["n"])):
+        G.add_edge(ids[u], ids[v], **attrs)
+    return G
+
+
+def write_compact_json(G, out_path):
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(encode_compact(G), f, ensure_ascii=False, separators=(",", ":"))
+
+
+def read_compact_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return decode_compact(json.load(f))
+
+
+def write_npz(G, out_path):
+    data = encode_compact(G)
+    arrays = {}
+    blobs = [s.encode("utf-8") for s in data["strings"]]
+    arrays["strings_blob"] = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+    arrays["strings_offsets"] = np.cumsum([0] + [len(b) for b in blobs]).astype(np.int64)
+    arrays["edges_source"] = np.asarray(data["edges"]["source"], dtype=np.int32)
+    arrays["edges_target"] = np.asarray(data["edges"]["target"], dtype=np.int32)
+    kinds = {}
+    for part in ("nodes", "edges"):
+        for k, col in data[part]["columns"].items():
+            name = f"{part}.{k}"
+            kinds[name] = col["kind"]
+            if col["kind"] == "num":
+                arrays[name] = np.array([math.nan if v is None else v for v in col["values"]], dtype=np.float64)
+            else:
+                arrays[name] = np.asarray(col["values"], dtype=np.int32)
+    meta = {"format": COMPACT_FORMAT, "version": COMPACT_VERSION, "directed": data["directed"],
+            "n_nodes": data["nodes"]["n"], "n_edges": data["edges"]["n"], "columns": kinds}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+    with open(out_path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def read_npz(path):
+    with np.load(path) as z:
+        meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+        blob, offsets = z["strings_blob"].tobytes(), z["strings_offsets"]
+        strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+        data = {"format": meta["format"], "directed": meta["directed"], "strings": strings,
+                "nodes": {"n": meta["n_nodes"], "columns": {}},
+                "edges": {"n": meta["n_edges"], "source": z["edges_source"].tolist(),
+                          "target": z["edges_target"].tolist(), "columns": {}}}
+        for name, kind in meta["columns"].items():
+            part, key = name.split(".", 1)
+            values = z[name].tolist()
+            if kind == "num":
+                values = [None if math.isnan(v) else v for v in values]
+            data[part]["columns"][key] = {"kind": kind, "values": values}
+    return decode_compact(data)
+
+
+def write_pages(pages, company_id, out_dir, page_size, top_n):
+    """pages: list of (claim node ids, graph). Replaces pages/{company}/ with a manifest and page files."""
+    page_dir = Path(out_dir) / "pages" / str(company_id)
+    if page_dir.exists():
+        shutil.rmtree(page_dir)
+    page_dir.mkdir(parents=True)
+    manifest = {"company_id": company_id, "page_size": page_size, "top_n": top_n,
+                "n_claims": sum(len(claims) for claims, _ in pages), "pages": []}
+    for i, (claims, H) in enumerate(pages):
+        name = f"page-{i:05d}.json"
+        write_compact_json(H, page_dir / name)
+        manifest["pages"].append({"name": name, "n_claims": len(claims),
+                                  "n_nodes": H.number_of_nodes(), "n_edges": H.number_of_edges()})
+    with open(page_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+def remove_exports(out_dir, company_id):
+    out_dir = Path(out_dir)
+    for name in (f"{company_id}_graph.json", f"{company_id}_graph.compact.json", f"{company_id}_graph.npz"):
+        (out_dir / name).unlink(missing_ok=True)
+    page_dir = out_dir / "pages" / str(company_id)
+    if page_dir.exists():
+        shutil.rmtree(page_dir)
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+nlp/ingest.py
+
+Reads: data/companies/*.json (company registry: `files` with source_id, type, filename, provenance)
+Writes: data/cleaned/snippets.jsonl, plus data/cleaned/ingest/ (manifest.json and one parts/*.jsonl per source)
+
+Parses the raw source files of every company into sentence snippets:
+  - PDF via pypdf (page by page), DOCX via its word/document.xml (pages split at page breaks), HTML and
+    plain text via the standard library
+  - page text is cleaned (de-hyphenated, whitespace collapsed), split into blocks and sentences;
+    sentences shorter than --min_chars are dropped
+  - snippet ids follow the existing scheme: {company}_{pdf|docx}_p{page}_s{n} for paged documents,
+    {company}_{type}_{YYYY_MM_DD}_s{n} for web pages (date from the source_id); when two sources of a
+    company would share a prefix, a short hash of the source_id is added
+  - files are parsed in a process pool (--workers); each worker streams its file page by page into a
+    part file, so memory stays bounded by one page per worker whatever the report size or company count
+
+The manifest keeps size, mtime and sha1 of every ingested file. Unchanged files are skipped (sha1 is only
+recomputed when size or mtime moved). When sources were only added, their snippets are appended to the
+output; changed or removed sources rebuild it from the part files (streamed, in registry order). Files
+listed in the registry but missing on disk keep their previous snippets, with a warning.
+
+Usage:
+  python nlp/ingest.py
+  python nlp/ingest.py --companies_dir data/companies --out data/cleaned/snippets.jsonl --workers 8
+  python nlp/ingest.py --full        # re-parse every file
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from html.parser import HTMLParser
+from pathlib import Path
+from xml.etree import ElementTree
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.metrics import add_metrics_args, metrics_from_args, write_metrics
+
+try:
+    import pypdf
+except ImportError:  # optional, only needed for PDF sources
+    pypdf = None
+
+MANIFEST_FORMAT = "esg-ingest-manifest"
+MANIFEST_VERSION = 1
+PAGED_FORMATS = {".pdf": "pdf", ".docx": "docx"}
+HTML_SUFFIXES = {".html", ".htm"}
+TEXT_SUFFIXES = {".txt", ".md"}
+DEFAULT_MIN_CHARS = 25
+HASH_CHUNK = 1 << 20
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DATE_RE = re.compile(r"(\d{4})[_-](\d{2})[_-](\d{2})")
+BLOCK_SPLIT_RE = re.compile(r"\n\s*\n")
+HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(?=[a-z])")
+WS_RE = re.compile(r"\s+")
+# sentence end: . ! ? (optionally closed by a quote/bracket), whitespace, then an uppercase letter, digit or currency
+SENTENCE_END_RE = re.compile(r"[.!?][\"”’)]?\s+(?=[\"“(]?[A-Z0-9₹$€£])")
+ABBREVIATIONS = {"inc", "ltd", "co", "corp", "pvt", "no", "nos", "vs", "e.g", "i.e", "approx", "mr", "mrs", "ms",
+                 "dr", "st", "fig", "rs", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct",
+                 "nov", "dec", "u.s", "u.k"}
+HTML_SKIP_TAGS = {"script", "style", "noscript", "nav", "footer", "header", "svg", "form"}
+HTML_BLOCK_TAGS = {"p", "div", "section", "article", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "br",
+                   "tr", "td", "th", "table", "blockquote", "main", "aside", "figcaption"}
+
+
+# ---------- text ----------
+
+def split_sentences(text, min_chars=DEFAULT_MIN_CHARS):
+    """Sentences of one page: blocks split on blank lines, then on sentence ends (not after abbreviations)."""
+    out = []
+    for block in BLOCK_SPLIT_RE.split(text):
+        block = WS_RE.sub(" ", HYPHEN_BREAK_RE.sub(r"\1", block)).strip()
+        if not block:
+            continue
+        start = 0
+        for m in SENTENCE_END_RE.finditer(block):
+            head = block[start:m.start() + 1]
+            last_word = head.rsplit(" ", 1)[-1].rstrip(".").lower()
+            if last_word in ABBREVIATIONS or (len(last_word) == 1 and last_word.isalpha()):
+                continue  # "Tata Power Co. Ltd." / initials
+            out.append(block[start:m.end()].strip())
+            start = m.end()
+        out.append(block[start:].strip())
+    return [s for s in out if len(s) >= min_chars and any(c.isalpha() for c in s)]
+
+
+# ---------- parsers: each yields (page number or None, page text) ----------
+
+def iter_pdf_pages(path):
+    if pypdf is None:
+        raise ImportError("pypdf is required to ingest PDF files (pip install pypdf).")
+    reader = pypdf.PdfReader(str(path))
+    for i, page in enumerate(reader.pages, start=1):
+        yield i, page.extract_text() or ""
+
+
+def iter_docx_pages(path):
+    """Paragraphs of word/document.xml, streamed; explicit and last-rendered page breaks start a new page."""
+    page, paragraphs, parts = 1, [], []
+    with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as f:
+        for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if (tag == W_NS + "br" and elem.get(W_NS + "type") == "page") or tag == W_NS + "lastRenderedPageBreak":
+                    # an explicit break is usually followed by a rendered one: only content starts a new page
+                    if paragraphs or parts:
+                        paragraphs.append("".join(parts))
+                        parts = []
+                        yield page, "\n\n".join(paragraphs)
+                        paragraphs = []
+                        page += 1
+                continue
+            if tag == W_NS + "t":
+                parts.append(elem.text or "")
+            elif tag == W_NS + "tab":
+                parts.append(" ")
+            elif tag == W_NS + "p":
+                paragraphs.append("".join(parts))
+                parts = []
+                elem.clear()
+    if paragraphs:
+        yield page, "\n\n".join(paragraphs)
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HTML_SKIP_TAGS:
+            self.skip += 1
+        elif tag in HTML_BLOCK_TAGS:
+            self.chunks.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in HTML_SKIP_TAGS:
+            self.skip = max(0, self.skip - 1)
+        elif tag in HTML_BLOCK_TAGS:
+            self.chunks.append("\n\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.chunks.append(data.replace("\n", " "))
+
+
+def iter_html_pages(path):
+    parser = _TextExtractor()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), ""):
+            parser.feed(chunk)
+    parser.close()
+    yield None, "".join(parser.chunks)
+
+
+def iter_text_pages(path):
+    """Plain text; form feeds separate pages."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    pages = text.split("\f")
+    if len(pages) == 1:
+        yield None, text
+    else:
+        for i, page in enumerate(pages, start=1):
+            yield i, page
+
+
+def iter_pages(path):
+    suffix = Path(path).suffix.lower()
+    if suffix == ".pdf":
+        return iter_pdf_pages(path)
+    if suffix == ".docx":
+        return iter_docx_pages(path)
+    if suffix in HTML_SUFFIXES:
+        return iter_html_pages(path)
+    if suffix in TEXT_SUFFIXES:
+        return iter_text_pages(path)
+    raise ValueError(f"unsupported file type {suffix!r} ({path})")
+
+
+# ---------- registry / manifest ----------
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_date(entry):
+    if entry.get("date"):
+        return entry["date"]
+    m = DATE_RE.search(entry.get("source_id", ""))
+    return f"{m.group(1)}-{m.group(2)}-{m.group(3)}" if m else None
+
+
+def id_prefix(entry):
+    fmt = PAGED_FORMATS.get(Path(entry["filename"]).suffix.lower())
+    if fmt:
+        return f"{entry['company_id']}_{fmt}"
+    m = DATE_RE.search(entry["source_id"])
+    return f"{entry['company_id']}_{entry.get('type') or 'web'}" + (f"_{m.group(1)}_{m.group(2)}_{m.group(3)}" if m else "")
+
+
+def load_registry(companies_dir):
+    """Source entries of all companies, in (company file, file list) order, with unique snippet id prefixes."""
+    entries = []
+    for path in sorted(Path(companies_dir).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            company = json.load(f)
+        for file in company.get("files", []):
+            if not file.get("filename") or not file.get("source_id"):
+                continue
+            entries.append({**file, "company_id": company["company_id"]})
+    seen = {}
+    for e in entries:
+        e["key"] = f"{e['company_id']}/{e['source_id']}"
+        e["prefix"] = id_prefix(e)
+        seen.setdefault(e["prefix"], []).append(e)
+    for group in seen.values():
+        if len(group) > 1:
+            for e in group:
+                e["prefix"] += "_" + hashlib.sha1(e["source_id"].encode("utf-8")).hexdigest()[:6]
+    return entries
+
+
+def load_manifest(path):
+    if not path.exists():
+        return {"files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MANIFEST_FORMAT or manifest.get("version") != MANIFEST_VERSION:
+        print(f"Ignoring {path}: not an ingest manifest of version {MANIFEST_VERSION}")
+        return {"files": {}}
+    return manifest
+
+
+def save_manifest(path, manifest):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def part_name(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".jsonl"
+
+
+# ---------- worker ----------
+
+def ingest_file(entry, part_path, min_chars):
+    """Parses one source into its part file (written then renamed). Runs in a worker process."""
+    part_path = Path(part_path)
+    tmp = part_path.with_name(part_path.name + ".tmp")
+    n_snippets = n_pages = 0
+    date = source_date(entry)
+    with open(tmp, "w", encoding="utf-8") as out:
+        for page, text in iter_pages(entry["filename"]):
+            n_pages += 1
+            for n, sentence in enumerate(split_sentences(text, min_chars), start=1):
+                if page is None:
+                    sid, provenance = f"{entry['prefix']}_s{n}", entry.get("provenance")
+                else:
+                    sid = f"{entry['prefix']}_p{page}_s{n}"
+                    provenance = f"{entry['provenance']}#page={page}" if entry.get("provenance") else None
+                out.write(json.dumps({
+                    "snippet_id": sid,
+                    "company_id": entry["company_id"],
+                    "source_id": entry["source_id"],
+                    "date": date,
+                    "type": entry.get("type"),
+                    "text": sentence,
+                    "provenance": provenance,
+                }, ensure_ascii=False) + "\n")
+                n_snippets += 1
+    os.replace(tmp, part_path)
+    return n_pages, n_snippets
+
+
+def _ingest_job(entry, part_path, min_chars, sha1=None):
+    try:
+        n_pages, n_snippets = ingest_file(entry, part_path, min_chars)
+        return entry["key"], sha1 or file_sha1(entry["filename"]), n_pages, n_snippets, None
+    except Exception as e:  # a corrupt file must not stop the other workers
+        return entry["key"], None, 0, 0, f"{type(e).__name__}: {e}"
+
+
+# ---------- output ----------
+
+def copy_parts(parts, out):
+    for part in parts:
+        with open(part, "r", encoding="utf-8") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), ""):
+                out.write(chunk)
+
+
+def run(args):
+    metrics = metrics_from_args("ingest", args)
+    out_path = Path(args.out)
+    state_dir = Path(args.state_dir)
+    parts_dir = state_dir / "parts"
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = state_dir / "manifest.json"
+    manifest = load_manifest(manifest_path)
+    previous = {} if args.full else manifest["files"]
+
+    entries = load_registry(args.companies_dir)
+    todo, missing, kept = [], [], {}
+    with metrics.stage("scan", items=len(entries)):
+        for e in entries:
+            prev = previous.get(e["key"])
+            path = Path(e["filename"])
+            if not path.exists():
+                missing.append(e["key"])
+                if e["key"] in manifest["files"]:
+                    kept[e["key"]] = manifest["files"][e["key"]]
+                continue
+            st = path.stat()
+            stat = {"size": st.st_size, "mtime": st.st_mtime}
+            sha1 = None
+            if prev and prev["prefix"] == e["prefix"] and (parts_dir / prev["part"]).exists():
+                if prev["size"] == stat["size"] and prev["mtime"] == stat["mtime"]:
+                    kept[e["key"]] = prev
+                    continue
+                sha1 = file_sha1(path)
+                if sha1 == prev["sha1"]:
+                    kept[e["key"]] = {**prev, **stat}
+                    continue
+            todo.append((e, stat, sha1))
+    if missing:
+        print(f"Warning: {len(missing)} listed files not found (previous snippets kept), e.g. "
+              f"{', '.join(missing[:3])}")
+
+    results, failed = {}, []
+    with metrics.stage("parse", items=len(todo)) as st:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(_ingest_job, e, str(parts_dir / part_name(e["key"])), args.min_chars, sha1): (e, stat)
+                       for e, stat, sha1 in todo}
+            for fut in as_completed(futures):
+                e, stat = futures[fut]
+                key, sha1, n_pages, n_snippets, error = fut.result()
+                if error:
+                    failed.append(key)
+                    print(f"Failed to ingest {e['filename']}: {error}")
+                    if key in manifest["files"]:
+                        kept[key] = manifest["files"][key]  # retried next run; old snippets stay
+                    continue
+                results[key] = {"filename": e["filename"], "prefix": e["prefix"], "part": part_name(key),
+                                "sha1": sha1, "pages": n_pages, "snippets": n_snippets, **stat}
+                metrics.count("pages_parsed", n_pages)
+                metrics.count("snippets_written", n_snippets)
+        st.items = sum(r["pages"] for r in results.values())
+    metrics.count("files_parsed", len(results))
+    metrics.count("files_skipped", len(entries) - len(todo) - len(missing))
+    metrics.count("files_missing", len(missing))
+    metrics.count("files_failed", len(failed))
+
+    files = {}
+    for e in entries:  # registry order
+        rec = results.get(e["key"]) or kept.get(e["key"])
+        if rec:
+            files[e["key"]] = rec
+    old_keys = list(manifest["files"])
+    removed = [k for k in old_keys if k not in files]
+    for k in removed:
+        (parts_dir / manifest["files"][k]["part"]).unlink(missing_ok=True)
+    changed = [k for k in results if k in old_keys]
+    added = [k for k in results if k not in old_keys]
+
+    with metrics.stage("write") as st:
+        unchanged_output = out_path.exists() and manifest.get("output_size") == out_path.stat().st_size
+        if not (added or changed or removed) and (unchanged_output or not files):
+            mode = "unchanged"
+        elif unchanged_output and not changed and not removed and not args.full \
+                and [k for k in files if k not in added] == old_keys:
+            # only new sources: append their parts (a later rebuild restores registry order)
+            mode = "appended"
+            with open(out_path, "a", encoding="utf-8") as out:
+                copy_parts([parts_dir / files[k]["part"] for k in added], out)
+        else:
+            mode = "rebuilt"
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = out_path.with_name(out_path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as out:
+                copy_parts([parts_dir / rec["part"] for rec in files.values()], out)
+            os.replace(tmp, out_path)
+        st.items = sum(rec["snippets"] for rec in files.values())
+
+    save_manifest(manifest_path, {
+        "format": MANIFEST_FORMAT,
+        "version": MANIFEST_VERSION,
+        "output": str(out_path),
+        "output_size": out_path.stat().st_size if out_path.exists() else None,
+        "files": files,
+    })
+    print(f"Ingest: {len(results)} files parsed ({len(added)} new, {len(changed)} changed), "
+          f"{len(entries) - len(todo) - len(missing)} unchanged, {len(removed)} removed, {len(failed)} failed; "
+          f"{sum(rec['snippets'] for rec in files.values())} snippets, output {mode} -> {out_path}")
+    write_metrics(metrics, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies_dir", default="data/companies", help="company registry JSONs")
+    parser.add_argument("--out", default="data/cleaned/snippets.jsonl")
+    parser.add_argument("--state_dir", default="data/cleaned/ingest", help="manifest and per-source part files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parser processes")
+    parser.add_argument("--min_chars", type=int, default=DEFAULT_MIN_CHARS, help="drop shorter sentences")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-parse every file")
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+nlp/metrics.py
+
+Per-stage timing and counters shared by the pipeline scripts (claim_extractor, embed_matcher_tfidf,
+build_graph, tci_calc, llm_wrapper, pipeline).
+
+  - metrics.stage(name) times a block: wall and CPU seconds, items processed (set .items inside the
+    block), items/sec and the process peak RSS when the stage ended
+  - metrics.count(name, n, **labels) / metrics.gauge(name, value, **labels) record counters (snippets
+    prefiltered, claims emitted, verdicts by label, ...) and point values (cache hit rates, ...)
+  - metrics.write() saves outputs/metrics/{script}.json (or --metrics_out) and, with --prometheus_out,
+    a Prometheus text exposition file (e.g. for the node_exporter textfile collector)
+  - --profile extract,verify (or "all") runs those stages under cProfile (or --profiler pyinstrument,
+    if installed) and writes the profiles to outputs/metrics/profiles/{script}.{stage}.prof / .txt
+
+Usage (every instrumented script takes the same flags):
+  python nlp/claim_extractor.py --snippets data/cleaned/snippets.jsonl --prometheus_out outputs/metrics/extract.prom
+  python nlp/pipeline.py --snippets data/cleaned/snippets.jsonl --profile verify
+  python -m pstats outputs/metrics/profiles/pipeline.verify.prof
+"""
+
+import cProfile
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is reported as null there
+    resource = None
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # optional, only needed for --profiler pyinstrument
+    PyinstrumentProfiler = None
+
+DEFAULT_METRICS_DIR = "outputs/metrics"
+PROFILERS = ["cprofile", "pyinstrument"]
+PROM_PREFIX = "esg"
+PROM_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident set size, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Stage:
+    __slots__ = ("name", "items", "wall", "cpu", "peak_rss_mb")
+
+    def __init__(self, name, items=None):
+        self.name = name
+        self.items = items
+        self.wall = self.cpu = 0.0
+        self.peak_rss_mb = None
+
+    def as_dict(self):
+        out = {"stage": self.name, "wall_seconds": round(self.wall, 4), "cpu_seconds": round(self.cpu, 4),
+               "items": self.items, "peak_rss_mb": self.peak_rss_mb}
+        if self.items is not None:
+            out["items_per_sec"] = round(self.items / self.wall, 2) if self.wall > 0 else None
+        return out
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    def __init__(self, script, profile=(), profiler="cprofile", profile_dir=None):
+        self.script = script
+        self.started_at = datetime.utcnow().isoformat()
+        self.t0 = time.perf_counter()
+        self.stages = []
+        self.counters = {}  # name -> {label key: value}
+        self.gauges = {}
+        self.profile = set(profile)
+        self.profiler = profiler
+        self.profile_dir = Path(profile_dir or os.path.join(DEFAULT_METRICS_DIR, "profiles"))
+        self._profiling = False
+        if profiler == "pyinstrument" and self.profile and PyinstrumentProfiler is None:
+            raise ImportError("pyinstrument is required for --profiler pyinstrument (pip install pyinstrument).")
+
+    def _wants_profile(self, name):
+        # profilers don't nest; a stage inside a profiled stage shows up in the outer profile
+        return not self._profiling and ("all" in self.profile or name in self.profile)
+
+    @contextmanager
+    def stage(self, name, items=None):
+        """Times the block; set `.items` on the yielded Stage to get items/sec."""
+        st = Stage(name, items)
+        profiler = None
+        if self._wants_profile(name):
+            profiler = cProfile.Profile() if self.profiler == "cprofile" else PyinstrumentProfiler()
+            self._profiling = True
+            profiler.enable() if self.profiler == "cprofile" else profiler.start()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield st
+        finally:
+            st.wall = time.perf_counter() - wall0
+            st.cpu = time.process_time() - cpu0
+            st.peak_rss_mb = peak_rss_mb()
+            self.stages.append(st)
+            if profiler is not None:
+                self._profiling = False
+                self._save_profile(name, profiler)
+
+    def _save_profile(self, name, profiler):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{self.script}.{name}"
+        if self.profiler == "cprofile":
+            profiler.disable()
+            path = self.profile_dir / f"{stem}.prof"
+            profiler.dump_stats(str(path))
+        else:
+            profiler.stop()
+            path = self.profile_dir / f"{stem}.txt"
+            path.write_text(profiler.output_text(unicode=True, color=False), encoding="utf-8")
+        print(f"Profile of stage {name} -> {path}")
+
+    def count(self, name, n=1, **labels):
+        values = self.counters.setdefault(name, {})
+        key = _label_key(labels)
+        values[key] = values.get(key, 0) + n
+
+    def gauge(self, name, value, **labels):
+        self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def hit_rate(self, name, hits, total, **labels):
+        """Gauge `name` = hits / total (None when nothing was looked up)."""
+        self.gauge(name, round(hits / total, 4) if total else None, **labels)
+
+    @staticmethod
+    def _flatten(values):
+        if list(values) == [()]:
+            return values[()]
+        return {",".join(f"{k}={v}" for k, v in key) or "_": value for key, value in values.items()}
+
+    def as_dict(self):
+        return {
+            "script": self.script,
+            "started_at": self.started_at,
+            "wall_seconds": round(time.perf_counter() - self.t0, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": [st.as_dict() for st in self.stages],
+            "counters": {name: self._flatten(v) for name, v in self.counters.items()},
+            "gauges": {name: self._flatten(v) for name, v in self.gauges.items()},
+        }
+
+    def prometheus_text(self, data=None):
+        data = data or self.as_dict()
+        lines = []
+
+        def emit(name, kind, samples):
+            metric = f"{PROM_PREFIX}_{PROM_NAME_RE.sub('_', name)}"
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                labels = {"script": self.script, **dict(labels)}
+                label_str = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{metric}{{{label_str}}} {value}")
+
+        emit("run_wall_seconds", "gauge", [((), data["wall_seconds"])])
+        emit("peak_rss_bytes", "gauge", [((), None if data["peak_rss_mb"] is None else int(data["peak_rss_mb"] * 1024 * 1024))])
+        for field, metric in (("wall_seconds", "stage_wall_seconds"), ("cpu_seconds", "stage_cpu_seconds"),
+                              ("items", "stage_items"), ("items_per_sec", "stage_items_per_second")):
+            emit(metric, "gauge", [((("stage", st["stage"]),), st.get(field)) for st in data["stages"]])
+        for name, values in sorted(self.counters.items()):
+            emit(f"{name}_total", "counter", sorted(values.items()))
+        for name, values in sorted(self.gauges.items()):
+            emit(name, "gauge", sorted(values.items()))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        parts = []
+        for st in self.stages:
+            rate = f", {st.items / st.wall:,.0f} items/s" if st.items and st.wall > 0 else ""
+            parts.append(f"{st.name} {st.wall:.2f}s{rate}")
+        rss = peak_rss_mb()
+        return "; ".join(parts) + (f"; peak RSS {rss:.0f} MB" if rss is not None else "")
+
+    def write(self, path=None, prometheus_path=None):
+        """Writes the metrics JSON (default outputs/metrics/{script}.json) and optional Prometheus file."""
+        data = self.as_dict()
+        path = Path(path or os.path.join(DEFAULT_METRICS_DIR, f"{self.script}.json"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        if prometheus_path:
+            prometheus_path = Path(prometheus_path)
+            prometheus_path.parent.mkdir(parents=True, exist_ok=True)
+            # write-then-rename so a textfile collector never reads a half-written file
+            tmp = prometheus_path.with_name(prometheus_path.name + ".tmp")
+            tmp.write_text(self.prometheus_text(data), encoding="utf-8")
+            os.replace(tmp, prometheus_path)
+        print(f"Metrics: {self.summary()} -> {path}")
+        return path
+
+
+def add_metrics_args(parser):
+    parser.add_argument("--metrics_out", default=None, help=f"metrics JSON (default {DEFAULT_METRICS_DIR}/<script>.json)")
+    parser.add_argument("--prometheus_out", default=None, help="also write a Prometheus text exposition file")
+    parser.add_argument("--profile", default="", help="comma-separated stages to profile, or 'all'")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile")
+    parser.add_argument("--profile_dir", default=None, help=f"profile output dir (default {DEFAULT_METRICS_DIR}/profiles)")
+
+
+def metrics_from_args(script, args):
+    """Metrics for a script run; tolerates args namespaces built without add_metrics_args."""
+    profile = [s.strip() for s in (getattr(args, "profile", "") or "").split(",") if s.strip()]
+    return Metrics(script, profile, getattr(args, "profiler", "cprofile"), getattr(args, "profile_dir", None))
+
+
+def write_metrics(metrics, args):
+    return metrics.write(getattr(args, "metrics_out", None), getattr(args, "prometheus_out", None))
@@ -5,9 +5,11 @@ nlp/normalize_claims.py
 Normalizes existing claim JSONs:
   - fills missing `unit` if '%' present in claim_text
   - standardizes units using mappings/metrics_map.json
-  - remaps metric keywords if possible
+  - remaps metric keywords if possible (shared ontology index, nlp/ontology.py)
   - writes cleaned claim files back to ./claims/
   - makes backup copies under ./claims_backup/
+  If ./claims/ is a claim store (nlp/claim_store.py), changed claims are appended to it instead and
+  the superseded records serve as the backup.
 
 Usage:
   python nlp/normalize_claims.py
@@ -15,9 +17,14 @@ Usage:
 
 import json
 import shutil
+import sys
 from pathlib import Path
 import re
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import ClaimStore, is_claim_store
+from nlp.ontology import build_ontology_index
+
 MAPPINGS_PATH = Path("mappings/metrics_map.json")
 CLAIMS_DIR = Path("claims")
 BACKUP_DIR = Path("claims_backup")
@@ -44,18 +51,58 @@ def infer_unit_from_text(text):
         return "kg"
     return None
 
-def map_metric_from_text(text, metric_aliases):
-    txt = text.lower()
-    for metric, aliases in metric_aliases.items():
-        for a in aliases:
-            if a in txt:
-                return metric
-    return None
+def normalize_claim(data, units_map, ontology_index):
+    """Normalizes one claim dict in place. Returns True if anything changed."""
+    changed = False
+
+    # 1. Fill missing unit
+    if not data.get("unit"):
+        inferred = infer_unit_from_text(data.get("claim_text", ""))
+        if inferred:
+            data["unit"] = normalize_unit(inferred, units_map)
+            changed = True
+
+    # 2. Normalize unit if present
+    if data.get("unit"):
+        newu = normalize_unit(data["unit"], units_map)
+        if newu != data["unit"]:
+            data["unit"] = newu
+            changed = True
+
+    # 3. Map metric again (in case ontology improved)
+    if data.get("metric") in (None, "unknown", ""):
+        mapped_metric = ontology_index.map_metric(data.get("claim_text", ""))
+        if mapped_metric:
+            data["metric"] = mapped_metric
+            changed = True
+
+    return changed
+
+def normalize_store(store, units_map, ontology_index, batch_size=10_000):
+    """
+    Claim store: changed claims are appended as new records (superseding the old ones), so the
+    previous versions stay in the shards and no separate backup is needed.
+    """
+    total, updated, batch = 0, 0, []
+    for data in store.iter_claims():
+        total += 1
+        if normalize_claim(data, units_map, ontology_index):
+            batch.append(data)
+            if len(batch) >= batch_size:
+                updated += store.append(batch)
+                batch = []
+    if batch:
+        updated += store.append(batch)
+    print(f"Normalization complete. Updated {updated}/{total} claims in store {CLAIMS_DIR}.")
 
 def main():
     mappings = load_json(MAPPINGS_PATH)
     units_map = mappings.get("units", {})
-    metric_aliases = mappings.get("metric_aliases", {})
+    ontology_index = build_ontology_index(mappings.get("metric_aliases", {}))
+
+    if is_claim_store(CLAIMS_DIR):
+        normalize_store(ClaimStore(CLAIMS_DIR), units_map, ontology_index)
+        return
 
     claim_files = sorted(list(CLAIMS_DIR.glob("*.json")))
     print(f"Found {len(claim_files)} claim files to normalize.")
@@ -63,33 +110,11 @@ def main():
     updated = 0
     for cf in claim_files:
         data = json.load(open(cf, "r", encoding="utf-8"))
-        changed = False
 
         # Backup original
         shutil.copy2(cf, BACKUP_DIR / cf.name)
 
-        # 1. Fill missing unit
-        if not data.get("unit"):
-            inferred = infer_unit_from_text(data.get("claim_text", ""))
-            if inferred:
-                data["unit"] = normalize_unit(inferred, units_map)
-                changed = True
-
-        # 2. Normalize unit if present
-        if data.get("unit"):
-            newu = normalize_unit(data["unit"], units_map)
-            if newu != data["unit"]:
-                data["unit"] = newu
-                changed = True
-
-        # 3. Map metric again (in case ontology improved)
-        if data.get("metric") in (None, "unknown", ""):
-            mapped_metric = map_metric_from_text(data.get("claim_text", ""), metric_aliases)
-            if mapped_metric:
-                data["metric"] = mapped_metric
-                changed = True
-
-        if changed:
+        if normalize_claim(data, units_map, ontology_index):
             json.dump(data, open(cf, "w", encoding="utf-8"), indent=2, ensure_ascii=False)
             updated += 1
 
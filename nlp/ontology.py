@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+nlp/ontology.py
+
+Precompiled metric ontology index shared by the extractor and normalizer.
+
+Built once from the `metric_aliases` section of mappings/metrics_map.json (or an explicit ontology
+mapping) as an Aho-Corasick automaton over all aliases, so mapping a text to a metric is a single
+pass over the text regardless of how many aliases the ontology has.
+
+Matching semantics are the same as the old linear scan:
+    for metric, aliases in ontology.items():
+        for a in aliases:
+            if a in text.lower(): return metric
+i.e. aliases are matched case-sensitively against the lowercased text and the winner is the first
+metric (dict order), then the first alias (list order) that occurs anywhere in the text.
+
+Usage:
+  from nlp.ontology import load_ontology_index
+  index = load_ontology_index("mappings/metrics_map.json")
+  index.find("Scope 1 emissions fell 25%")   # -> ("scope1_emissions", (0, 17))
+"""
+
+import json
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+
+
+class OntologyIndex:
+    def __init__(self, metric_aliases: dict):
+        # patterns in priority order: (metric, alias); rank = position in this list
+        self.patterns = [(metric, alias) for metric, aliases in metric_aliases.items() for alias in aliases]
+        self._goto = [{}]
+        self._fail = [0]
+        # best (lowest-rank) pattern ending at each state, following failure links: (rank, length) or None
+        self._best = [None]
+        self._empty_rank = None
+
+        for rank, (_, alias) in enumerate(self.patterns):
+            if not alias:
+                # "" is a substring of every text
+                if self._empty_rank is None:
+                    self._empty_rank = rank
+                continue
+            state = 0
+            for ch in alias:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                state = nxt
+            if self._best[state] is None or rank < self._best[state][0]:
+                self._best[state] = (rank, len(alias))
+
+        # BFS to set failure links and merge the best output along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                f = self._goto[f].get(ch, 0)
+                self._fail[nxt] = f if f != nxt else 0
+                inherited = self._best[self._fail[nxt]]
+                if inherited is not None and (self._best[nxt] is None or inherited[0] < self._best[nxt][0]):
+                    self._best[nxt] = inherited
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _scan(self, txt: str, first_only: bool):
+        """
+        Returns (rank, start, end) of the winning match in already-lowercased `txt`, or None.
+        With first_only, returns as soon as anything matches.
+        """
+        best = (self._empty_rank, 0, 0) if self._empty_rank is not None else None
+        if best is not None and (first_only or best[0] == 0):
+            return best
+        goto, fail, outputs = self._goto, self._fail, self._best
+        state = 0
+        for i, ch in enumerate(txt):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            out = outputs[state]
+            # keep the first occurrence of the lowest rank; later occurrences of the same rank lose
+            if out is not None and (best is None or out[0] < best[0]):
+                best = (out[0], i + 1 - out[1], i + 1)
+                if first_only or best[0] == 0:
+                    break
+        return best
+
+    def find(self, text: str):
+        """
+        Returns (metric, (start, end)) for the highest-priority alias found in `text`, or None.
+        The span indexes `text.lower()`.
+        """
+        hit = self._scan(text.lower(), first_only=False)
+        if hit is None:
+            return None
+        rank, start, end = hit
+        return self.patterns[rank][0], (start, end)
+
+    def map_metric(self, text: str):
+        hit = self.find(text)
+        return hit[0] if hit else None
+
+    def has_keyword(self, text: str) -> bool:
+        return self._scan(text.lower(), first_only=True) is not None
+
+
+def build_ontology_index(metric_aliases: dict) -> OntologyIndex:
+    return OntologyIndex(metric_aliases or {})
+
+
+@lru_cache(maxsize=None)
+def load_ontology_index(mappings_path: str = "mappings/metrics_map.json") -> OntologyIndex:
+    """
+    Index over `metric_aliases` in a mappings JSON, built once per path per process.
+    """
+    p = Path(mappings_path)
+    if not p.exists():
+        return build_ontology_index({})
+    with open(p, "r", encoding="utf-8") as f:
+        mappings = json.load(f)
+    return build_ontology_index(mappings.get("metric_aliases", {}))
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+nlp/pipeline.py
+
+Incremental end-to-end runner:
+  extract + normalize -> verify (TF-IDF over the persistent evidence index) -> graph ->
+  TCI / timeline / fairness -> explanations -> claims_index.json
+
+Reads: data/cleaned/snippets.jsonl, mappings/metrics_map.json, mappings/ontology_map.json
+Writes: the same outputs as the individual scripts (claims/, verification/, graph/, outputs/scores/,
+        explain/explanations/, claims_index.json), plus evidence_index/ and a manifest
+        (outputs/pipeline_manifest.json) with content hashes of every snippet, claim and verification
+
+Each run diffs the snippets against the manifest and only redoes work downstream of what changed:
+  - new/edited snippets are extracted; claims of removed/edited snippets that no longer come out are
+    dropped from the claim store, claims of unchanged snippets are left alone
+  - a claim is re-verified when it changed or when its company's candidate evidence changed (new
+    snippets of that company, or shared third-party snippets; see --candidate_policy), including
+    snippets whose near-duplicate cluster changed (--dedupe_threshold, nlp/dedup.py)
+  - changed claims are applied to the global graph store and only the touched company graphs are
+    re-exported; TCI is redone for companies with a changed claim or verification result, explanations
+    for changed claims; fairness, timelines and the claims index are cheap and refreshed when needed
+Config hashes (mappings/ontology for extraction, matcher parameters + index IDF for verification,
+mappings for scoring) invalidate the stage they belong to. The evidence index is append-only, so
+edited or removed snippets rebuild it and re-verify everything. --full ignores the manifest.
+Per-stage timings and counters go to outputs/metrics/pipeline.json (see nlp/metrics.py for
+--prometheus_out and --profile).
+
+Usage:
+  python nlp/pipeline.py --snippets data/cleaned/snippets.jsonl
+  python nlp/pipeline.py --snippets data/cleaned/snippets.jsonl --skip explain
+  python nlp/pipeline.py --snippets data/cleaned/snippets.jsonl --full
+  python nlp/pipeline.py --snippets data/cleaned/snippets.jsonl --profile verify --prometheus_out outputs/metrics/pipeline.prom
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_extractor import (SPACY_MODEL, extract_claims_from_snippet, is_claim_candidate, iter_snippet_docs,
+                                 load_json, resolve_ontology_map)
+from nlp.claim_store import ClaimStore, is_claim_store
+from nlp.normalize_claims import normalize_claim
+from nlp.ontology import build_ontology_index
+from nlp.evidence_index import DEFAULT_REWEIGHT_FRACTION, EvidenceIndex, is_evidence_index
+from nlp.embed_matcher_tfidf import (CANDIDATE_POLICIES, DEFAULT_DEDUPE_THRESHOLD, SnippetNumerics,
+                                     build_candidate_groups, build_corroboration, companies_affected_by,
+                                     count_near_duplicates, count_verdicts, load_snippets, load_tolerances,
+                                     verify_claims, write_verifications)
+from nlp.metrics import add_metrics_args, metrics_from_args, write_metrics
+from nlp.build_graph import open_graph_store
+from scoring.tci_calc import (AGGREGATES_NAME, SourceAggregates, load_metric_mapping, load_pillar_weights,
+                              load_source_weights, reweight_scores, score_companies)
+from scoring.confidence_timeline import build_timeline
+from scoring.fairness_meter import compute_fairness
+from explain.llm_worker import DEFAULT_CACHE_PATH, DEFAULT_MODEL
+from explain.llm_wrapper import explain_claims, make_worker, record_llm_stats
+from scripts.generate_claims_index import claim_index_entry, load_verification
+
+MANIFEST_FORMAT = "esg-pipeline-manifest"
+MANIFEST_VERSION = 1
+STAGES = ["graph", "scores", "explain", "index"]
+
+
+def content_hash(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    p = Path(path) if path else None
+    if p is None or not p.exists():
+        return None
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def load_manifest(path: Path):
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MANIFEST_FORMAT or manifest.get("version") != MANIFEST_VERSION:
+        print(f"Ignoring {path}: not a pipeline manifest of version {MANIFEST_VERSION}")
+        return {}
+    return manifest
+
+
+def save_manifest(path: Path, manifest):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_claims(store, claim_ids, total):
+    """Claims for a set of ids: point lookups for a small subset, else one streaming pass."""
+    if len(claim_ids) * 4 < total:
+        return [store.get(cid) for cid in sorted(claim_ids)]
+    return [c for c in store.iter_claims() if c.get("claim_id") in claim_ids]
+
+
+def extract(snippets, metrics_map, ontology_map, args, metrics=None):
+    """snippet_id -> normalized claims, for the snippets that pass the prefilter."""
+    if not snippets:
+        return {}
+    ontology_index = build_ontology_index(resolve_ontology_map(metrics_map, ontology_map))
+    # normalize_claims maps metrics from metric_aliases only
+    norm_index = build_ontology_index(metrics_map.get("metric_aliases", {}))
+    units_map = metrics_map.get("units", {})
+
+    def candidates():
+        for s in snippets:
+            if not s.get("company_id") or not s.get("snippet_id"):
+                continue
+            if args.no_prefilter or is_claim_candidate(s.get("text", ""), ontology_index):
+                passed[0] += 1
+                yield s
+
+    out, passed = {}, [0]
+    for snippet, doc in iter_snippet_docs(candidates(), batch_size=args.batch_size, n_process=args.n_process):
+        claims = extract_claims_from_snippet(snippet, metrics_map, ontology_map, doc=doc, ontology_index=ontology_index)
+        for claim in claims:
+            normalize_claim(claim, units_map, norm_index)
+        if claims:
+            out[snippet["snippet_id"]] = claims
+    if metrics is not None:
+        metrics.count("snippets_prefilter_passed", passed[0])
+        metrics.count("claims_emitted", sum(len(claims) for claims in out.values()))
+    return out
+
+
+def run(args):
+    manifest_path = Path(args.manifest)
+    last = load_manifest(manifest_path)
+    # --full recomputes everything, but outputs of claims that no longer exist are still cleaned up
+    prev = {} if args.full else last
+    prev_config = prev.get("config", {})
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    metrics = metrics_from_args("pipeline", args)
+
+    metrics_map = load_json(args.mappings) if args.mappings and Path(args.mappings).exists() else {}
+    ontology_map = load_json(args.ontology) if args.ontology and Path(args.ontology).exists() else None
+    config = {
+        "extract": content_hash([file_hash(args.mappings), file_hash(args.ontology), SPACY_MODEL, args.no_prefilter]),
+        "score": file_hash(args.mappings),
+        "source_weights": file_hash(args.source_weights),
+    }
+
+    # ---------- snippets ----------
+    snippets = load_snippets(args.snippets)
+    by_id = {}
+    for s in snippets:
+        if s.get("snippet_id") and s["snippet_id"] not in by_id:
+            by_id[s["snippet_id"]] = s
+    snippet_hashes = {sid: content_hash(s) for sid, s in by_id.items()}
+    prev_snippets = prev.get("snippets", {})
+    added = [sid for sid in snippet_hashes if sid not in prev_snippets]
+    edited = [sid for sid, h in snippet_hashes.items() if sid in prev_snippets and prev_snippets[sid] != h]
+    removed = [sid for sid in prev_snippets if sid not in snippet_hashes]
+    print(f"Snippets: {len(by_id)} ({len(added)} new, {len(edited)} edited, {len(removed)} removed)")
+
+    # ---------- extract + normalize ----------
+    claims_dir = Path(args.claims_dir)
+    prev_claims = prev.get("claims", {})
+    rebuild_claims = prev_config.get("extract") != config["extract"] or not is_claim_store(claims_dir)
+    if rebuild_claims:
+        snippet_claims, claims, to_extract = {}, {}, list(by_id)
+    else:
+        snippet_claims, claims, to_extract = dict(prev.get("snippet_claims", {})), dict(prev_claims), added + edited
+    stale = set()
+    for sid in edited + removed:
+        stale.update(snippet_claims.pop(sid, []))
+
+    with metrics.stage("extract", items=len(to_extract)):
+        extracted = extract([by_id[sid] for sid in to_extract], metrics_map, ontology_map, args, metrics)
+    metrics.count("snippets_seen", len(to_extract))
+    fresh = {}
+    for sid, sclaims in extracted.items():
+        snippet_claims[sid] = list(dict.fromkeys(c["claim_id"] for c in sclaims))
+        for c in sclaims:
+            fresh[c["claim_id"]] = c
+    stale -= set(fresh)
+    for cid in stale:
+        claims.pop(cid, None)
+
+    changed_claims = []
+    for cid, c in fresh.items():
+        h = content_hash(c)
+        if prev_claims.get(cid, [None])[0] != h:
+            changed_claims.append(c)
+        claims[cid] = [h, c.get("company_id")]
+    removed_claims = {cid: entry[1] for cid, entry in last.get("claims", {}).items() if cid not in claims}
+
+    if rebuild_claims:
+        store = ClaimStore.create(claims_dir, compression=args.compression, overwrite=True)
+        store.append(fresh.values())
+    else:
+        store = ClaimStore(claims_dir)
+        if stale:
+            store.compact(drop=stale)
+        store.append(changed_claims)
+    print(f"Claims: {len(changed_claims)} new/changed, {len(removed_claims)} removed ({len(claims)} total)")
+
+    # ---------- evidence index + verification ----------
+    index_dir = Path(args.index_dir)
+    index_rebuilt = args.full or bool(edited or removed) or not is_evidence_index(index_dir)
+    with metrics.stage("evidence_index", items=len(snippets) if index_rebuilt else len(added)):
+        if index_rebuilt:
+            index = EvidenceIndex.build(snippets, index_dir)
+            print(f"Evidence index built with {len(index)} snippets -> {index_dir}")
+        else:
+            index = EvidenceIndex(index_dir)
+            if added:
+                n = index.append([by_id[sid] for sid in added], reweight_fraction=args.reweight_fraction)
+                print(f"Evidence index: {n} new snippets appended ({len(index)} total).")
+
+    reps = None
+    regrouped = []  # indexed snippets whose near-duplicate representative moved since the last run
+    if args.dedupe_threshold > 0 and len(index):
+        with metrics.stage("dedupe", items=len(index)):
+            prev_reps = None if index_rebuilt else index.saved_near_duplicates()
+            reps = index.near_duplicates(threshold=args.dedupe_threshold)
+            if prev_reps is not None:
+                n_old = min(len(prev_reps), len(reps))
+                regrouped = [index.snippets[i] for i in np.nonzero(reps[:n_old] != prev_reps[:n_old])[0].tolist()]
+        count_near_duplicates(metrics, reps)
+
+    third_party_types = {t.strip() for t in args.third_party_types.split(",") if t.strip()}
+    tolerances = load_tolerances(args.mappings, args.percent_abs_tolerance, args.abs_frac_tolerance)
+    config["verify"] = content_hash({
+        "top_k": args.top_k,
+        "candidate_policy": args.candidate_policy,
+        "third_party_types": sorted(third_party_types),
+        "tolerances": tolerances,
+        "verdict_threshold": args.verdict_threshold,
+        "dedupe_threshold": args.dedupe_threshold,
+        # IDF changes on every re-weight (compaction), which moves every score
+        "idf": hashlib.sha1(index.idf.tobytes()).hexdigest(),
+    })
+    verify_all = index_rebuilt or prev_config.get("verify") != config["verify"]
+    verifs = {} if verify_all else {cid: h for cid, h in prev.get("verifications", {}).items() if cid in claims}
+    if verify_all:
+        to_verify = set(claims)
+    else:
+        to_verify = {c["claim_id"] for c in changed_claims} | {cid for cid in claims if cid not in verifs}
+        affected = companies_affected_by([by_id[sid] for sid in added] + regrouped, args.candidate_policy, third_party_types)
+        if affected is None:
+            to_verify = set(claims)
+        elif affected:
+            to_verify |= {cid for cid, (_, comp) in claims.items() if comp in affected}
+
+    verif_dir = Path(args.out_dir)
+    verif_dir.mkdir(parents=True, exist_ok=True)
+    changed_verifs = set()
+    if to_verify and len(index):
+        with metrics.stage("verify", items=len(to_verify)):
+            companies, types = index.company_ids(), index.source_types()
+            groups = build_candidate_groups(companies, types, args.candidate_policy, third_party_types, reps)
+            corroborating = None
+            if reps is not None:
+                corroborating = build_corroboration(companies, types, args.candidate_policy, third_party_types, reps)
+            batch = load_claims(store, to_verify, len(claims))
+            for outs in verify_claims(batch, index.snippets, index.matrix, index.transform, groups, args.top_k,
+                                      args.candidate_policy, args.max_block_mb, SnippetNumerics(index.snippets),
+                                      tolerances, args.verdict_threshold, corroborating):
+                write_verifications(verif_dir, outs)
+                count_verdicts(metrics, outs)
+                for out in outs:
+                    h = content_hash(out)
+                    if verifs.get(out["claim_id"]) != h:
+                        changed_verifs.add(out["claim_id"])
+                    verifs[out["claim_id"]] = h
+    for cid in removed_claims:
+        (verif_dir / f"{cid}_evidence.json").unlink(missing_ok=True)
+        verifs.pop(cid, None)
+    metrics.count("verification_results_changed", len(changed_verifs))
+    print(f"Verification: {len(to_verify)} claims scored, {len(changed_verifs)} results changed")
+
+    # ---------- downstream: only what depends on changed claims / verifications ----------
+    dirty_claims = {c["claim_id"] for c in changed_claims} | changed_verifs
+    dirty_companies = {claims[cid][1] for cid in dirty_claims} | set(removed_claims.values())
+    if prev_config.get("score") != config["score"]:
+        dirty_companies = {comp for _, comp in claims.values()} | set(removed_claims.values())
+    company_claims = {}
+    for cid, (_, comp) in claims.items():
+        company_claims.setdefault(comp, []).append(cid)
+
+    if "graph" not in skip and (dirty_claims or removed_claims):
+        with metrics.stage("graph", items=len(dirty_claims) + len(removed_claims)):
+            graph_store = open_graph_store(args.graph_store, rebuild=args.full)
+            touched = set(removed_claims.values())
+            for claim in load_claims(store, dirty_claims, len(claims)):
+                touched |= graph_store.upsert_claim(claim, load_verification(verif_dir, claim["claim_id"]), by_id)
+            for cid in removed_claims:
+                graph_store.remove_claim(cid)
+            graph_store.export(args.graph_dir, touched, formats=[f.strip() for f in args.graph_formats.split(",") if f.strip()],
+                               page_size=args.graph_page_size, top_n=args.graph_top_n)
+            graph_store.save(args.graph_store)
+            metrics.count("company_graphs_exported", len(touched))
+            print(f"Graphs rewritten for {len(touched)} companies -> {args.graph_dir}")
+
+    reweight = prev_config.get("source_weights") != config["source_weights"]
+    if "scores" not in skip and (dirty_companies or changed_claims or removed_claims or reweight):
+        with metrics.stage("scores", items=len(dirty_companies)):
+            scores_dir = Path(args.scores_dir)
+            scores_dir.mkdir(parents=True, exist_ok=True)
+            tci_path = scores_dir / "companies_tci.json"
+            aggregates_path = scores_dir / AGGREGATES_NAME
+            cached = prev and tci_path.exists() and aggregates_path.exists()
+            existing = json.load(open(tci_path)) if cached else []
+            aggregates = SourceAggregates.load(aggregates_path) if cached else SourceAggregates()
+            aggregates.drop(dirty_companies - set(company_claims))
+            metric_map = load_metric_mapping(args.mappings)
+            pillar_weights, source_weights = load_pillar_weights(args.mappings), load_source_weights(args.source_weights)
+            rescored = score_companies((c for comp in sorted(dirty_companies & set(company_claims), key=str)
+                                        for c in store.iter_claims(company_id=comp)), verif_dir, metric_map,
+                                       pillar_weights, source_weights, aggregates)
+            new_by_company = {e["company_id"]: e for e in rescored}
+            merged = [new_by_company.pop(e["company_id"], e) for e in existing
+                      if e["company_id"] not in dirty_companies or e["company_id"] in new_by_company]
+            if reweight:
+                # only the source weight table changed for untouched companies: re-weight them from the cache
+                reweight_scores([e for e in merged if e["company_id"] not in dirty_companies], aggregates,
+                                source_weights, pillar_weights)
+            merged.extend(new_by_company.values())
+            aggregates.save(aggregates_path)
+            json.dump(merged, open(tci_path, "w"), indent=2)
+            metrics.count("companies_scored", len(rescored))
+            print(f"TCI: {len(rescored)} companies rescored -> {tci_path}")
+            build_timeline(str(scores_dir), str(scores_dir))
+            for comp in dirty_companies - set(company_claims):
+                (scores_dir / f"timeline_{comp}.json").unlink(missing_ok=True)
+            compute_fairness(str(claims_dir), args.mappings, str(scores_dir))
+
+    if "explain" not in skip and (dirty_claims or removed_claims):
+        with metrics.stage("explain", items=len(dirty_claims)):
+            explain_dir = Path(args.explain_dir)
+            explain_dir.mkdir(parents=True, exist_ok=True)
+            batch = load_claims(store, dirty_claims, len(claims))
+            worker = make_worker(args.llm_backend, args.llm_base_url, args.llm_model, args.llm_cache, args.llm_concurrency)
+            written = explain_claims(batch, {c["claim_id"]: load_verification(verif_dir, c["claim_id"]) for c in batch},
+                                     explain_dir, worker)
+            for cid in removed_claims:
+                (explain_dir / f"{cid}.json").unlink(missing_ok=True)
+            record_llm_stats(metrics, worker.stats, len(batch), len(written))
+            print(f"Explanations: {len(written)} written -> {explain_dir}")
+
+    if "index" not in skip and (dirty_claims or removed_claims):
+        with metrics.stage("index", items=len(claims)):
+            index_path = Path(args.claims_index)
+            old_entries = {}
+            if index_path.exists() and prev:
+                old_entries = {e["claim_id"]: e for e in json.load(open(index_path, "r", encoding="utf-8"))}
+            out = []
+            for c in store.iter_claims():
+                cid = c.get("claim_id")
+                entry = None if cid in dirty_claims else old_entries.get(cid)
+                out.append(entry or claim_index_entry(c, load_verification(verif_dir, cid)))
+            with open(index_path, "w", encoding="utf-8") as fw:
+                json.dump(out, fw, indent=2, ensure_ascii=False)
+            print(f"Wrote {index_path} with {len(out)} records.")
+
+    save_manifest(manifest_path, {
+        "format": MANIFEST_FORMAT,
+        "version": MANIFEST_VERSION,
+        "updated_at": datetime.utcnow().isoformat(),
+        "config": config,
+        "snippets": snippet_hashes,
+        "snippet_claims": snippet_claims,
+        "claims": claims,
+        "verifications": verifs,
+    })
+    print("Pipeline complete. Manifest ->", manifest_path)
+    write_metrics(metrics, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snippets", default="data/cleaned/snippets.jsonl")
+    parser.add_argument("--mappings", default="mappings/metrics_map.json")
+    parser.add_argument("--ontology", default="mappings/ontology_map.json")
+    parser.add_argument("--manifest", default="outputs/pipeline_manifest.json", help="content-hash manifest of the last run")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and recompute everything")
+    parser.add_argument("--skip", default="", help=f"comma-separated stages to skip: {','.join(STAGES)} (their outputs stay stale until a --full run)")
+    # extraction
+    parser.add_argument("--claims_dir", default="claims/")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default=None, help="claim store shard compression")
+    parser.add_argument("--batch_size", type=int, default=256, help="snippets per spaCy nlp.pipe batch")
+    parser.add_argument("--n_process", type=int, default=1, help="spaCy worker processes (-1 = all CPUs)")
+    parser.add_argument("--no_prefilter", action="store_true")
+    # verification
+    parser.add_argument("--index_dir", default="evidence_index/")
+    parser.add_argument("--reweight_fraction", type=float, default=DEFAULT_REWEIGHT_FRACTION)
+    parser.add_argument("--out_dir", default="verification/")
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--candidate_policy", choices=CANDIDATE_POLICIES, default="company_third_party")
+    parser.add_argument("--third_party_types", default="news,ngo")
+    parser.add_argument("--max_block_mb", type=float, default=256)
+    parser.add_argument("--percent_abs_tolerance", type=float, default=None)
+    parser.add_argument("--abs_frac_tolerance", type=float, default=None)
+    parser.add_argument("--verdict_threshold", type=float, default=0.55)
+    parser.add_argument("--dedupe_threshold", type=float, default=DEFAULT_DEDUPE_THRESHOLD, help="near-duplicate Jaccard; 0 disables")
+    # downstream outputs
+    parser.add_argument("--graph_dir", default="graph/")
+    parser.add_argument("--graph_store", default="outputs/graph_store.json", help="persistent global graph (nlp/build_graph.py)")
+    parser.add_argument("--graph_formats", default="json", help="graph exports, see nlp/graph_export.py")
+    parser.add_argument("--graph_page_size", type=int, default=0)
+    parser.add_argument("--graph_top_n", type=int, default=0)
+    parser.add_argument("--scores_dir", default="outputs/scores")
+    parser.add_argument("--source_weights", default="mappings/source_weights.json", help="source credibility weights (scoring/tci_calc.py)")
+    parser.add_argument("--explain_dir", default="explain/explanations")
+    parser.add_argument("--llm_backend", choices=["mock", "openai"], default="mock", help="see explain/llm_worker.py")
+    parser.add_argument("--llm_base_url", default="https://api.openai.com/v1")
+    parser.add_argument("--llm_model", default=DEFAULT_MODEL)
+    parser.add_argument("--llm_cache", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--llm_concurrency", type=int, default=4)
+    parser.add_argument("--claims_index", default="claims_index.json")
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+nlp/replay.py
+
+Event-sourced replay: ingests timestamped events (demo/events.json) and/or snippets
+(data/cleaned/snippets.jsonl, timestamped by their `date`) in time order and emits the claims'
+verdicts and every company's TCI as they stood at snapshot times, without re-running the pipeline
+per step.
+
+Reads: --events (JSON list or JSONL), --snippets, mappings/metrics_map.json, mappings/ontology_map.json,
+       mappings/source_weights.json
+Writes: outputs/replay/snapshots.jsonl, one line per (snapshot time, company):
+          {"as_of", "company_id", E, S, G, TCI, credibility..., "n_claims", "verdicts": {...}}
+        optionally the snapshots into a score history store (--history_dir, see scoring/score_history.py)
+
+How it stays incremental:
+  - extraction only depends on the snippet, so all snippets are extracted up front in one batched
+    spaCy pass; a snippet's claims become active when the snippet arrives
+  - TF-IDF is fitted once on the whole replay corpus (vocabulary and IDF are frozen, so a similarity
+    never changes after it was computed); snippets are rows of one matrix in arrival order
+  - each claim keeps its current top_k evidence (per candidate group, see --candidate_policy). When a
+    window of snippets arrives, only the claims whose candidate set grew are scored against the new
+    rows and their top lists merged; new claims are scored against everything visible so far
+  - verification records and TCI are rebuilt only for claims / companies whose evidence changed
+A snapshot at time T therefore equals running verification and scoring over the snippets with
+timestamp <= T (using the corpus-level IDF). Snippets without a timestamp are visible from the start.
+Events are mapped to snippets: event_id -> snippet_id, source -> source_id, snippet_text -> text,
+type via EVENT_SOURCE_TYPES.
+
+Usage:
+  python nlp/replay.py --events demo/events.json --interval 30d
+  python nlp/replay.py --snippets data/cleaned/snippets.jsonl --events demo/events.json --as_of 2025-01-01,2025-06-30
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_extractor import load_json
+from nlp.embed_matcher_tfidf import (CANDIDATE_POLICIES, UNATTRIBUTED_COMPANY_IDS, SnippetNumerics,
+                                     build_verification, load_snippets, load_tolerances, top_k_per_row)
+from nlp.pipeline import extract
+from scoring.score_history import ScoreHistory
+from scoring.tci_calc import (DEFAULT_SOURCE_WEIGHTS_PATH, SourceAggregates, load_metric_mapping,
+                              load_pillar_weights, load_source_weights, score_verified)
+
+# demo event types -> evidence source types used by the matcher and the source weight table
+EVENT_SOURCE_TYPES = {"report": "pdf", "ngo_investigation": "ngo", "thirdparty": "news"}
+
+
+def parse_ts(value):
+    """ISO date/datetime (any offset) -> naive UTC ISO string, '' if missing."""
+    if not value:
+        return ""
+    ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.isoformat()
+
+
+def parse_interval(value):
+    m = re.fullmatch(r"(\d+)([hdwm])", value.strip().lower())
+    if not m:
+        raise ValueError(f"bad --interval {value!r}, expected e.g. 12h, 1d, 7d, 2w, 1m")
+    n, unit = int(m.group(1)), m.group(2)
+    return timedelta(hours=n) if unit == "h" else timedelta(days=n * {"d": 1, "w": 7, "m": 30}[unit])
+
+
+def event_to_snippet(event):
+    return {
+        "snippet_id": event["event_id"],
+        "company_id": event.get("company_id"),
+        "source_id": event.get("source") or event.get("provenance") or event["event_id"],
+        "date": (event.get("timestamp") or "")[:10],
+        "type": EVENT_SOURCE_TYPES.get(event.get("type"), event.get("type")),
+        "text": event.get("snippet_text", ""),
+        "provenance": event.get("provenance"),
+    }
+
+
+def load_events(path):
+    if str(path).endswith(".jsonl"):
+        return load_snippets(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_stream(events_path=None, snippets_path=None):
+    """Snippets from both sources as (timestamp, snippet), sorted by time (stable)."""
+    stream = []
+    if snippets_path:
+        stream += [(parse_ts(s.get("timestamp") or s.get("date")), s) for s in load_snippets(snippets_path)]
+    if events_path:
+        stream += [(parse_ts(e.get("timestamp")), event_to_snippet(e)) for e in load_events(events_path)]
+    stream = [(ts, s) for ts, s in stream if s.get("snippet_id")]
+    stream.sort(key=lambda x: x[0])
+    return stream
+
+
+def snapshot_times(stream, interval=None, as_of=()):
+    times = {parse_ts(t) for t in as_of}
+    dated = [ts for ts, _ in stream if ts]
+    if interval and dated:
+        step = parse_interval(interval)
+        t, end = datetime.fromisoformat(dated[0]), datetime.fromisoformat(dated[-1])
+        while t < end:
+            t += step
+            times.add(t.isoformat())
+    if not times and stream:
+        times.add(stream[-1][0])
+    return sorted(times)
+
+
+class ReplayEngine:
+    """
+    Replay state: visible snippets (rows of the frozen TF-IDF matrix), active claims with their
+    per-group top_k evidence, verification records and per-company scores.
+    """
+
+    def __init__(self, snippets, claims_by_row, args):
+        self.snippets = snippets
+        self.claims_by_row = claims_by_row
+        self.top_k, self.policy = args.top_k, args.candidate_policy
+        self.third_party_types = {t.strip() for t in args.third_party_types.split(",") if t.strip()}
+        self.max_block_mb, self.verdict_threshold = args.max_block_mb, args.verdict_threshold
+        self.tolerances = load_tolerances(args.mappings, args.percent_abs_tolerance, args.abs_frac_tolerance)
+        self.metric_map = load_metric_mapping(args.mappings)
+        self.pillar_weights = load_pillar_weights(args.mappings)
+        self.source_weights = load_source_weights(args.source_weights)
+        self.aggregates = SourceAggregates()
+        self.numerics = SnippetNumerics(snippets)
+
+        self.vectorizer = TfidfVectorizer(stop_words="english", max_features=5000)
+        self.matrix = self.vectorizer.fit_transform([s.get("text", "") for s in snippets]).tocsr()
+        self.company_code, self.company_names = {}, []
+        # snippet -> company code (-1: unattributed, never a company's own evidence), third-party flag
+        self.row_company = np.array([-1 if s.get("company_id") in UNATTRIBUTED_COMPANY_IDS else self._code(s.get("company_id"))
+                                     for s in snippets], dtype=np.int64)
+        self.shared = np.array([s.get("company_id") in UNATTRIBUTED_COMPANY_IDS and s.get("type", s.get("source_type")) in self.third_party_types
+                                for s in snippets], dtype=bool)
+
+        self.visible = 0                 # snippets[:visible] have arrived
+        self.claims = {}                 # claim_id -> claim
+        self.company_claims = {}         # company -> {claim_id}
+        # active claims by position: id, company code, TF-IDF row (blocks stacked lazily)
+        self.position = {}
+        self.pos_claim, self.pos_company, self.pos_active = [], [], []
+        self.vec_blocks, self._vecs = [], None
+        self.tops = {}                   # claim_id -> [group 0 top, group 1 top], each [(row, score)] best first
+        self.floor = np.empty((0, 2))    # per position and group: k-th best score so far (-inf while not full)
+        self.own_count = {}              # company code -> visible own snippets
+        self.shared_count = 0
+        self.verifications = {}          # claim_id -> verification record
+        self.scores = {}                 # company -> score entry
+        self.dirty_claims, self.dirty_companies = set(), set()
+
+    def _code(self, company_id):
+        if company_id not in self.company_code:
+            self.company_code[company_id] = len(self.company_names)
+            self.company_names.append(company_id)
+        return self.company_code[company_id]
+
+    def _n_primary(self, code):
+        """Visible group-0 candidates of a company (how many top_k slots group 1 may not fill)."""
+        if self.policy == "all":
+            return self.visible
+        own = self.own_count.get(code, 0)
+        return own if self.policy == "company" else own + self.shared_count
+
+    def _masks(self, codes, rows):
+        """(positions x rows) membership of the candidate rows in each claim's groups 0 and 1."""
+        if self.policy == "all":
+            g0 = np.ones((len(codes), len(rows)), dtype=bool)
+        else:
+            g0 = codes[:, None] == self.row_company[rows][None, :]
+            if self.policy != "company":
+                g0 |= self.shared[rows][None, :]
+        return g0, (~g0 if self.policy == "prefer_company" else None)
+
+    def _update_tops(self, positions, rows):
+        """
+        Scores claims at `positions` against candidate `rows` (ascending) and merges every group's
+        top_k. Only claims with a candidate above their current k-th best are touched.
+        """
+        if not len(positions) or not len(rows):
+            return
+        vecs = self._vecs[positions]
+        codes = np.asarray(self.pos_company)[positions]
+        chunk = max(1, int(self.max_block_mb * 1024 * 1024 // (8 * len(rows))))
+        cand = self.matrix[rows]
+        for start in range(0, len(positions), chunk):
+            pos = positions[start:start + chunk]
+            block = cosine_similarity(vecs[start:start + chunk], cand)
+            for g, mask in enumerate(self._masks(codes[start:start + chunk], rows)):
+                if mask is None:
+                    continue
+                scored = np.where(mask, block, -np.inf)
+                hit = (scored > self.floor[pos, g][:, None]).any(axis=1)
+                if not hit.any():
+                    continue
+                idx, vals = top_k_per_row(scored[hit], self.top_k)
+                for p, ri, vi in zip(pos[hit].tolist(), idx, vals):
+                    cid = self.pos_claim[p]
+                    keep = vi > -np.inf
+                    new = list(zip(rows[ri[keep]].tolist(), vi[keep].tolist()))
+                    # same order verify_claims produces: score desc, ties to the earlier snippet
+                    merged = sorted(self.tops[cid][g] + new, key=lambda x: (-x[1], x[0]))[:self.top_k]
+                    if merged != self.tops[cid][g]:
+                        self.tops[cid][g] = merged
+                        self.dirty_claims.add(cid)
+                    self.floor[p, g] = merged[-1][1] if len(merged) == self.top_k else -np.inf
+
+    def advance(self, upto):
+        """Makes snippets[visible:upto] visible: activates their claims and updates affected top lists."""
+        rows = np.arange(self.visible, upto)
+        if not len(rows):
+            return
+        existing = np.flatnonzero(self.pos_active) if self.pos_active else np.zeros(0, dtype=np.int64)
+        fresh, fresh_claims = [], []
+        for r in rows.tolist():
+            for claim in self.claims_by_row.get(r, []):
+                cid, comp = claim["claim_id"], claim.get("company_id") or "unknown"
+                if cid in self.position:
+                    # re-stated claim: retire the old position, score it from scratch
+                    self.pos_active[self.position[cid]] = False
+                    old = self.claims[cid].get("company_id") or "unknown"
+                    self.company_claims[old].discard(cid)
+                    self.dirty_companies.add(old)
+                self.claims[cid] = claim
+                self.company_claims.setdefault(comp, set()).add(cid)
+                self.position[cid] = len(self.pos_claim)
+                fresh.append(len(self.pos_claim))
+                fresh_claims.append(claim)
+                self.pos_claim.append(cid)
+                self.pos_company.append(self._code(comp))
+                self.pos_active.append(True)
+                self.tops[cid] = [[], []]
+        existing = existing[np.asarray(self.pos_active, dtype=bool)[existing]] if len(existing) else existing
+
+        fresh = [p for p in fresh if self.pos_active[p]]
+
+        new_shared = int(self.shared[rows].sum())
+        own_codes = [c for c in self.row_company[rows].tolist() if c >= 0]
+        if self.policy == "prefer_company":
+            # group 1 fills the slots group 0 cannot: a company with < top_k primary candidates
+            # gets a different mix when that count grows, even if no top list changes
+            affected = set(self.pos_company) if new_shared else set(own_codes)
+            before = {code: min(self.top_k, self._n_primary(code)) for code in affected}
+        self.visible = upto
+        for code in own_codes:
+            self.own_count[code] = self.own_count.get(code, 0) + 1
+        self.shared_count += new_shared
+        if self.policy == "prefer_company":
+            for code, n in before.items():
+                if min(self.top_k, self._n_primary(code)) != n:
+                    self.dirty_claims.update(self.company_claims.get(self.company_names[code], ()))
+        if fresh_claims:
+            self.vec_blocks.append(self.vectorizer.transform([c.get("claim_text", "") for c in fresh_claims]))
+            self._vecs = sp.vstack(self.vec_blocks, format="csr")
+            self.floor = np.vstack([self.floor, np.full((len(fresh_claims), 2), -np.inf)])
+            self.dirty_claims.update(self.pos_claim[p] for p in fresh)
+
+        # existing claims only see the new rows, new claims everything visible so far
+        self._update_tops(existing, rows)
+        self._update_tops(np.asarray(fresh, dtype=np.int64), np.arange(upto))
+
+    def verify_dirty(self):
+        for cid in sorted(self.dirty_claims):
+            claim = self.claims[cid]
+            comp = claim.get("company_id") or "unknown"
+            primary, rest = self.tops[cid]
+            top = primary + rest[:self.top_k - min(self.top_k, self._n_primary(self.pos_company[self.position[cid]]))]
+            verif = build_verification(claim, top, self.snippets, self.numerics, self.tolerances, self.verdict_threshold)
+            if self.verifications.get(cid) != verif:
+                self.verifications[cid] = verif
+                self.dirty_companies.add(comp)
+        self.dirty_claims.clear()
+
+    def score_dirty(self, as_of):
+        companies = sorted(self.dirty_companies, key=str)
+        pairs = ((self.claims[c], self.verifications.get(c)) for comp in companies
+                 for c in sorted(self.company_claims.get(comp, ())))
+        entries = score_verified(pairs, self.metric_map, self.pillar_weights, self.source_weights,
+                                 self.aggregates, updated_at=as_of)
+        for comp in companies:
+            self.scores.pop(comp, None)
+        for entry in entries:
+            verdicts = dict.fromkeys(("supported", "contradicted", "insufficient"), 0)
+            for c in self.company_claims[entry["company_id"]]:
+                verdicts[self.verifications[c]["final_verdict"]] += 1
+            entry.update(n_claims=len(self.company_claims[entry["company_id"]]), verdicts=verdicts)
+            self.scores[entry["company_id"]] = entry
+        self.dirty_companies.clear()
+        return len(entries)
+
+    def snapshot(self, as_of):
+        """Brings verification and scores up to date and returns every scored company as of `as_of`."""
+        self.verify_dirty()
+        self.score_dirty(as_of)
+        return [{"as_of": as_of, **{k: v for k, v in e.items() if k != "updated_at"}}
+                for _, e in sorted(self.scores.items(), key=lambda x: str(x[0]))]
+
+
+def run(args):
+    t0 = time.time()
+    stream = load_stream(args.events, args.snippets)
+    if not stream:
+        print("Nothing to replay.")
+        return
+    times = [ts for ts, _ in stream]
+    snippets = [s for _, s in stream]
+    print(f"Replay: {len(snippets)} snippets from {times[0] or '(undated)'} to {times[-1]}")
+
+    metrics_map = load_json(args.mappings) if args.mappings and Path(args.mappings).exists() else {}
+    ontology_map = load_json(args.ontology) if args.ontology and Path(args.ontology).exists() else None
+    row_of = {s["snippet_id"]: i for i, s in enumerate(snippets)}
+    extracted = extract(snippets, metrics_map, ontology_map, args)
+    claims_by_row = {row_of[sid]: claims for sid, claims in extracted.items()}
+    print(f"Extracted {sum(len(c) for c in claims_by_row.values())} claims ({time.time() - t0:.1f}s)")
+
+    engine = ReplayEngine(snippets, claims_by_row, args)
+    history = ScoreHistory(args.history_dir) if args.history_dir else None
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    upto, n_rows = 0, 0
+    as_of_times = snapshot_times(stream, args.interval, [t for t in args.as_of.split(",") if t.strip()])
+    with open(out_path, "w", encoding="utf-8") as f:
+        for as_of in as_of_times:
+            while upto < len(times) and times[upto] <= as_of:
+                upto += 1
+            engine.advance(upto)
+            rows = engine.snapshot(as_of)
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n_rows += len(rows)
+            if history is not None:
+                history.append([{**r, "updated_at": as_of} for r in rows])
+    print(f"[✓] {len(as_of_times)} snapshots, {n_rows} company rows -> {out_path} ({time.time() - t0:.1f}s)")
+    return engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", default=None, help="timestamped events (demo/events.json format, JSON or JSONL)")
+    parser.add_argument("--snippets", default=None, help="snippets JSONL, replayed by their `date`")
+    parser.add_argument("--interval", default=None, help="snapshot every interval from the first event, e.g. 1d, 7d, 1m")
+    parser.add_argument("--as_of", default="", help="comma-separated extra snapshot times (ISO date/datetime)")
+    parser.add_argument("--out", default="outputs/replay/snapshots.jsonl")
+    parser.add_argument("--history_dir", default=None, help="also record snapshots into this score history store")
+    parser.add_argument("--mappings", default="mappings/metrics_map.json")
+    parser.add_argument("--ontology", default="mappings/ontology_map.json")
+    parser.add_argument("--source_weights", default=DEFAULT_SOURCE_WEIGHTS_PATH)
+    parser.add_argument("--batch_size", type=int, default=256, help="snippets per spaCy nlp.pipe batch")
+    parser.add_argument("--n_process", type=int, default=1, help="spaCy worker processes (-1 = all CPUs)")
+    parser.add_argument("--no_prefilter", action="store_true")
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--candidate_policy", choices=CANDIDATE_POLICIES, default="company_third_party")
+    parser.add_argument("--third_party_types", default="news,ngo")
+    parser.add_argument("--max_block_mb", type=float, default=256)
+    parser.add_argument("--percent_abs_tolerance", type=float, default=None)
+    parser.add_argument("--abs_frac_tolerance", type=float, default=None)
+    parser.add_argument("--verdict_threshold", type=float, default=0.55)
+    args = parser.parse_args()
+    if not args.events and not args.snippets:
+        parser.error("--events and/or --snippets is required")
+    run(args)
@@ -1,28 +1,58 @@
 """
-Confidence Timeline – builds simple chronological trend of TCI per company.
+Confidence Timeline – records the latest TCI of each company in the score history store
+(scoring/score_history.py) and writes timeline_{company}.json from it.
+
+Each timeline holds the company's real history: one point per scoring run within the last --since
+(default 2y), read from the daily partitions the company has points in, or with --freq D/W/M the
+downsampled buckets (mean/min/max/last, optional rolling stats) straight from its rollup.
+Only companies with new points get their timeline rewritten.
+
+Usage:
+  python scoring/confidence_timeline.py
+  python scoring/confidence_timeline.py --since 1y --freq W --window 4
 """
 
-import json, os, glob
-from datetime import datetime
-from collections import defaultdict
+import argparse, json, os, sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `scoring.*` when run as a script
+from scoring.score_history import FREQS, open_score_history, parse_since
+
+def company_timeline(history, company_id, since="2y", freq="raw", window=0):
+    """TCI timeline of one company over the last `since`: raw points or downsampled buckets."""
+    start = parse_since(since) if since else None
+    if freq == "raw":
+        return [{"date": p["ts"], "TCI": p["TCI"], "credibility_TCI": p.get("credibility_TCI")}
+                for p in history.points(company_id, start)]
+    return history.series(company_id, "TCI", freq, start, window=window)
 
-def build_timeline(scores_dir, out_dir):
+def build_timeline(scores_dir, out_dir, since="2y", freq="raw", window=0, companies=None):
     os.makedirs(out_dir, exist_ok=True)
     tci_path = os.path.join(scores_dir, "companies_tci.json")
     if not os.path.exists(tci_path):
         print("No TCI data found yet.")
         return
     data = json.load(open(tci_path))
-    timeline = defaultdict(list)
-    for entry in data:
-        timeline[entry["company_id"]].append({
-            "date": entry.get("updated_at", datetime.utcnow().isoformat()),
-            "TCI": entry["TCI"]
-        })
-    for cid, series in timeline.items():
-        series.sort(key=lambda x:x["date"])
+    history = open_score_history(scores_dir)
+    recorded = history.append(data)
+    fresh = {e["company_id"] for e in data if history.index.get(e["company_id"]) == e.get("updated_at")}
+    out_of_date = {e["company_id"] for e in data
+                   if not os.path.exists(os.path.join(out_dir, f"timeline_{e['company_id']}.json"))}
+    for cid in sorted(companies if companies is not None else fresh | out_of_date, key=str):
+        series = company_timeline(history, cid, since, freq, window)
         json.dump(series, open(os.path.join(out_dir, f"timeline_{cid}.json"),"w"), indent=2)
-    print(f"[✓] Saved timelines to {out_dir}")
+    print(f"[✓] Recorded {recorded} score points; saved timelines to {out_dir}")
 
 if __name__=="__main__":
-    build_timeline("outputs/scores","outputs/scores")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scores_dir", default="outputs/scores")
+    parser.add_argument("--out_dir", default="outputs/scores")
+    parser.add_argument("--since", default="2y", help="timeline span, e.g. 2y, 6m, 30d or an ISO date")
+    parser.add_argument("--freq", choices=("raw",) + FREQS, default="raw", help="raw points or D/W/M buckets")
+    parser.add_argument("--window", type=int, default=0, help="rolling mean/std over this many buckets")
+    parser.add_argument("--all", action="store_true", help="rewrite every company's timeline, not just updated ones")
+    args = parser.parse_args()
+    companies = None
+    if args.all:
+        companies = [e["company_id"] for e in json.load(open(os.path.join(args.scores_dir, "companies_tci.json")))]
+    build_timeline(args.scores_dir, args.out_dir, args.since, args.freq, args.window, companies)
@@ -2,20 +2,23 @@
 Fairness Meter – checks if E/S/G pillars are proportionally represented.
 """
 
-import json, os, glob
+import json, os, glob, sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import open_claim_store
+from scoring.tci_calc import load_metric_mapping
 
 def compute_fairness(claims_dir, metric_map_path, out_dir):
     os.makedirs(out_dir, exist_ok=True)
-    metric_map = json.load(open(metric_map_path))
+    metric_map = load_metric_mapping(metric_map_path)
     per_company = {}
 
-    for path in glob.glob(os.path.join(claims_dir, "*.json")):
-        claim = json.load(open(path))
+    for claim in open_claim_store(claims_dir).iter_claims():
         cid = claim["company_id"]
-        metric = claim.get("metric", "").lower()
-        pillar = metric_map.get(metric, "E")
+        pillar = metric_map.pillar(claim.get("metric", ""))
         per_company.setdefault(cid, {"E":0,"S":0,"G":0})
-        per_company[cid][pillar]+=1
+        per_company[cid][pillar] = per_company[cid].get(pillar, 0) + 1
 
     fairness = []
     for cid, counts in per_company.items():
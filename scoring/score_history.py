@@ -0,0 +1,250 @@
+"""
+Score History – append-only, time-partitioned store of every company score tci_calc produces.
+
+Layout (under outputs/scores/history/):
+  partitions/YYYY/MM/YYYY-MM-DD.jsonl   raw points, one line per (company, scoring run), append-only
+  rollups/{company_id}.json             per-company daily / weekly / monthly buckets + running stats
+  index.json                            company -> timestamp of its latest point
+
+A point is appended only when a company's `updated_at` is newer than its latest recorded one, so
+recording the same companies_tci.json twice is a no-op. Each append also folds the point into the
+company's rollup buckets (n, sum, sum of squares, min, max, last per field; bucket key = start date of
+the day / ISO week / month) and its running stats (Welford mean/std, EWMA, rolling window of the last
+ROLLING_POINTS values), so downsampled range queries read one small rollup file and never the raw
+partitions. Raw point queries only open the daily partitions the company has points in.
+--rebuild re-derives rollups and index from the partitions (e.g. after an interrupted append).
+
+Usage:
+  python scoring/score_history.py --company tatapower --since 2y --freq W
+  python scoring/score_history.py --company tatapower --freq M --window 3 --field credibility_TCI
+  python scoring/score_history.py --rebuild
+"""
+
+import argparse, json, math, os, re
+from datetime import date, datetime, timedelta
+
+ROLLUP_FIELDS = ("TCI", "credibility_TCI")
+POINT_FIELDS = ("E", "S", "G", "TCI", "credibility_TCI")
+FREQS = ("D", "W", "M")
+ROLLING_POINTS = 30
+EWMA_ALPHA = 0.2
+
+def bucket_start(day, freq):
+    """Start date (ISO string) of the day / ISO week (Monday) / month bucket containing `day`."""
+    if freq == "W":
+        day = day - timedelta(days=day.weekday())
+    elif freq == "M":
+        day = day.replace(day=1)
+    return day.isoformat()
+
+def parse_since(since, now=None):
+    """'2y' / '6m' / '4w' / '30d' back from now, or an ISO date. Returns an ISO date string."""
+    now = now or datetime.utcnow()
+    m = re.fullmatch(r"(\d+)([dwmy])", since.strip().lower())
+    if not m:
+        return date.fromisoformat(since).isoformat()
+    n, unit = int(m.group(1)), m.group(2)
+    days = {"d": 1, "w": 7, "m": 30, "y": 365}[unit] * n
+    return (now - timedelta(days=days)).date().isoformat()
+
+def _new_bucket(value):
+    return [1, value, value * value, value, value, value]  # n, sum, sumsq, min, max, last
+
+def _fold_bucket(bucket, value):
+    bucket[0] += 1
+    bucket[1] += value
+    bucket[2] += value * value
+    bucket[3] = min(bucket[3], value)
+    bucket[4] = max(bucket[4], value)
+    bucket[5] = value
+
+def _fold_stats(stats, value):
+    """Welford mean/variance, EWMA and the rolling window, updated with one value."""
+    stats["n"] += 1
+    delta = value - stats["mean"]
+    stats["mean"] += delta / stats["n"]
+    stats["m2"] += delta * (value - stats["mean"])
+    stats["ewma"] = value if stats["n"] == 1 else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * stats["ewma"]
+    stats["window"] = (stats["window"] + [value])[-ROLLING_POINTS:]
+
+def _summary(stats):
+    window = stats["window"]
+    w_mean = sum(window) / len(window) if window else 0.0
+    w_var = sum((v - w_mean) ** 2 for v in window) / len(window) if window else 0.0
+    return {
+        "n": stats["n"],
+        "mean": round(stats["mean"], 4),
+        "std": round(math.sqrt(stats["m2"] / stats["n"]), 4) if stats["n"] else 0.0,
+        "ewma": round(stats["ewma"], 4),
+        f"rolling_mean_{ROLLING_POINTS}": round(w_mean, 4),
+        f"rolling_std_{ROLLING_POINTS}": round(math.sqrt(w_var), 4),
+    }
+
+class ScoreHistory:
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self.index = json.load(open(self.index_path)) if os.path.exists(self.index_path) else {}
+
+    def _partition_path(self, day):
+        return os.path.join(self.root, "partitions", day[:4], day[5:7], f"{day}.jsonl")
+
+    def _rollup_path(self, company_id):
+        return os.path.join(self.root, "rollups", f"{company_id}.json")
+
+    def load_rollup(self, company_id):
+        path = self._rollup_path(company_id)
+        if os.path.exists(path):
+            return json.load(open(path))
+        return self._empty_rollup(company_id)
+
+    @staticmethod
+    def _empty_rollup(company_id):
+        return {"company_id": company_id, "buckets": {f: {freq: {} for freq in FREQS} for f in ROLLUP_FIELDS},
+                "stats": {f: {"n": 0, "mean": 0.0, "m2": 0.0, "ewma": 0.0, "window": []} for f in ROLLUP_FIELDS}}
+
+    def _save_json(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _fold(self, rollup, point):
+        day = datetime.fromisoformat(point["ts"]).date()
+        for field in ROLLUP_FIELDS:
+            value = point.get(field)
+            if value is None:
+                continue
+            for freq in FREQS:
+                buckets = rollup["buckets"][field][freq]
+                key = bucket_start(day, freq)
+                if key in buckets:
+                    _fold_bucket(buckets[key], value)
+                else:
+                    buckets[key] = _new_bucket(value)
+            _fold_stats(rollup["stats"][field], value)
+
+    def append(self, entries):
+        """Records companies_tci.json entries newer than each company's latest point. Returns the count."""
+        points = []
+        for e in entries:
+            ts = e.get("updated_at")
+            if ts is None or ts <= self.index.get(e["company_id"], ""):
+                continue
+            points.append({"company_id": e["company_id"], "ts": ts, **{f: e[f] for f in POINT_FIELDS if f in e}})
+        if not points:
+            return 0
+        points.sort(key=lambda p: p["ts"])
+        by_day = {}
+        for p in points:
+            by_day.setdefault(p["ts"][:10], []).append(p)
+        for day, rows in by_day.items():
+            path = self._partition_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a") as f:
+                for p in rows:
+                    f.write(json.dumps(p) + "\n")
+        by_company = {}
+        for p in points:
+            by_company.setdefault(p["company_id"], []).append(p)
+        for cid, rows in by_company.items():
+            rollup = self.load_rollup(cid)
+            for p in rows:
+                self._fold(rollup, p)
+            self._save_json(self._rollup_path(cid), rollup)
+            self.index[cid] = rows[-1]["ts"]
+        self._save_json(self.index_path, self.index)
+        return len(points)
+
+    def points(self, company_id, start=None, end=None):
+        """Raw points of one company with start <= date <= end (ISO dates), oldest first."""
+        days = sorted(self.load_rollup(company_id)["buckets"][ROLLUP_FIELDS[0]]["D"])
+        out = []
+        for day in days:
+            if (start and day < start) or (end and day > end):
+                continue
+            with open(self._partition_path(day)) as f:
+                out.extend(p for p in map(json.loads, f) if p["company_id"] == company_id)
+        return out
+
+    def series(self, company_id, field="TCI", freq="D", start=None, end=None, window=0):
+        """
+        Downsampled series from the rollup buckets: [{date, n, mean, min, max, last}], plus
+        rolling_mean/rolling_std over the last `window` buckets when window > 0.
+        """
+        buckets = self.load_rollup(company_id)["buckets"][field][freq]
+        lo = bucket_start(date.fromisoformat(start), freq) if start else None
+        # buckets just before `start` still feed the first rolling windows
+        keys = [k for k in sorted(buckets) if end is None or k <= end]
+        out, ring = [], []
+        for k in keys:
+            n, s, sq, mn, mx, last = buckets[k]
+            if window:
+                ring = (ring + [(n, s, sq)])[-window:]
+            if lo is not None and k < lo:
+                continue
+            row = {"date": k, "n": n, "mean": round(s / n, 4), "min": mn, "max": mx, "last": last}
+            if window:
+                tn, ts, tsq = (sum(x) for x in zip(*ring))
+                mean = ts / tn
+                row["rolling_mean"] = round(mean, 4)
+                row["rolling_std"] = round(math.sqrt(max(tsq / tn - mean * mean, 0.0)), 4)
+            out.append(row)
+        return out
+
+    def stats(self, company_id, field="TCI"):
+        """All-time running stats of one company (no history scan)."""
+        return _summary(self.load_rollup(company_id)["stats"][field])
+
+    def rebuild(self):
+        """Re-derives rollups and index from the raw partitions."""
+        rollups, latest = {}, {}
+        part_root = os.path.join(self.root, "partitions")
+        paths = sorted(os.path.join(d, n) for d, _, names in os.walk(part_root) for n in names if n.endswith(".jsonl"))
+        for path in paths:
+            with open(path) as f:
+                for p in sorted(map(json.loads, f), key=lambda p: p["ts"]):
+                    cid = p["company_id"]
+                    if cid not in rollups:
+                        rollups[cid] = self._empty_rollup(cid)
+                    self._fold(rollups[cid], p)
+                    latest[cid] = p["ts"]
+        rollup_dir = os.path.join(self.root, "rollups")
+        if os.path.isdir(rollup_dir):
+            for name in os.listdir(rollup_dir):
+                os.remove(os.path.join(rollup_dir, name))
+        for cid, rollup in rollups.items():
+            self._save_json(self._rollup_path(cid), rollup)
+        self.index = latest
+        self._save_json(self.index_path, self.index)
+        return len(rollups)
+
+def open_score_history(scores_dir):
+    return ScoreHistory(os.path.join(scores_dir, "history"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scores_dir", default="outputs/scores")
+    parser.add_argument("--company", default=None, help="company to query")
+    parser.add_argument("--field", choices=ROLLUP_FIELDS, default="TCI")
+    parser.add_argument("--freq", choices=FREQS + ("raw",), default="D", help="bucket size, or raw points")
+    parser.add_argument("--since", default=None, help="e.g. 2y, 6m, 30d or an ISO date")
+    parser.add_argument("--until", default=None, help="ISO date")
+    parser.add_argument("--window", type=int, default=0, help="rolling mean/std over this many buckets")
+    parser.add_argument("--rebuild", action="store_true", help="re-derive rollups and index from the partitions")
+    args = parser.parse_args()
+    history = open_score_history(args.scores_dir)
+    if args.rebuild:
+        print(f"[✓] Rebuilt rollups for {history.rebuild()} companies")
+    elif args.company:
+        start = parse_since(args.since) if args.since else None
+        if args.freq == "raw":
+            result = history.points(args.company, start, args.until)
+        else:
+            result = {"company_id": args.company, "field": args.field, "freq": args.freq,
+                      "series": history.series(args.company, args.field, args.freq, start, args.until, args.window),
+                      "stats": history.stats(args.company, args.field)}
+        print(json.dumps(result, indent=2))
+    else:
+        print(json.dumps(history.index, indent=2))
@@ -1,56 +1,338 @@
 """
 TCI Calculator – aggregates claim verification results into per-pillar and total company scores.
+
+Claims and their verification scores are loaded once into columns (company code, pillar code,
+support, contradict); consistency, pillar means and the weighted TCI are then computed with
+group-by reductions (np.bincount) over all companies at once.
+
+Metric -> pillar comes from `metric_pillars` in mappings/metrics_map.json (unlisted metrics fall
+back to keyword rules, then `default_pillar`); pillar weights from `pillar_weights`, or --weights.
+
+Credibility weighting (README: TCI = Σ wᵢ·Cᵢ): every evidence item's support/contradict score is
+credited to its source, weighted by mappings/source_weights.json (per source_id, else per source
+type, else default). Per (company, pillar, source) support and contradict sums are cached in
+outputs/scores/source_aggregates.json; a pillar's credibility score is Σ w·support / Σ w·(support +
+contradict) over its sources, and `credibility_TCI` combines those with the pillar weights. Changing
+source weights only needs the cache (--reweight, no claims or verifications are read), and
+re-scoring a company only replaces that company's partials. Each company entry lists its per-source
+breakdown under `sources`. Every run also appends the scores to the score history store
+(scoring/score_history.py). Stage timings go to outputs/metrics/tci_calc.json (nlp/metrics.py).
+
+Usage:
+  python scoring/tci_calc.py
+  python scoring/tci_calc.py --weights E=0.5,S=0.25,G=0.25
+  python scoring/tci_calc.py --reweight      # after editing mappings/source_weights.json
 """
 
-import json, os, glob
+import argparse, json, os, glob, sys
 import numpy as np
 from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import open_claim_store
+from nlp.metrics import Metrics, add_metrics_args, metrics_from_args, write_metrics
+from scoring.score_history import open_score_history
+
+DEFAULT_PILLAR_WEIGHTS = {"E": 0.4, "S": 0.3, "G": 0.3}
+DEFAULT_PILLAR = "E"
+# keyword rules for metrics not listed in metric_pillars (first match wins)
+FALLBACK_PILLAR_KEYWORDS = [
+    ("emission", "E"), ("renewable", "E"), ("energy", "E"), ("water", "E"), ("waste", "E"), ("carbon", "E"),
+    ("diversity", "S"), ("safety", "S"), ("employee", "S"), ("community", "S"), ("csr", "S"), ("skill", "S"),
+    ("audit", "G"), ("board", "G"), ("governance", "G"), ("ethics", "G"), ("compliance", "G"),
+]
+
+DEFAULT_SOURCE_WEIGHTS_PATH = "mappings/source_weights.json"
+AGGREGATES_NAME = "source_aggregates.json"
+AGGREGATES_FORMAT = "esg-source-aggregates"
+
+class SourceWeights:
+    """Credibility weight of an evidence source: per source_id, else per source type, else default."""
+
+    def __init__(self, sources=None, source_types=None, default=1.0):
+        self.sources = sources or {}
+        self.source_types = source_types or {}
+        self.default = default
+
+    def weight(self, source_id, source_type):
+        if source_id in self.sources:
+            return self.sources[source_id]
+        return self.source_types.get(source_type, self.default)
+
+def load_source_weights(path=DEFAULT_SOURCE_WEIGHTS_PATH):
+    if not os.path.exists(path):
+        return SourceWeights()
+    with open(path) as f:
+        table = json.load(f)
+    return SourceWeights(table.get("sources"), table.get("source_types"), table.get("default", 1.0))
+
+class SourceAggregates:
+    """
+    Cached per-(company, pillar, source) evidence partials: company -> {(pillar, source_id): [source_type,
+    support_sum, contradict_sum, n_evidence]}.
+    """
+
+    def __init__(self, companies=None):
+        self.companies = companies or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("format") != AGGREGATES_FORMAT:
+            raise ValueError(f"{path} is not a source aggregates cache")
+        return cls({cid: {(r[0], r[1]): r[2:] for r in rows} for cid, rows in data["companies"].items()})
+
+    def save(self, path):
+        data = {"format": AGGREGATES_FORMAT, "version": 1,
+                "companies": {cid: [[p, sid, *v] for (p, sid), v in parts.items()] for cid, parts in self.companies.items()}}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def replace(self, partials, companies):
+        """Replaces the partials of `companies` (companies missing from `partials` are dropped)."""
+        for cid in companies:
+            if partials.get(cid):
+                self.companies[cid] = partials[cid]
+            else:
+                self.companies.pop(cid, None)
+
+    def drop(self, companies):
+        for cid in companies:
+            self.companies.pop(cid, None)
+
+    def credibility(self, company_id, source_weights, pillar_weights):
+        """Credibility-weighted pillar scores, credibility_TCI and the per-source breakdown for one company."""
+        num = dict.fromkeys(pillar_weights, 0.0)
+        den = dict.fromkeys(pillar_weights, 0.0)
+        sources = {}
+        for (pillar, sid), (stype, sup, con, n) in self.companies.get(company_id, {}).items():
+            w = source_weights.weight(sid, stype)
+            if pillar in num:
+                num[pillar] += w * sup
+                den[pillar] += w * (sup + con)
+            src = sources.setdefault(sid, {"source_id": sid, "source_type": stype, "weight": w,
+                                           "support": 0.0, "contradict": 0.0, "n_evidence": 0})
+            src["support"] += sup
+            src["contradict"] += con
+            src["n_evidence"] += n
+        pillars = {p: round(num[p] / den[p], 3) if den[p] > 0 else 0.0 for p in pillar_weights}
+        for src in sources.values():
+            src["support"], src["contradict"] = round(src["support"], 3), round(src["contradict"], 3)
+        return {
+            "credibility": pillars,
+            "credibility_TCI": round(sum(w * pillars[p] for p, w in pillar_weights.items()), 3),
+            "sources": sorted(sources.values(), key=lambda s: (-s["weight"] * (s["support"] + s["contradict"]), str(s["source_id"]))),
+        }
+
+class MetricMapping(dict):
+    """metric -> pillar, with keyword fallback and a default pillar for anything else."""
+
+    def __init__(self, metric_pillars, default_pillar=DEFAULT_PILLAR):
+        super().__init__(metric_pillars)
+        self.default_pillar = default_pillar
+
+    def pillar(self, metric):
+        metric = (metric or "").lower()
+        if metric in self:
+            return self[metric]
+        for keyword, pillar in FALLBACK_PILLAR_KEYWORDS:
+            if keyword in metric:
+                return pillar
+        return self.default_pillar
 
 # Helper: load mapping metric→pillar
 def load_metric_mapping(path="mappings/metrics_map.json"):
     if not os.path.exists(path):
-        # fallback simple map
-        return {"emissions": "E", "renewable": "E", "diversity": "S", "audit": "G"}
+        return MetricMapping({})
     with open(path) as f:
-        return json.load(f)
+        mappings = json.load(f)
+    return MetricMapping({k.lower(): v for k, v in mappings.get("metric_pillars", {}).items()},
+                         mappings.get("default_pillar", DEFAULT_PILLAR))
 
-def aggregate_company_scores(claims_dir, verif_dir, out_dir):
-    os.makedirs(out_dir, exist_ok=True)
-    metric_map = load_metric_mapping()
-    company_scores = {}
-
-    for claim_path in glob.glob(os.path.join(claims_dir, "*.json")):
-        claim = json.load(open(claim_path))
-        cid = claim["company_id"]
-        metric = claim.get("metric", "").lower()
-        pillar = metric_map.get(metric, "E")
+def load_pillar_weights(path="mappings/metrics_map.json", override=None):
+    """Pillar -> weight from `pillar_weights` (or the defaults), overridden by 'E=0.5,S=0.25,G=0.25'."""
+    weights = dict(DEFAULT_PILLAR_WEIGHTS)
+    if os.path.exists(path):
+        with open(path) as f:
+            weights = dict(json.load(f).get("pillar_weights", weights))
+    if override:
+        weights = {}
+        for part in override.split(","):
+            pillar, w = part.split("=")
+            weights[pillar.strip()] = float(w)
+    return weights
 
+def iter_verified(claims, verif_dir):
+    """(claim, verification or None) pairs, reading each claim's verification file once."""
+    for claim in claims:
         verif_path = os.path.join(verif_dir, f"{claim['claim_id']}_evidence.json")
         if not os.path.exists(verif_path):
+            yield claim, None
             continue
-        verif = json.load(open(verif_path))
-        support = verif.get("support_score", 0.0)
-        contradict = verif.get("contradict_score", 0.0)
-        consistency = support * (1 - contradict)
+        with open(verif_path) as f:
+            yield claim, json.load(f)
+
+def load_score_columns(claims, verif_dir, metric_map, pillars):
+    return build_score_columns(iter_verified(claims, verif_dir), metric_map, pillars)
+
+def build_score_columns(pairs, metric_map, pillars):
+    """
+    One pass over (claim, verification) pairs into columns. Claims without a verification result
+    are skipped.
+    """
+    pillar_code = {p: i for i, p in enumerate(pillars)}
+    metric_code = {}  # metric -> pillar code, resolved once per distinct metric
+    companies, company_code = [], {}
+    comp_col, pillar_col, support_col, contradict_col = [], [], [], []
+    seen, partials = set(), {}  # partials: company -> {(pillar, source_id): [source_type, support, contradict, n]}
+
+    for claim, verif in pairs:
+        seen.add(claim["company_id"])
+        if verif is None:
+            continue
+        cid = claim["company_id"]
+        if cid not in company_code:
+            company_code[cid] = len(companies)
+            companies.append(cid)
+        metric = claim.get("metric", "")
+        if metric not in metric_code:
+            pillar = metric_map.pillar(metric)
+            metric_code[metric] = pillar_code.get(pillar, pillar_code.get(metric_map.default_pillar, 0))
+        comp_col.append(company_code[cid])
+        pillar_col.append(metric_code[metric])
+        support_col.append(verif.get("support_score", 0.0))
+        contradict_col.append(verif.get("contradict_score", 0.0))
+        parts = partials.setdefault(cid, {})
+        for ev in verif.get("top_evidence", []):
+            if ev.get("label") not in ("support", "contradict"):
+                continue
+            sid = ev.get("source_id") or ev.get("snippet_id")
+            part = parts.setdefault((pillars[metric_code[metric]], sid), [ev.get("source_type"), 0.0, 0.0, 0])
+            part[1 if ev["label"] == "support" else 2] += ev.get("score", 0.0)
+            part[3] += 1
 
-        company_scores.setdefault(cid, {"E": [], "S": [], "G": []})
-        company_scores[cid][pillar].append(consistency)
+    return {
+        "companies": companies,
+        "company": np.asarray(comp_col, dtype=np.int64),
+        "pillar": np.asarray(pillar_col, dtype=np.int64),
+        "support": np.asarray(support_col, dtype=np.float64),
+        "contradict": np.asarray(contradict_col, dtype=np.float64),
+        "seen_companies": seen,
+        "evidence": partials,
+    }
 
+def score_columns(cols, weights):
+    """
+    Group-by reductions over the columns: consistency = support * (1 - contradict) per claim, mean per
+    (company, pillar), TCI = weighted sum of the rounded pillar means. Returns (subscores, tci) arrays
+    of shape (n_companies, n_pillars) and (n_companies,).
+    """
+    n_comp, n_pillars = len(cols["companies"]), len(weights)
+    consistency = cols["support"] * (1 - cols["contradict"])
+    key = cols["company"] * n_pillars + cols["pillar"]
+    sums = np.bincount(key, weights=consistency, minlength=n_comp * n_pillars).reshape(n_comp, n_pillars)
+    counts = np.bincount(key, minlength=n_comp * n_pillars).reshape(n_comp, n_pillars)
+    means = np.divide(sums, counts, out=np.zeros(sums.shape), where=counts > 0)
+    subscores = np.round(means, 3)
+    tci = np.zeros(n_comp)
+    for p, w in enumerate(weights.values()):
+        tci = tci + w * subscores[:, p]
+    return subscores, np.round(tci, 3)
+
+def score_companies(claims, verif_dir, metric_map, weights=None, source_weights=None, aggregates=None):
+    """
+    Per-company pillar scores, TCI and credibility-weighted scores for an iterable of claims (all claims
+    of each company). The source partials of the scanned companies replace theirs in `aggregates`.
+    """
+    return score_verified(iter_verified(claims, verif_dir), metric_map, weights, source_weights, aggregates)
+
+def score_verified(pairs, metric_map, weights=None, source_weights=None, aggregates=None, updated_at=None):
+    """score_companies over in-memory (claim, verification) pairs, stamped with updated_at (default now)."""
+    weights = weights or DEFAULT_PILLAR_WEIGHTS
+    source_weights = source_weights or SourceWeights()
+    aggregates = aggregates if aggregates is not None else SourceAggregates()
+    pillars = list(weights)
+    cols = build_score_columns(pairs, metric_map, pillars)
+    subscores, tci = score_columns(cols, weights)
+    aggregates.replace(cols["evidence"], cols["seen_companies"])
+    updated_at = updated_at or datetime.utcnow().isoformat()
     results = []
-    for cid, pillars in company_scores.items():
-        subscores = {p: round(np.mean(v), 3) if v else 0.0 for p, v in pillars.items()}
-        TCI = round(0.4 * subscores["E"] + 0.3 * subscores["S"] + 0.3 * subscores["G"], 3)
+    for i, cid in enumerate(cols["companies"]):
         results.append({
             "company_id": cid,
-            **subscores,
-            "TCI": TCI,
-            "updated_at": datetime.utcnow().isoformat()
+            **{p: float(subscores[i, j]) for j, p in enumerate(pillars)},
+            "TCI": float(tci[i]),
+            **aggregates.credibility(cid, source_weights, weights),
+            "updated_at": updated_at
         })
+    return results
+
+def reweight_scores(results, aggregates, source_weights, weights):
+    """Recomputes the credibility fields of existing results from the cached partials only."""
+    updated_at = datetime.utcnow().isoformat()
+    for entry in results:
+        entry.update(aggregates.credibility(entry["company_id"], source_weights, weights), updated_at=updated_at)
+    return results
+
+def aggregate_company_scores(claims_dir, verif_dir, out_dir, mappings_path="mappings/metrics_map.json", weights=None,
+                             source_weights_path=DEFAULT_SOURCE_WEIGHTS_PATH, metrics=None):
+    metrics = metrics or Metrics("tci_calc")
+    os.makedirs(out_dir, exist_ok=True)
+    metric_map = load_metric_mapping(mappings_path)
+    weights = weights or load_pillar_weights(mappings_path)
+    aggregates = SourceAggregates()
+    with metrics.stage("score") as st:
+        results = score_companies(open_claim_store(claims_dir).iter_claims(), verif_dir, metric_map, weights,
+                                  load_source_weights(source_weights_path), aggregates)
+        st.items = len(results)
 
     out_path = os.path.join(out_dir, "companies_tci.json")
-    json.dump(results, open(out_path, "w"), indent=2)
+    with metrics.stage("save", items=len(results)):
+        json.dump(results, open(out_path, "w"), indent=2)
+        aggregates.save(os.path.join(out_dir, AGGREGATES_NAME))
+        appended = open_score_history(out_dir).append(results)
+    metrics.count("companies_scored", len(results))
+    metrics.count("history_points_appended", appended)
     print(f"[✓] Saved {out_path}")
     return results
 
+def reweight_company_scores(out_dir, mappings_path="mappings/metrics_map.json", weights=None,
+                            source_weights_path=DEFAULT_SOURCE_WEIGHTS_PATH, metrics=None):
+    """Applies new source (or pillar) weights to companies_tci.json using the cached partials."""
+    metrics = metrics or Metrics("tci_calc")
+    out_path = os.path.join(out_dir, "companies_tci.json")
+    results = json.load(open(out_path))
+    with metrics.stage("reweight", items=len(results)):
+        aggregates = SourceAggregates.load(os.path.join(out_dir, AGGREGATES_NAME))
+        reweight_scores(results, aggregates, load_source_weights(source_weights_path), weights or load_pillar_weights(mappings_path))
+    with metrics.stage("save", items=len(results)):
+        json.dump(results, open(out_path, "w"), indent=2)
+        appended = open_score_history(out_dir).append(results)
+    metrics.count("companies_reweighted", len(results))
+    metrics.count("history_points_appended", appended)
+    print(f"[✓] Re-weighted {len(results)} companies in {out_path}")
+    return results
+
 if __name__ == "__main__":
-    aggregate_company_scores("claims", "verification", "outputs/scores")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--claims_dir", default="claims")
+    parser.add_argument("--verification_dir", default="verification")
+    parser.add_argument("--out_dir", default="outputs/scores")
+    parser.add_argument("--mappings", default="mappings/metrics_map.json")
+    parser.add_argument("--weights", default=None, help="pillar weights, e.g. E=0.4,S=0.3,G=0.3 (default: pillar_weights)")
+    parser.add_argument("--source_weights", default=DEFAULT_SOURCE_WEIGHTS_PATH, help="source credibility weight table")
+    parser.add_argument("--reweight", action="store_true", help="only re-apply weights from the cached source partials")
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args("tci_calc", args)
+    if args.reweight:
+        reweight_company_scores(args.out_dir, args.mappings, load_pillar_weights(args.mappings, args.weights), args.source_weights,
+                                metrics)
+    else:
+        aggregate_company_scores(args.claims_dir, args.verification_dir, args.out_dir, args.mappings,
+                                 load_pillar_weights(args.mappings, args.weights), args.source_weights, metrics)
+    write_metrics(metrics, args)
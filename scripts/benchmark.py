@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+scripts/benchmark.py
+
+Scale benchmark: generates a synthetic corpus per size (scripts/synth_corpus.py) and runs extraction,
+verification, graph build and scoring on it, each stage as its own process so peak RSS is per stage.
+Throughput and memory come from the per-script metrics files (nlp/metrics.py); the process wall time
+(including interpreter start-up and imports) is recorded alongside.
+
+Reads: mappings/metrics_map.json
+Writes: outputs/bench/<size>/ (corpus, claims, verification, graph, scores, metrics/<stage>.json)
+        outputs/bench/results.json
+
+Sizes are snippet counts (1k, 100k, 1M, ...); companies default to one per 100 snippets. A corpus is
+only regenerated when its size, company count or seed changed. --baseline compares items/sec and peak
+RSS per (size, stage) with a saved results file and exits with status 1 when any stage is slower or
+larger than --tolerance allows; --save_baseline stores this run as the new baseline.
+
+Usage:
+  python scripts/benchmark.py --sizes 1k
+  python scripts/benchmark.py --sizes 1k,100k,1M --save_baseline outputs/bench/baseline.json
+  python scripts/benchmark.py --sizes 1k,100k --baseline outputs/bench/baseline.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))  # repo root, for `scripts.*` when run as a script
+from scripts.synth_corpus import write_corpus
+
+STAGES = ["extract", "verify", "graph", "score"]
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text):
+    """'1k' -> 1000, '2.5M' -> 2500000, '500' -> 500."""
+    text = text.strip().lower()
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def stage_command(stage, work, args):
+    """Script invocation for one stage; every output goes under the size's work dir."""
+    py = sys.executable
+    snippets = str(work / "snippets.jsonl")
+    if stage == "extract":
+        return [py, "nlp/claim_extractor.py", "--snippets", snippets, "--mappings", args.mappings,
+                "--out_dir", str(work / "claims"), "--batch_size", str(args.batch_size), "--n_process", str(args.n_process)]
+    if stage == "verify":
+        return [py, "nlp/embed_matcher_tfidf.py", "--claims_dir", str(work / "claims"), "--snippets", snippets,
+                "--index_dir", str(work / "evidence_index"), "--out_dir", str(work / "verification"),
+                "--mappings", args.mappings]
+    if stage == "graph":
+        return [py, "nlp/build_graph.py", "--claims_dir", str(work / "claims"), "--verification_dir",
+                str(work / "verification"), "--snippets", snippets, "--out_dir", str(work / "graph"),
+                "--store", str(work / "graph_store.json"), "--rebuild"]
+    return [py, "scoring/tci_calc.py", "--claims_dir", str(work / "claims"), "--verification_dir",
+            str(work / "verification"), "--out_dir", str(work / "scores"), "--mappings", args.mappings]
+
+
+# outputs a stage rewrites; removed first so every run measures a cold build
+STAGE_OUTPUTS = {"extract": ["claims"], "verify": ["evidence_index", "verification"],
+                 "graph": ["graph", "graph_store.json"], "score": ["scores"]}
+
+
+def prepare_corpus(work, n_snippets, n_companies, args):
+    params = {"snippets": n_snippets, "companies": n_companies, "seed": args.seed}
+    params_path = work / "corpus.json"
+    if (work / "snippets.jsonl").exists() and params_path.exists() and json.load(open(params_path)) == params:
+        return params
+    work.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    counts = write_corpus(work / "snippets.jsonl", n_companies, n_snippets, args.mappings,
+                          work / "snippets.truth.jsonl", args.seed)
+    print(f"Corpus: {n_snippets} snippets, {n_companies} companies in {time.perf_counter() - t0:.1f}s {counts}")
+    with open(params_path, "w") as f:
+        json.dump(params, f)
+    return params
+
+
+def run_stage(stage, work, args):
+    for name in STAGE_OUTPUTS[stage]:
+        path = work / name
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+    metrics_path = work / "metrics" / f"{stage}.json"
+    cmd = stage_command(stage, work, args) + ["--metrics_out", str(metrics_path)]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        print(proc.stdout[-4000:])
+        raise RuntimeError(f"stage {stage} failed ({' '.join(cmd)})")
+    metrics = json.load(open(metrics_path))
+    return wall, metrics
+
+
+def stage_items(stage, metrics, corpus):
+    """Headline item count per stage: snippets for extraction, claims for the rest."""
+    if stage == "extract":
+        return corpus["snippets"]
+    for st in metrics["stages"]:
+        if st["stage"] in ("verify", "sync", "score"):
+            return st["items"]
+    return None
+
+
+def run_size(size, args):
+    n_snippets = parse_size(size)
+    n_companies = args.companies or max(5, n_snippets // 100)
+    work = Path(args.work_dir).resolve() / size  # stages run with cwd = repo root
+    corpus = prepare_corpus(work, n_snippets, n_companies, args)
+    results = {}
+    for stage in args.stages:
+        process_wall, metrics = run_stage(stage, work, args)
+        # the script's own run time; interpreter start-up and imports are only in process_seconds
+        wall = metrics["wall_seconds"]
+        items = stage_items(stage, metrics, corpus)
+        results[stage] = {
+            "wall_seconds": wall,
+            "process_seconds": round(process_wall, 3),
+            "items": items,
+            "items_per_sec": round(items / wall, 2) if items and wall > 0 else None,
+            "peak_rss_mb": metrics["peak_rss_mb"],
+            "stages": {st["stage"]: st["wall_seconds"] for st in metrics["stages"]},
+            "counters": metrics["counters"],
+        }
+        r = results[stage]
+        print(f"[{size}] {stage:8s} {wall:8.2f}s  {items or 0:>9} items  "
+              f"{r['items_per_sec'] or 0:>10,.0f}/s  peak RSS {r['peak_rss_mb'] or 0:,.0f} MB")
+    return {"corpus": corpus, "stages": results}
+
+
+def compare(current, baseline, tolerance):
+    """Regressions of current vs baseline results: slower items/sec or larger peak RSS than tolerance."""
+    regressions = []
+    for size, res in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if base is None or base["corpus"] != res["corpus"]:
+            print(f"[{size}] no comparable baseline")
+            continue
+        for stage, r in res["stages"].items():
+            b = base["stages"].get(stage)
+            if b is None:
+                continue
+            line = f"[{size}] {stage:8s}"
+            if r["items_per_sec"] and b["items_per_sec"]:
+                ratio = r["items_per_sec"] / b["items_per_sec"]
+                line += f"  throughput x{ratio:.2f}"
+                if ratio < 1 - tolerance:
+                    regressions.append(f"{size}/{stage}: {r['items_per_sec']:,.0f}/s vs {b['items_per_sec']:,.0f}/s")
+            if r["peak_rss_mb"] and b["peak_rss_mb"]:
+                ratio = r["peak_rss_mb"] / b["peak_rss_mb"]
+                line += f"  peak RSS x{ratio:.2f}"
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{size}/{stage}: peak RSS {r['peak_rss_mb']:,.0f} MB vs {b['peak_rss_mb']:,.0f} MB")
+            print(line)
+    return regressions
+
+
+def main(args):
+    args.stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    args.mappings = str(Path(args.mappings).resolve())
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown --stages {sorted(unknown)}; choose from {STAGES}")
+    current = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": {},
+    }
+    for size in [s.strip() for s in args.sizes.split(",") if s.strip()]:
+        current["results"][size] = run_size(size, args)
+
+    out_path = Path(args.work_dir) / "results.json"
+    with open(out_path, "w") as f:
+        json.dump(current, f, indent=2)
+    print("Results ->", out_path)
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(out_path, args.save_baseline)
+        print("Baseline saved ->", args.save_baseline)
+    if args.baseline:
+        regressions = compare(current, json.load(open(args.baseline)), args.tolerance)
+        if regressions:
+            print("Regressions beyond", f"{args.tolerance:.0%}:")
+            for r in regressions:
+                print("  " + r)
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1k", help="comma-separated snippet counts, e.g. 1k,100k,1M")
+    parser.add_argument("--companies", type=int, default=0, help="companies per corpus (default: snippets / 100)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--work_dir", default="outputs/bench")
+    parser.add_argument("--mappings", default="mappings/metrics_map.json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch_size", type=int, default=256, help="spaCy batch size for extraction")
+    parser.add_argument("--n_process", type=int, default=1, help="spaCy worker processes for extraction")
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--save_baseline", default=None, help="also copy this run's results here")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop / RSS growth")
+    args = parser.parse_args()
+    main(args)
@@ -5,17 +5,20 @@ Usage:
   python scripts/check_sample_claim.py
 """
 import json
+import sys
 from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import open_claim_store
 claims_dir = Path("claims")
 ver_dir = Path("verification")
 
-claim_files = sorted(list(claims_dir.glob("*.json")))
-print("Number of claim files:", len(claim_files))
-if not claim_files:
+store = open_claim_store(claims_dir)
+print("Number of claims:", len(store))
+sample = next(iter(store), None)
+if sample is None:
     print("No claims found.")
     exit(0)
 
-sample = json.load(open(claim_files[0], "r", encoding="utf-8"))
 print("\nSample claim_id:", sample.get("claim_id"))
 print("Company:", sample.get("company_id"))
 print("Metric:", sample.get("metric"))
@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
 import json
+import sys
 from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # repo root, for `nlp.*` when run as a script
+from nlp.claim_store import open_claim_store
 claims_dir = Path("claims")
 ver_dir = Path("verification")
-out = []
-for cf in sorted(claims_dir.glob("*.json")):
-    c = json.load(open(cf,"r",encoding="utf-8"))
-    claim_id = c.get("claim_id")
-    ver_file = ver_dir / f"{claim_id}_evidence.json"
-    ver = json.load(open(ver_file,"r",encoding="utf-8")) if ver_file.exists() else {}
-    out.append({
-        "claim_id": claim_id,
+
+def load_verification(ver_dir, claim_id):
+    ver_file = Path(ver_dir) / f"{claim_id}_evidence.json"
+    return json.load(open(ver_file,"r",encoding="utf-8")) if ver_file.exists() else {}
+
+def claim_index_entry(c, ver):
+    return {
+        "claim_id": c.get("claim_id"),
         "company_id": c.get("company_id"),
         "metric": c.get("metric"),
         "numeric_value": c.get("numeric_value"),
@@ -20,7 +23,12 @@ for cf in sorted(claims_dir.glob("*.json")):
         "support_score": ver.get("support_score"),
         "contradict_score": ver.get("contradict_score"),
         "top_evidence_count": len(ver.get("top_evidence", []))
-    })
-with open("claims_index.json","w",encoding="utf-8") as fw:
-    json.dump(out, fw, indent=2, ensure_ascii=False)
-print("Wrote claims_index.json with", len(out), "records.")
+    }
+
+if __name__ == "__main__":
+    out = []
+    for c in open_claim_store(claims_dir).iter_claims():
+        out.append(claim_index_entry(c, load_verification(ver_dir, c.get("claim_id"))))
+    with open("claims_index.json","w",encoding="utf-8") as fw:
+        json.dump(out, fw, indent=2, ensure_ascii=False)
+    print("Wrote claims_index.json with", len(out), "records.")
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+scripts/query_api.py
+
+Read-only HTTP query service for the frontend over the pipeline's output files. Everything is loaded
+into in-memory indexes at startup (claims by id / company / metric / verdict, company scores with
+fairness and verdict counts, timelines), so a request is a dict lookup plus a slice. Verification
+evidence, explanations and company graphs are read from disk on first request.
+
+Reads: claims_index.json, outputs/scores/{companies_tci,fairness_meter,timeline_*}.json,
+       graph/{company}_graph.json, verification/{claim_id}_evidence.json,
+       explain/explanations/{claim_id}.json, outputs/pipeline_manifest.json (change detection only)
+
+Endpoints (GET, JSON):
+  /health                                  generation, load time, record counts
+  /companies?sort=tci|credibility_tci|company_id|n_claims&order=asc|desc&offset=&limit=
+  /companies/{id}                          scores, fairness, verdict counts
+  /companies/{id}/claims?metric=&verdict=&offset=&limit=
+  /companies/{id}/timeline
+  /companies/{id}/graph
+  /claims?company=&metric=&verdict=&offset=&limit=
+  /claims/{claim_id}                       index entry + verification record + explanation
+  /metrics                                 metric -> claim and verdict counts
+  /metrics/{metric}/claims?verdict=&offset=&limit=
+  /fairness
+  /stats                                   request / cache counters of this process
+List responses are {"total", "offset", "limit", "next_offset", "items"} (limit <= --max_limit).
+
+Every response carries an ETag (artifact generation + body hash) and `Cache-Control: no-cache`;
+If-None-Match answers 304 without a body. Encoded responses are kept in an LRU cache (--cache_size)
+keyed by the artifact generation: a watcher thread stats the artifacts every --reload_interval seconds
+and, once a pipeline run has finished writing them (same fingerprint on two polls), loads a new index,
+swaps it in and drops the cache. A reload that fails (e.g. a file caught mid-write) keeps the old index.
+
+`bench` replays a mix of list/detail requests against a running server over keep-alive connections
+and reports requests/sec and latency percentiles.
+
+Usage:
+  python scripts/query_api.py serve --port 8020
+  python scripts/query_api.py bench --url http://127.0.0.1:8020 --concurrency 16 --duration 10
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_LIMIT = 50
+SORT_FIELDS = {"tci": "TCI", "credibility_tci": "credibility_TCI", "company_id": "company_id", "n_claims": "n_claims"}
+VERDICTS = ["supported", "contradicted", "insufficient"]
+CLAIM_ID_RE = re.compile(r"^[\w.\-]+$")  # ids become file names
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def read_json(path, default=None):
+    path = Path(path)
+    if not path.exists():
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def encode(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def verdict_counts(claims):
+    counts = {v: 0 for v in VERDICTS}
+    for c in claims:
+        verdict = c.get("final_verdict") or "insufficient"
+        counts[verdict] = counts.get(verdict, 0) + 1
+    return counts
+
+
+def artifact_fingerprint(args):
+    """Hash of (name, mtime, size) of every artifact the index is built from."""
+    entries = []
+    for path in (args.claims_index, args.manifest):
+        try:
+            st = os.stat(path)
+            entries.append((str(path), st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            entries.append((str(path), None, None))
+    for directory in (args.scores_dir, args.graph_dir):
+        try:
+            with os.scandir(directory) as it:
+                for e in it:
+                    if e.name.endswith(".json") and e.is_file():
+                        st = e.stat()
+                        entries.append((e.path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            pass
+    entries.sort(key=lambda e: e[0])
+    return hashlib.sha1(json.dumps(entries).encode("utf-8")).hexdigest()[:16]
+
+
+class QueryIndex:
+    """In-memory indexes over one generation of pipeline artifacts."""
+
+    def __init__(self, args, generation):
+        self.args = args
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.claims = read_json(args.claims_index, [])
+        self.claims_by_id = {c["claim_id"]: c for c in self.claims}
+        self.by_company, self.by_metric, self.by_verdict = {}, {}, {}
+        for c in self.claims:
+            self.by_company.setdefault(c.get("company_id"), []).append(c)
+            self.by_metric.setdefault(c.get("metric"), []).append(c)
+            self.by_verdict.setdefault(c.get("final_verdict"), []).append(c)
+
+        scores_dir = Path(args.scores_dir)
+        scores = {e["company_id"]: e for e in read_json(scores_dir / "companies_tci.json", [])}
+        fairness = {e["company_id"]: e for e in read_json(scores_dir / "fairness_meter.json", [])}
+        self.fairness = list(fairness.values())
+        self.timelines = {}
+        for path in scores_dir.glob("timeline_*.json"):
+            self.timelines[path.stem[len("timeline_"):]] = read_json(path, [])
+        self.graph_paths = {p.name[:-len("_graph.json")]: p for p in Path(args.graph_dir).glob("*_graph.json")}
+
+        self.companies = {}
+        for cid in sorted(set(scores) | {c for c in self.by_company if c}):
+            claims = self.by_company.get(cid, [])
+            self.companies[cid] = {"company_id": cid, **scores.get(cid, {}), "n_claims": len(claims),
+                                   "verdicts": verdict_counts(claims), "fairness": fairness.get(cid)}
+        # company listings are presorted per sort field and direction; companies without the field go last
+        self.company_order = {}
+        for key, field in SORT_FIELDS.items():
+            present = sorted((c for c in self.companies.values() if c.get(field) is not None),
+                             key=lambda c: (c[field], c["company_id"]))
+            missing = [c for c in self.companies.values() if c.get(field) is None]
+            self.company_order[key] = {"asc": present + missing, "desc": present[::-1] + missing}
+        self.metrics = {}
+        for metric, claims in self.by_metric.items():
+            self.metrics[metric] = {"metric": metric, "n_claims": len(claims), "verdicts": verdict_counts(claims),
+                                    "companies": len({c.get("company_id") for c in claims})}
+
+    def counts(self):
+        return {"claims": len(self.claims), "companies": len(self.companies), "metrics": len(self.metrics),
+                "graphs": len(self.graph_paths), "timelines": len(self.timelines)}
+
+    def filter_claims(self, company=None, metric=None, verdict=None):
+        """Claims matching every given filter, starting from the smallest matching index list."""
+        lists = []
+        if company is not None:
+            lists.append(self.by_company.get(company, []))
+        if metric is not None:
+            lists.append(self.by_metric.get(metric, []))
+        if verdict is not None:
+            lists.append(self.by_verdict.get(verdict, []))
+        if not lists:
+            return self.claims
+        base = min(lists, key=len)
+        return [c for c in base
+                if (company is None or c.get("company_id") == company)
+                and (metric is None or c.get("metric") == metric)
+                and (verdict is None or c.get("final_verdict") == verdict)]
+
+    def company(self, cid):
+        company = self.companies.get(cid)
+        if company is None:
+            raise ApiError(404, f"unknown company {cid!r}")
+        return company
+
+    def claim_detail(self, claim_id):
+        claim = self.claims_by_id.get(claim_id) if CLAIM_ID_RE.match(claim_id) else None
+        if claim is None:
+            raise ApiError(404, f"unknown claim {claim_id!r}")
+        return {**claim,
+                "verification": read_json(Path(self.args.verification_dir) / f"{claim_id}_evidence.json"),
+                "explanation": read_json(Path(self.args.explain_dir) / f"{claim_id}.json")}
+
+
+def page(items, params, max_limit):
+    try:
+        offset = max(0, int(params.get("offset", 0)))
+        limit = min(max_limit, max(1, int(params.get("limit", DEFAULT_LIMIT))))
+    except ValueError:
+        raise ApiError(400, "offset and limit must be integers")
+    window = items[offset:offset + limit]
+    return {"total": len(items), "offset": offset, "limit": limit,
+            "next_offset": offset + limit if offset + limit < len(items) else None, "items": window}
+
+
+def route(index, path, params, max_limit):
+    """Payload (dict/list) or raw JSON bytes for one GET request."""
+    parts = [p for p in path.split("/") if p]
+    if parts == ["health"]:
+        return {"status": "ok", "generation": index.generation, "loaded_at": index.loaded_at, "counts": index.counts()}
+    if parts == ["companies"]:
+        sort = params.get("sort", "tci")
+        order = params.get("order", "asc" if sort == "company_id" else "desc")
+        if sort not in SORT_FIELDS or order not in ("asc", "desc"):
+            raise ApiError(400, f"sort must be one of {sorted(SORT_FIELDS)} and order asc or desc")
+        return page(index.company_order[sort][order], params, max_limit)
+    if len(parts) >= 2 and parts[0] == "companies":
+        cid = parts[1]
+        company = index.company(cid)
+        if len(parts) == 2:
+            return company
+        if parts[2:] == ["claims"]:
+            return page(index.filter_claims(cid, params.get("metric"), params.get("verdict")), params, max_limit)
+        if parts[2:] == ["timeline"]:
+            return {"company_id": cid, "points": index.timelines.get(cid, [])}
+        if parts[2:] == ["graph"]:
+            graph_path = index.graph_paths.get(cid)
+            if graph_path is None:
+                raise ApiError(404, f"no graph for company {cid!r}")
+            return graph_path.read_bytes()  # already JSON
+    if parts == ["claims"]:
+        return page(index.filter_claims(params.get("company"), params.get("metric"), params.get("verdict")),
+                    params, max_limit)
+    if len(parts) == 2 and parts[0] == "claims":
+        return index.claim_detail(parts[1])
+    if parts == ["metrics"]:
+        return sorted(index.metrics.values(), key=lambda m: (-m["n_claims"], str(m["metric"])))
+    if len(parts) == 3 and parts[0] == "metrics" and parts[2] == "claims":
+        if parts[1] not in index.metrics:
+            raise ApiError(404, f"unknown metric {parts[1]!r}")
+        return page(index.filter_claims(None, parts[1], params.get("verdict")), params, max_limit)
+    if parts == ["fairness"]:
+        return index.fairness
+    raise ApiError(404, f"no route for {path}")
+
+
+class ResponseCache:
+    """LRU of encoded responses: key -> (status, body, etag)."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ApiState:
+    def __init__(self, args):
+        self.args = args
+        self.cache = ResponseCache(args.cache_size)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0, "not_modified": 0, "errors": 0, "reloads": 0, "failed_reloads": 0}
+        self.fingerprint = artifact_fingerprint(args)
+        self.index = QueryIndex(args, self.fingerprint)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def respond(self, path, query):
+        """(status, body, etag) for a GET, from the cache when possible."""
+        index = self.index  # one generation for the whole request, even if a reload swaps it meanwhile
+        key = (index.generation, path, query)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.count("cache_hits")
+            return entry
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+        try:
+            payload = route(index, path, params, self.args.max_limit)
+            status = 200
+        except ApiError as e:
+            payload, status = {"error": str(e)}, e.status
+        body = payload if isinstance(payload, bytes) else encode(payload)
+        etag = f'"{index.generation}-{hashlib.sha1(body).hexdigest()[:16]}"'
+        entry = (status, body, etag)
+        if status == 200:
+            self.cache.put(key, entry)
+        return entry
+
+    def watch(self):
+        """Reloads the index once the artifacts changed and then held still for one poll."""
+        pending = None
+        while True:
+            time.sleep(self.args.reload_interval)
+            fingerprint = artifact_fingerprint(self.args)
+            if fingerprint == self.fingerprint:
+                pending = None
+                continue
+            if fingerprint != pending:
+                pending = fingerprint  # still being written, or just finished: check again next poll
+                continue
+            try:
+                index = QueryIndex(self.args, fingerprint)
+            except (OSError, ValueError, KeyError) as e:
+                self.count("failed_reloads")
+                print(f"Reload failed, keeping generation {self.fingerprint}: {e}")
+                continue
+            self.index, self.fingerprint, pending = index, fingerprint, None
+            self.cache.clear()
+            self.count("reloads")
+            print(f"Reloaded artifacts: generation {fingerprint} {index.counts()}")
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # headers and body are separate writes; Nagle would delay the body ~40 ms
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, etag=None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            if state.args.cors_origin:
+                self.send_header("Access-Control-Allow-Origin", state.args.cors_origin)
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            state.count("requests")
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") == "/stats":
+                with state.lock:
+                    stats = dict(state.stats)
+                self._send(200, encode({**stats, "generation": state.fingerprint, "cache_entries": len(state.cache.entries)}))
+                return
+            try:
+                status, body, etag = state.respond(url.path, url.query)
+            except Exception as e:  # a bad artifact must not take the server down
+                state.count("errors")
+                self._send(500, encode({"error": f"{type(e).__name__}: {e}"}))
+                return
+            if status != 200:
+                state.count("errors")
+                self._send(status, body)
+                return
+            inm = self.headers.get("If-None-Match")
+            if inm and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]):
+                state.count("not_modified")
+                self._send(304, b"", etag)
+                return
+            self._send(200, body, etag)
+
+    return Handler
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # listen backlog; the default of 5 drops connection bursts
+
+
+def serve(args):
+    state = ApiState(args)
+    server = QueryServer((args.host, args.port), make_handler(state))
+    if args.reload_interval > 0:
+        threading.Thread(target=state.watch, daemon=True).start()
+    print(f"Query API on http://{args.host}:{server.server_address[1]} "
+          f"(generation {state.fingerprint}, {state.index.counts()})")
+    return server
+
+
+# ---------- bench ----------
+
+def bench_paths(base_url):
+    """Request mix built from the server's own listings: lists, company details, claim details."""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+
+    def get(path):
+        conn.request("GET", path)
+        return json.loads(conn.getresponse().read())
+
+    companies = [c["company_id"] for c in get("/companies?limit=100")["items"]]
+    claims = [c["claim_id"] for c in get("/claims?limit=200")["items"]]
+    metrics = [m["metric"] for m in get("/metrics")[:20]]
+    conn.close()
+    paths = ["/companies", "/companies?sort=company_id&limit=20", "/metrics", "/fairness"]
+    paths += [f"/companies/{c}" for c in companies] + [f"/companies/{c}/claims?limit=20" for c in companies]
+    paths += [f"/companies/{c}/timeline" for c in companies[:20]]
+    paths += [f"/claims/{c}" for c in claims] + [f"/metrics/{m}/claims" for m in metrics]
+    paths += ["/claims?verdict=contradicted", "/claims?limit=100&offset=100"]
+    return paths
+
+
+def bench(args):
+    paths = bench_paths(args.url)
+    url = urlsplit(args.url)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(seed):
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+        local, i = [], seed
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 7
+            t0 = time.perf_counter()
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            local.append(time.perf_counter() - t0)
+            if resp.status != 200:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+
+    result = {"requests": len(latencies), "errors": errors[0], "distinct_paths": len(paths),
+              "requests_per_sec": round(len(latencies) / wall, 1),
+              "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": pct(1.0)}
+    print(json.dumps({k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", help="run the query API")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8020)
+    p_serve.add_argument("--claims_index", default="claims_index.json")
+    p_serve.add_argument("--scores_dir", default="outputs/scores")
+    p_serve.add_argument("--graph_dir", default="graph/")
+    p_serve.add_argument("--verification_dir", default="verification/")
+    p_serve.add_argument("--explain_dir", default="explain/explanations")
+    p_serve.add_argument("--manifest", default="outputs/pipeline_manifest.json", help="watched for pipeline runs")
+    p_serve.add_argument("--cache_size", type=int, default=4096, help="encoded responses kept (0 disables)")
+    p_serve.add_argument("--max_limit", type=int, default=500, help="largest page size")
+    p_serve.add_argument("--reload_interval", type=float, default=2.0, help="seconds between artifact checks (0 = never reload)")
+    p_serve.add_argument("--cors_origin", default="*", help="Access-Control-Allow-Origin value ('' to omit)")
+    p_bench = sub.add_parser("bench", help="load-test a running server")
+    p_bench.add_argument("--url", default="http://127.0.0.1:8020")
+    p_bench.add_argument("--concurrency", type=int, default=16)
+    p_bench.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    if args.cmd == "serve":
+        server = serve(args)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        bench(args)
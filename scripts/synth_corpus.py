@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+scripts/synth_corpus.py
+
+Deterministic synthetic corpus for benchmarks and scale tests, in the data/cleaned/snippets.jsonl schema.
+
+Every company gets a few metrics (from `metric_aliases` in mappings/metrics_map.json) with a true value.
+Snippets are then drawn in order, each one of:
+  - claim         company disclosure (pdf / press / html) stating a metric, phrased with a random alias
+  - support       third-party mention (news / ngo) of the same metric with the same value
+  - contradict    third-party mention with a value well outside the tolerance_rules (planted contradiction)
+  - noise         company text without a metric claim (mostly removed by the extractor's prefilter)
+A small share of third-party snippets is unattributed (company_id null, e.g. sector-wide news), which
+the default candidate policy scores against every company.
+
+The same --seed, --companies and --snippets always give byte-identical output. Snippets are streamed to
+disk, so 1M+ snippets only keep the per-company metric table in memory. The planted ground truth
+(kind, metric, true and stated value per snippet) goes to --truth, for checking verdicts.
+
+Usage:
+  python scripts/synth_corpus.py --companies 100 --snippets 10000 --out data/synthetic/snippets.jsonl
+  python scripts/synth_corpus.py --companies 10000 --snippets 1000000 --contradiction_rate 0.3 --seed 7
+"""
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+# metric -> (value kind, value range); metrics from metric_aliases that are not listed here use PCT_SHARE
+METRIC_VALUES = {
+    "scope1_emissions": ("reduction", (5, 60)),
+    "scope2_emissions": ("reduction", (5, 60)),
+    "scope3_emissions": ("reduction", (2, 40)),
+    "renewable_energy_share": ("share", (10, 95)),
+    "net_zero_target": ("year", (2030, 2070)),
+    "water_usage": ("reduction", (3, 40)),
+    "waste_recycling_pct": ("share", (20, 98)),
+    "air_emissions": ("tonnes", (50, 5000)),
+    "energy_intensity": ("reduction", (2, 30)),
+}
+PCT_SHARE = ("share", (5, 95))
+
+CLAIM_TEMPLATES = {
+    "reduction": [
+        "{name} achieved a {value}% reduction in {alias} in FY{year} compared to the FY{base} baseline.",
+        "{name} reduced {alias} by {value}% during FY{year} through process optimization.",
+        "In FY{year}, {alias} at {name} were cut by {value}% against the FY{base} baseline.",
+    ],
+    "share": [
+        "{name} reported {alias} of {value}% across its operations in FY{year}.",
+        "In FY{year}, {name} raised its {alias} to {value}%.",
+        "{alias} reached {value}% at {name} by the end of FY{year}.",
+    ],
+    "year": [
+        "{name} has committed to reach {alias} by {value} across its global operations.",
+        "{name} announced a {alias} target for {value}, covering all business units.",
+    ],
+    "tonnes": [
+        "{name} reported {alias} of {value} tonnes in FY{year}.",
+        "Total {alias} at {name} sites were {value} tonnes in FY{year}.",
+    ],
+}
+# third-party mentions restate a disclosure sentence (so they score as close evidence) with attribution
+ATTRIBUTIONS = [
+    "{claim}, according to {outlet}.",
+    "{claim}, {outlet} reports.",
+    "{claim}, an audit by {outlet} found.",
+    "{claim}, based on figures compiled by {outlet}.",
+]
+NOISE_TEMPLATES = [
+    "{name} held its annual general meeting in {city} on {day} {month}.",
+    "{name} appointed a new independent director to its board.",
+    "The {name} foundation supported {count} community projects in {city}.",
+    "{name} opened a new regional office in {city} to serve its customers.",
+    "Shareholders of {name} approved the dividend proposed by the board.",
+    "{name} published its code of conduct in {count} languages.",
+]
+SECTOR_TEMPLATES = [
+    "{outlet} reports that companies in the {sector} sector cut scope 1 emissions by {value}% on average in FY{year}.",
+    "Sector-wide renewable energy share reached {value}% in FY{year}, according to {outlet}.",
+]
+
+NAME_PARTS = ["Vel", "Tra", "Nor", "Aster", "Bri", "Cal", "Dun", "Elm", "Fin", "Gal", "Hel", "Ion", "Jas", "Kor",
+              "Lum", "Mar", "Nex", "Or", "Pel", "Quin", "Rav", "Sol", "Tor", "Ul", "Ver", "Wes", "Xan", "Yor", "Zen"]
+NAME_SUFFIXES = ["a", "on", "ex", "ia", "is", "o", "um", "ar", "en", "ix"]
+SECTORS = ["Energy & Utilities", "Mining", "IT Services", "Consumer Goods", "Cement", "Steel", "Chemicals",
+           "Banking", "Automotive", "Pharmaceuticals"]
+SECTOR_WORDS = {"Energy & Utilities": "Power", "Mining": "Resources", "IT Services": "Technologies",
+                "Consumer Goods": "Brands", "Cement": "Cement", "Steel": "Steel", "Chemicals": "Chemicals",
+                "Banking": "Financial", "Automotive": "Motors", "Pharmaceuticals": "Pharma"}
+OUTLETS = {"news": ["reuters", "bloomberg", "economic_times", "financial_express", "mint"],
+           "ngo": ["greenwatch", "earthwatch", "climate_audit", "carbon_tracker"]}
+CITIES = ["Mumbai", "Pune", "Chennai", "Delhi", "Kolkata", "Bengaluru", "Hyderabad", "Ahmedabad"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+YEARS = range(2019, 2026)
+
+
+def company_table(n_companies, metric_aliases, rnd):
+    """company_id -> {name, sector, metrics: {metric: (kind, true value, year)}}; ids and names are unique."""
+    metrics = sorted(metric_aliases)
+    companies = {}
+    for i in range(n_companies):
+        stem = rnd.choice(NAME_PARTS) + rnd.choice(NAME_SUFFIXES)
+        sector = rnd.choice(SECTORS)
+        company_id = f"{stem.lower()}{i:05d}"
+        picked = rnd.sample(metrics, k=min(len(metrics), rnd.randint(3, 6)))
+        table = {}
+        for m in picked:
+            kind, (lo, hi) = METRIC_VALUES.get(m, PCT_SHARE)
+            table[m] = (kind, rnd.randint(lo, hi), rnd.choice(YEARS))
+        companies[company_id] = {"name": f"{stem} {SECTOR_WORDS[sector]}", "sector": sector, "metrics": table}
+    return companies
+
+
+def contradicting_value(kind, value, rnd):
+    """A value outside 3x the default tolerance_rules, so the matcher can label it contradict."""
+    if kind == "tonnes":
+        return int(value * rnd.choice([rnd.uniform(1.4, 2.5), rnd.uniform(0.3, 0.6)]))
+    if kind == "year":
+        return value + rnd.choice([-1, 1]) * rnd.randint(10, 20)
+    offset = rnd.randint(10, 30)
+    return value - offset if value - offset >= 1 else value + offset
+
+
+def render(template, **fields):
+    text = template.format(**fields)
+    return text[0].upper() + text[1:]
+
+
+def generate(n_companies, n_snippets, metric_aliases, seed=0, contradiction_rate=0.2, noise_rate=0.35,
+             third_party_rate=0.25, unattributed_rate=0.01):
+    """Yields (snippet, truth) pairs; truth holds the planted kind, metric and values."""
+    rnd = random.Random(seed)
+    companies = company_table(n_companies, metric_aliases, rnd)
+    ids = list(companies)
+    page = {}
+    for n in range(n_snippets):
+        cid = rnd.choice(ids)
+        comp = companies[cid]
+        name = comp["name"]
+        r = rnd.random()
+        if r < unattributed_rate:
+            stype = rnd.choice(["news", "ngo"])
+            outlet = rnd.choice(OUTLETS[stype])
+            year = rnd.choice(YEARS)
+            text = render(rnd.choice(SECTOR_TEMPLATES), outlet=outlet.replace("_", " ").title(),
+                          sector=comp["sector"], value=rnd.randint(5, 40), year=year)
+            snippet = {"snippet_id": f"{outlet}_sector_s{n}", "company_id": None,
+                       "source_id": f"{outlet}_sector_{year}", "date": f"{year}-{rnd.randint(1, 12):02d}-15",
+                       "type": stype, "text": text, "provenance": f"https://{outlet}.example.org/sector/{n}"}
+            yield snippet, {"snippet_id": snippet["snippet_id"], "kind": "sector"}
+            continue
+        metric = rnd.choice(sorted(comp["metrics"]))
+        kind, value, year = comp["metrics"][metric]
+        alias = rnd.choice(metric_aliases[metric]).removesuffix(" by")  # "net zero by" + " by 2045"
+        fields = {"name": name, "alias": alias, "year": year, "base": year - rnd.randint(3, 5)}
+        if r < unattributed_rate + noise_rate:
+            planted, stype, stated = "noise", rnd.choice(["pdf", "press", "html"]), None
+            text = render(rnd.choice(NOISE_TEMPLATES), name=name, city=rnd.choice(CITIES),
+                          day=rnd.randint(1, 28), month=rnd.choice(MONTHS), count=rnd.randint(2, 40))
+        elif r < unattributed_rate + noise_rate + third_party_rate:
+            stype = rnd.choice(["news", "ngo"])
+            outlet = rnd.choice(OUTLETS[stype])
+            planted = "contradict" if rnd.random() < contradiction_rate else "support"
+            stated = contradicting_value(kind, value, rnd) if planted == "contradict" else value
+            claim = render(rnd.choice(CLAIM_TEMPLATES[kind]), value=stated, **fields).rstrip(".")
+            text = rnd.choice(ATTRIBUTIONS).format(claim=claim, outlet=outlet.replace("_", " ").title())
+        else:
+            planted, stype, stated = "claim", rnd.choice(["pdf", "press", "html"]), value
+            text = render(rnd.choice(CLAIM_TEMPLATES[kind]), value=value, **fields)
+
+        if stype in ("news", "ngo"):
+            source_id = f"{outlet}_{cid}_{year}"
+            provenance = f"https://{outlet}.example.org/{cid}/{year}"
+        elif stype == "pdf":
+            source_id = f"{cid}_sustainability_report_{year}-{(year + 1) % 100:02d}.pdf"
+            provenance = f"https://www.{cid}.example.com/reports/{source_id}"
+        else:
+            source_id = f"{cid}_{stype}_{year}"
+            provenance = f"https://www.{cid}.example.com/{stype}/{year}"
+        p = page[source_id] = page.get(source_id, 0) + 1
+        snippet = {"snippet_id": f"{cid}_{stype}_p{p}_s{n}", "company_id": cid, "source_id": source_id,
+                   "date": f"{year + 1}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}", "type": stype,
+                   "text": text, "provenance": provenance}
+        truth = {"snippet_id": snippet["snippet_id"], "company_id": cid, "kind": planted}
+        if planted != "noise":
+            truth.update(metric=metric, true_value=value, stated_value=stated)
+        yield snippet, truth
+
+
+def write_corpus(out_path, n_companies, n_snippets, mappings="mappings/metrics_map.json", truth_path=None,
+                 seed=0, contradiction_rate=0.2, noise_rate=0.35, third_party_rate=0.25, unattributed_rate=0.01):
+    """Writes the snippets (and optional ground truth) JSONL; returns counts per planted kind."""
+    with open(mappings, "r", encoding="utf-8") as f:
+        metric_aliases = json.load(f)["metric_aliases"]
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    truth_f = None
+    if truth_path:
+        Path(truth_path).parent.mkdir(parents=True, exist_ok=True)
+        truth_f = open(truth_path, "w", encoding="utf-8")
+    counts = {}
+    try:
+        with open(out_path, "w", encoding="utf-8") as f:
+            for snippet, truth in generate(n_companies, n_snippets, metric_aliases, seed, contradiction_rate,
+                                           noise_rate, third_party_rate, unattributed_rate):
+                f.write(json.dumps(snippet, ensure_ascii=False) + "\n")
+                if truth_f is not None:
+                    truth_f.write(json.dumps(truth) + "\n")
+                counts[truth["kind"]] = counts.get(truth["kind"], 0) + 1
+    finally:
+        if truth_f is not None:
+            truth_f.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--snippets", type=int, default=10000)
+    parser.add_argument("--out", default="data/synthetic/snippets.jsonl")
+    parser.add_argument("--truth", default=None, help="planted ground truth JSONL (default: <out stem>.truth.jsonl)")
+    parser.add_argument("--mappings", default="mappings/metrics_map.json", help="metric_aliases source")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--contradiction_rate", type=float, default=0.2, help="share of third-party mentions that contradict")
+    parser.add_argument("--noise_rate", type=float, default=0.35, help="share of snippets without a metric claim")
+    parser.add_argument("--third_party_rate", type=float, default=0.25, help="share of news/ngo mentions of a company metric")
+    parser.add_argument("--unattributed_rate", type=float, default=0.01, help="share of sector news without a company")
+    args = parser.parse_args()
+    if args.companies < 1 or args.snippets < 0:
+        sys.exit("--companies must be >= 1 and --snippets >= 0")
+    truth = args.truth or str(Path(args.out).with_suffix("")) + ".truth.jsonl"
+    counts = write_corpus(args.out, args.companies, args.snippets, args.mappings, truth, args.seed,
+                          args.contradiction_rate, args.noise_rate, args.third_party_rate, args.unattributed_rate)
+    print(f"Wrote {args.snippets} snippets for {args.companies} companies -> {args.out} ({counts}); truth -> {truth}")